@@ -6,8 +6,11 @@ LLM 本身是“无状态”的（Stateless）。要实现对话，我们必须
 PydanticAI 通过 message_history 参数，让你能够轻松管理 Agent 的记忆。
 """
 
+import os
 import sys
 import asyncio
+import tempfile
+import uuid
 from pathlib import Path
 from pydantic_ai import Agent
 
@@ -17,6 +20,8 @@ if str(examples_root) not in sys.path:
     sys.path.append(str(examples_root))
 
 from common.models import get_model
+from common.memory import SUMMARIZER_PROMPT, MemoryManager
+from common.session_store import SQLiteSessionStore
 
 # 初始化 Agent
 agent = Agent(
@@ -24,49 +29,61 @@ agent = Agent(
     system_prompt="你是一个友好的助手。请记住用户的名字和偏好。"
 )
 
+# 摘要 Agent：在后台把滑出窗口的旧轮次压缩成滚动摘要（不阻塞主对话）
+summarizer = Agent(get_model(), system_prompt=SUMMARIZER_PROMPT)
+
 async def main():
     print('--- 示例: 记忆与多轮对话 (Memory) ---')
     
-    # 用于存储对话历史的列表
-    # 在生产环境中，你可以将其持久化到数据库（如 Redis, PostgreSQL）
-    history = []
-    
-    # 第一轮对话
-    prompt1 = "你好，我叫 Gavin，我非常喜欢 Python 编程。"
-    print(f"\nUser: {prompt1}")
-    
-    result1 = await agent.run(prompt1, message_history=history)
-    print(f"Agent: {result1.output}")
-    
-    # 更新历史记录：result1.all_messages() 包含了这一轮的请求和响应
-    history = result1.all_messages()
-    
-    # 第二轮对话：测试 Agent 是否记得我的名字
-    prompt2 = "你还记得我叫什么吗？"
-    print(f"\nUser: {prompt2}")
+    # 记忆管理器：固定保留系统提示 + 最近 N 轮原文 + 更早轮次的滚动摘要，总量受 Token 预算约束
+    memory = MemoryManager(summarizer=summarizer, max_tokens=1500, keep_turns=2)
     
-    result2 = await agent.run(prompt2, message_history=history)
-    print(f"Agent: {result2.output}")
+    # 会话持久化：按 sessionId 只追加每轮的新消息（压缩后写入 SQLite），重启后一次顺序读取即可恢复
+    store = SQLiteSessionStore(os.getenv("SESSION_DB_PATH") or os.path.join(tempfile.gettempdir(), "pydantic-lab-sessions.db"))
+    # 默认每次运行使用新的会话，避免上次运行的历史混入演示；设置 SESSION_ID 可恢复指定会话
+    session_id = os.getenv("SESSION_ID") or f"demo-gavin-{uuid.uuid4().hex[:8]}"
+    restored = store.load(session_id)
+    if restored:
+        memory.add_messages(restored)
+        print(f"♻️ 已从会话存储恢复 {len(restored)} 条历史消息 (session={session_id})")
     
-    # 再次更新历史记录
-    history = result2.all_messages()
+    prompts = [
+        "你好，我叫 Gavin，我非常喜欢 Python 编程。",
+        "你还记得我叫什么吗？",              # 测试 Agent 是否记得我的名字
+        "基于我的兴趣，给我推荐一个学习项目。",  # 测试 Agent 是否记得我的偏好
+    ]
     
-    # 第三轮对话：测试 Agent 是否记得我的偏好
-    prompt3 = "基于我的兴趣，给我推荐一个学习项目。"
-    print(f"\nUser: {prompt3}")
+    for prompt in prompts:
+        print(f"\nUser: {prompt}")
+        result = await agent.run(prompt, message_history=memory.messages())
+        print(f"Agent: {result.output}")
+        stats = memory.stats
+        print(f"   [记忆] 本轮发送历史 ≈{stats.last_history_tokens} tokens | "
+              f"全量回传将是 ≈{stats.full_history_tokens} tokens | 已压缩 {stats.summarized_turns} 轮")
+        
+        # 更新记忆：只追加本轮的新消息；滑出窗口的旧轮次在后台压缩为摘要
+        memory.add_run(result)
+        store.append(session_id, result.new_messages())
     
-    result3 = await agent.run(prompt3, message_history=history)
-    print(f"Agent: {result3.output}")
+    # 退出前等待后台摘要完成（持久化记忆前同样需要）
+    await memory.drain()
+    if memory.summary:
+        print(f"\n[滚动摘要]: {memory.summary}")
+    print(f"[会话存储] {store.stats()}")
+    store.close()
 
     # --- 🤖 示例解读：Memory (记忆) 机制 ---
     # 1. 无状态到有状态：LLM 每次 API 调用都是独立的。
-    # 2. 历史回传：PydanticAI 通过 all_messages() 获取完整的对话链，并在下一次请求时通过 message_history 传回给 LLM。
+    # 2. 历史回传：PydanticAI 通过 message_history 把历史传回给 LLM；这里由 MemoryManager 决定传回哪些消息，
+    #    而不是每轮把 all_messages() 全量回传（那样输入 Token 逐轮线性增长，整段对话成本按平方增长）。
     # 3. 语义连贯性：正是因为有了 history，Agent 才能在第三轮回答中提到“Python 编程项目”。
 
     # 【架构师笔记：记忆管理的艺术】
     # 1. 令牌成本 (Token Cost)：记忆越长，每次请求发送的 input_tokens 就越多。
-    # 2. 窗口管理 (Context Window)：对于超长对话，需要实现“滑动窗口”或“总结压缩”策略，只保留最重要的记忆。
-    # 3. 持久化层：本示例使用的是内存列表。在分布式应用中，应使用数据库存储 history，并根据 sessionId 进行加载。
+    # 2. 窗口管理 (Context Window)：common/memory.py 实现了“滑动窗口 + 总结压缩”：按轮次裁剪（工具调用与返回不会被拆开），
+    #    旧轮次由摘要 Agent 异步压缩，请求路径上不等待摘要。
+    # 3. 持久化层：common/session_store.py 按 sessionId 追加每轮增量（new_messages），从不重写整段历史；
+    #    SQLite 后端离线可用，热点会话缓存在进程内 LRU 中。分布式部署可按同一接口实现 Redis/PostgreSQL 后端。
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -10,7 +10,7 @@ import sys
 from pathlib import Path
 from dataclasses import dataclass
 from datetime import datetime
-from pydantic_ai import Agent, RunContext
+from pydantic_ai import Agent
 
 # 将 examples 目录添加到 sys.path
 examples_root = Path(__file__).resolve().parents[1]
@@ -18,6 +18,7 @@ if str(examples_root) not in sys.path:
     sys.path.append(str(examples_root))
 
 from common.models import get_model
+from common.prompt_cache import PromptAssembler, PromptCacheTracker
 
 @dataclass
 class UserContext:
@@ -30,24 +31,38 @@ agent = Agent(
     deps_type=UserContext,
 )
 
-# 2. 定义动态系统提示词
-@agent.system_prompt
-def get_system_prompt(ctx: RunContext[UserContext]) -> str:
-    # 根据运行时注入的 UserContext 动态生成提示词
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    role_instruction = (
-        "你拥有最高权限，可以回答任何敏感问题。" 
-        if ctx.deps.user_role == 'admin' 
+# 2. 按稳定性分层组装提示词
+# 供应商的提示缓存只复用“逐字节相同的最长前缀”：如果提示词以用户名、当前时间开头，
+# 后面再长的固定指令也每次都按全价计费。因此：静态在前 → 半静态居中 → 易变内容放到最后。
+prompts = PromptAssembler[UserContext]()
+
+# 静态层：所有请求完全相同（长指令、规范、示例都放这里）
+prompts.static("""你的名字是 AI 助手。
+回答要求：
+1. 先给结论，再给理由；涉及步骤时使用编号列表。
+2. 不确定的信息要明确说明，不要编造。
+3. 涉及权限的问题，严格按照下方的“权限指令”执行。""")
+
+# 半静态层：只有少数几种取值（这里按角色区分，每种角色各自命中缓存）
+@prompts.semi_static
+def role_instruction(deps: UserContext) -> str:
+    instruction = (
+        "你拥有最高权限，可以回答任何敏感问题。"
+        if deps.user_role == 'admin'
         else "你是一个受限助手，请保持礼貌并拒绝越权操作。"
     )
-    
-    return f"""
-    你的名字是 AI 助手。
-    当前用户: {ctx.deps.user_name}
-    用户角色: {ctx.deps.user_role}
-    当前时间: {now}
-    权限指令: {role_instruction}
-    """
+    return f"用户角色: {deps.user_role}\n权限指令: {instruction}"
+
+# 易变层：每次请求都不同，追加在用户消息之后，不进入系统提示（也就不会进入后续轮次的历史前缀）
+@prompts.volatile
+def request_context(deps: UserContext) -> str:
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return f"当前用户: {deps.user_name}\n当前时间: {now}"
+
+prompts.install(agent)
+
+# 按 Agent 统计供应商返回的缓存命中 Token 与未命中 Token
+cache_tracker = PromptCacheTracker()
 
 async def main():
     print('--- 示例: 动态系统提示词 ---')
@@ -55,19 +70,33 @@ async def main():
     # 场景 1: 管理员访问
     admin_ctx = UserContext(user_name="Gavin", user_role="admin")
     print("\n[场景 1: 管理员]")
-    result1 = await agent.run("我现在的权限能做什么？", deps=admin_ctx)
+    result1 = await agent.run(prompts.user_prompt("我现在的权限能做什么？", admin_ctx), deps=admin_ctx)
+    cache_tracker.record("assistant", result1)
     print(f"Agent: {result1.output}")
     
     # 场景 2: 普通访客访问
     guest_ctx = UserContext(user_name="访客小王", user_role="guest")
     print("\n[场景 2: 普通访客]")
-    result2 = await agent.run("我现在的权限能做什么？", deps=guest_ctx)
+    result2 = await agent.run(prompts.user_prompt("我现在的权限能做什么？", guest_ctx), deps=guest_ctx)
+    cache_tracker.record("assistant", result2)
     print(f"Agent: {result2.output}")
 
+    # 场景 3: 另一位管理员：与场景 1 的系统提示逐字节相同，可以命中供应商的前缀缓存
+    other_admin_ctx = UserContext(user_name="Alice", user_role="admin")
+    print("\n[场景 3: 另一位管理员]")
+    result3 = await agent.run(prompts.user_prompt("帮我总结一下你的回答要求。", other_admin_ctx), deps=other_admin_ctx)
+    cache_tracker.record("assistant", result3)
+    print(f"Agent: {result3.output}")
+
+    print(f"\n[提示缓存] {cache_tracker.report()}")
+
     # 【架构师笔记：动态提示词的优势】
     # 1. 最小权限原则：不需要在静态 Prompt 中写死所有逻辑，而是按需注入。
     # 2. 减少 Token 浪费：只在提示词中包含与当前上下文相关的信息。
     # 3. 实时性：可以感知时间、地理位置等实时变化的外部状态。
+    # 4. 缓存友好：动态 ≠ 放在最前面。静态指令在前、按角色变化的内容居中、用户名/时间等易变内容放在最后，
+    #    供应商的前缀缓存才能命中；distinct_prefixes 越多，说明“静态”部分其实并不静态。
+    #    多轮对话中，MemoryManager(trim_to=...) 成批裁剪历史，让历史前缀在两次裁剪之间保持不变。
 
 if __name__ == '__main__':
     import asyncio
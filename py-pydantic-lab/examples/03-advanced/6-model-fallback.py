@@ -9,7 +9,6 @@
 import sys
 import asyncio
 from pathlib import Path
-from pydantic_ai import Agent
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.providers.ollama import OllamaProvider
@@ -20,9 +19,12 @@ if str(examples_root) not in sys.path:
     sys.path.append(str(examples_root))
 
 from common.models import get_model
+from common.fallback import AllRoutesFailedError, FallbackRouter
 
-async def run_with_fallback(prompt: str):
-    # 1. 定义候选模型列表
+_router = None
+
+def build_router() -> FallbackRouter:
+    # 1. 定义候选模型列表（只构建一次，每个模型对应一个常驻 Agent）
     # 优先级 1: DeepSeek (性价比之王)
     # 优先级 2: GPT-4o-mini (稳定备选)
     # 优先级 3: Ollama (本地兜底)
@@ -31,23 +33,27 @@ async def run_with_fallback(prompt: str):
         ("GPT-4o-mini", OpenAIChatModel("gpt-4o-mini")), 
         ("Local-Ollama", OpenAIChatModel("qwen2.5-coder", provider=OllamaProvider(base_url="http://localhost:11434/v1")))
     ]
-    
-    last_error = None
-    
-    for name, model in models:
-        try:
-            print(f"--- 尝试使用模型: {name} ---")
-            agent = Agent(model)
-            result = await agent.run(prompt)
-            print(f"✅ {name} 调用成功！")
-            return result.output
-        except Exception as e:
-            print(f"❌ {name} 失败: {str(e)}")
-            last_error = e
-            continue
-            
-    print("‼️ 所有模型均已失败")
-    raise last_error
+    # 2. 路由策略：
+    # - attempt_timeout: 单次尝试的超时上限，不再为挂掉的模型付出完整的 SDK 超时
+    # - hedge: 当前模型超过其 p95 延迟仍未返回时，并行发起备选请求，先到先得，败者被取消
+    # - 熔断器：连续失败的模型会被直接跳过，冷却后再放行一次试探请求
+    return FallbackRouter.from_models(models, attempt_timeout=20.0, hedge=True, hedge_delay=3.0)
+
+async def run_with_fallback(prompt: str):
+    global _router
+    if _router is None:
+        _router = build_router()
+
+    try:
+        routed = await _router.run(prompt)
+    except AllRoutesFailedError as e:
+        for name, error in e.errors:
+            print(f"❌ {name} 失败: {error}")
+        print("‼️ 所有模型均已失败")
+        raise
+
+    print(f"✅ {routed.route} 调用成功！耗时 {routed.latency_ms:.0f}ms")
+    return routed.result.output
 
 async def main():
     print('--- 示例: 模型回退策略 ---')
@@ -58,10 +64,14 @@ async def main():
     except Exception as e:
         print(f"任务最终失败: {e}")
 
+    if _router is not None:
+        print(f"\n路由健康状态: {_router.health()}")
+
     # 【架构师笔记：多模型策略】
     # 1. 容错性：API 抖动是常态，多模型回退是构建工业级 AI 应用的必备。
     # 2. 成本平衡：可以先尝试用便宜的模型（如 GPT-4o-mini），如果失败或质量达不到要求，再换贵的（如 GPT-4o）。
     # 3. 混合云架构：云端模型（高效）与本地模型（隐私/兜底）结合。
+    # 4. 尾延迟控制：顺序回退的 p99 是所有超时之和；熔断 + 对冲请求让 p99 接近最快健康模型的延迟。
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -27,6 +27,7 @@ if str(examples_root) not in sys.path:
     sys.path.append(str(examples_root))
 
 from common.models import get_model
+from common.memory import SUMMARIZER_PROMPT, MemoryManager
 
 # --- 1. 定义领域模型 ---
 
@@ -57,6 +58,9 @@ agent = Agent(
     )
 )
 
+# 摘要 Agent：把滑出窗口的旧轮次（含工具调用结果）压缩为滚动摘要
+summarizer = Agent(get_model(), system_prompt=SUMMARIZER_PROMPT)
+
 # --- 3. 定义工具与校验逻辑 ---
 
 @agent.tool
@@ -101,7 +105,9 @@ async def run_butler_session():
         ]
     )
     
-    history = []
+    # 多轮记忆：系统提示固定保留，最近几轮原文 + 旧轮次摘要，总量受 Token 预算约束
+    # trim_to=2：超出 4 轮时一次裁到 2 轮，两次裁剪之间历史前缀不变，供应商前缀缓存可以持续命中
+    memory = MemoryManager(summarizer=summarizer, max_tokens=3000, keep_turns=4, trim_to=2)
     
     # 场景：添加日程并转账
     prompts = [
@@ -113,7 +119,7 @@ async def run_butler_session():
         print(f"\n[用户]: {prompt}")
         
         # 运行 Agent
-        result = await agent.run(prompt, deps=deps, message_history=history)
+        result = await agent.run(prompt, deps=deps, message_history=memory.messages())
         
         # 🛡️ 拦截工具调用 (Deferred Tool Calling 安全演示)
         # 
@@ -152,8 +158,13 @@ async def run_butler_session():
 
         print(f"[管家]: {result.output}")
         
-        # 更新记忆
-        history = result.all_messages()
+        # 更新记忆：按轮次追加（工具调用与返回同属一轮，裁剪时不会被拆开）
+        memory.add_run(result)
+
+    await memory.drain()
+    next_history = memory.messages()
+    print(f"\n[记忆] 下一轮将发送 {len(next_history)} 条消息 ≈{memory.stats.last_history_tokens} tokens "
+          f"(全量回传 ≈{memory.stats.full_history_tokens} tokens)")
 
     print("\n--- 当前最终日程表 ---")
     for event in deps.existing_events:
@@ -6,7 +6,9 @@
 """
 
 import asyncio  # 异步I/O库，用于处理并发任务
+import math
 import sys
+import time
 from pathlib import Path
 from typing import List, Optional  # 类型提示，List[str]表示“一串字符串”
 from pydantic import BaseModel, Field
@@ -18,6 +20,7 @@ if str(examples_root) not in sys.path:
     sys.path.append(str(examples_root))
 
 from common.models import get_model
+from common.scheduler import ProviderLimits, ScheduledJob, TaskScheduler
 
 
 # ==================== 领域模型定义 (Structure Data Blueprints) ====================
@@ -51,6 +54,20 @@ class ResearchReport(BaseModel):
     recommendations: List[str] = Field(description="建议措施")
 
 
+class PartialReport(BaseModel):
+    """阶段性报告：流水线模式下，每批研究发现到达后立即生成"""
+    topics: List[str] = Field(description="本批覆盖的研究主题")
+    summary: str = Field(description="本批研究发现的综合摘要")
+    recommendations: List[str] = Field(description="本批得出的建议")
+
+
+class ReportSkeleton(BaseModel):
+    """最终合并结果：只生成标题/摘要/建议，研究发现直接复用已有的结构化结果"""
+    title: str = Field(description="报告标题")
+    executive_summary: str = Field(description="执行摘要")
+    recommendations: List[str] = Field(description="建议措施")
+
+
 # ==================== 专业Agent定义 (Agent Job Descriptions) ====================
 # 【教练笔记】：在这里我们定义了三个拥有不同“岗位职责”的 Agent。
 # 特别注意 output_type：它让 AI 的回复直接变成 Python 对象，省去了解析字符串的痛苦。
@@ -89,16 +106,71 @@ report_integrator_agent = Agent(
 )
 
 
+# 4. 增量整合Agent - 职责：研究还在进行时，先把已到达的一批发现整理成阶段性报告
+partial_integrator_agent = Agent(
+    get_model(),
+    output_type=PartialReport,
+    system_prompt=(
+        "你是一个分析师。你会陆续收到部分研究发现，请针对本批发现写出精炼的综合摘要和建议。"
+        "不要编造本批之外的内容。"
+    )
+)
+
+
+# 5. 报告合并Agent - 职责：把多份阶段性报告合并为最终报告的标题、摘要与建议
+report_merger_agent = Agent(
+    get_model(),
+    output_type=ReportSkeleton,
+    system_prompt=(
+        "你是一个高级分析师和报告专家。你会收到若干份阶段性报告，"
+        "请将它们合并为一份连贯的最终报告：给出吸引人的标题、精炼的执行摘要以及去重后的切实可行的建议。"
+    )
+)
+
+
 # ==================== Director Agent 协调逻辑 ====================
 # 【教练笔记】：这是整个系统的“大脑”，负责指挥 Agent 们接力工作。
 
 class MultiAgentOrchestrator:
     """多Agent协作编排器"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        scheduler: Optional[TaskScheduler] = None,
+        pipelined: bool = False,
+        quorum: float = 0.8,
+        research_deadline: Optional[float] = None,
+        batch_size: int = 2,
+    ):
         self.task_decomposer = task_decomposer_agent
         self.researcher = research_agent
         self.report_integrator = report_integrator_agent
+        self.partial_integrator = partial_integrator_agent
+        self.report_merger = report_merger_agent
+        # 【教练笔记】：流水线模式 (pipelined) 下，研究和整合同时进行：
+        # - quorum: 到齐多少比例的主题即可出报告（0.8 表示 80%），不再被最慢的主题拖住
+        # - research_deadline: 阶段2 最多等多少秒，到点后用已到达的发现出报告
+        # - batch_size: 每到达几条发现就启动一次增量整合
+        self.pipelined = pipelined
+        self.quorum = quorum
+        self.research_deadline = research_deadline
+        self.batch_size = batch_size
+        # 【教练笔记】：调度器给“多箭齐发”装上限流阀。
+        # 全局最多 4 个并发调用，每个 Provider 最多 3 个；每分钟请求数/Token 数受令牌桶约束；
+        # 单个主题 90 秒内必须完成（含排队时间），超时的主题会被跳过而不是拖垮整个任务。
+        self.scheduler = scheduler or TaskScheduler(
+            max_concurrency=4,
+            provider_limits={
+                self._provider_name(): ProviderLimits(
+                    max_concurrency=3, requests_per_minute=60, tokens_per_minute=120_000
+                )
+            },
+            default_deadline=90.0,
+        )
+
+    def _provider_name(self) -> str:
+        # 用模型所属的系统（如 'deepseek'、'openai'）作为限流分组
+        return getattr(self.researcher.model, "system", "default")
     
     async def orchestrate_research(self, research_request: str) -> ResearchReport:
         """协调多个Agent完成研究任务：三阶段接力"""
@@ -122,21 +194,32 @@ class MultiAgentOrchestrator:
         # --- 阶段2: 并行研究 (多箭齐发) ---
         # 【教练笔记】：这里体现了并发的威力。
         # 我们不是一个接一个做研究，而是让多个 Agent 同时开工。
+        # 但“同时”是有上限的：分解 Agent 可能一口气给出 20 个主题，全部同时起跑会触发 Provider 的 429 限流。
         print("\n🔬 阶段2 - 并行研究")
-        research_tasks = []
+        research_jobs = []
         for topic in research_topics:
-            # 准备任务列表，此时任务还没真正开始执行
-            task = self.researcher.run(f"请针对以下主题进行深入研究: {topic.name} (描述: {topic.description})")
-            research_tasks.append(task)
+            prompt = f"请针对以下主题进行深入研究: {topic.name} (描述: {topic.description})"
+            # 准备任务列表：用 lambda 延迟创建协程，调度器放行时才真正开始执行
+            research_jobs.append(ScheduledJob(
+                key=topic.name,
+                run=lambda prompt=prompt: self.researcher.run(prompt),
+                provider=self._provider_name(),
+                estimated_tokens=2_000,
+            ))
         
-        # asyncio.gather 就像发令枪，让所有任务同时起跑
-        # 结果会按任务列表的顺序返回
-        research_results = await asyncio.gather(*research_tasks)
+        if self.pipelined:
+            return await self._pipelined_integration(research_topics, research_jobs)
         
-        # 提取每个研究 Agent 的结构化结果
-        findings = [r.output for r in research_results]
+        # scheduler.as_completed 按“完成顺序”逐个交付结果：谁先跑完谁先交棒
+        findings = []
+        async for outcome in self.scheduler.as_completed(research_jobs):
+            if outcome.ok:
+                findings.append(outcome.result.output)
+                print(f"  ✔ {outcome.key} (排队 {outcome.queued_s:.1f}s, 执行 {outcome.service_s:.1f}s)")
+            else:
+                print(f"  ⚠️ {outcome.key} 未完成，已跳过: {outcome.error!r}")
         
-        print(f"✅ 完成 {len(findings)} 个主题研究")
+        print(f"✅ 完成 {len(findings)}/{len(research_topics)} 个主题研究")
         
         # --- 阶段3: 报告整合 ---
         # 目标：将碎片化的信息聚合成结构化的深度报告
@@ -146,12 +229,7 @@ class MultiAgentOrchestrator:
         print("正在将所有研究发现合成最终报告，这可能需要一点时间...")
         
         # 将研究发现转化为文本上下文，传递给整合 Agent
-        findings_context = "\n\n".join([
-            f"--- 研究发现: {f.topic} ---\n"
-            f"关键点: {', '.join(f.key_points)}\n"
-            f"参考来源: {', '.join(f.sources)}"
-            for f in findings
-        ])
+        findings_context = "\n\n".join([_format_finding(f) for f in findings])
         
         report_result = await self.report_integrator.run(
             f"基于以下由专业研究 Agent 提供的详细研究发现，生成一份完整且结构化的研究报告:\n\n{findings_context}"
@@ -160,13 +238,115 @@ class MultiAgentOrchestrator:
         print("\n🎉 多Agent协作任务完成!")
         return report_result.output
 
+    async def _integrate_batch(self, batch: List[ResearchFinding]) -> PartialReport:
+        """增量整合：把一批研究发现变成阶段性报告"""
+        context = "\n\n".join(_format_finding(f) for f in batch)
+        result = await self.partial_integrator.run(f"请整合以下这批研究发现:\n\n{context}")
+        return result.output
+
+    async def _pipelined_integration(
+        self, research_topics: List[ResearchTopic], research_jobs: List[ScheduledJob]
+    ) -> ResearchReport:
+        """流水线模式：边研究边整合，达到法定数量 (quorum) 或截止时间后合并出最终报告"""
+        
+        # 【教练笔记】：普通模式下，阶段3 要等最慢的那个主题研究完才开始。
+        # 流水线模式下，每到达一批发现就立刻交给增量整合 Agent，研究和整合像流水线一样重叠执行。
+        needed = max(1, math.ceil(len(research_topics) * self.quorum))
+        print(f"⏩ 流水线模式：收齐 {needed}/{len(research_topics)} 个主题即生成报告")
+        
+        findings: List[ResearchFinding] = []
+        batch: List[ResearchFinding] = []
+        partial_tasks = []  # (批次, 增量整合任务)
+        started = time.monotonic()
+        stream = self.scheduler.as_completed(research_jobs)
+        try:
+            while len(findings) < needed:
+                remaining = None
+                if self.research_deadline is not None:
+                    remaining = max(0.0, self.research_deadline - (time.monotonic() - started))
+                try:
+                    outcome = await asyncio.wait_for(stream.__anext__(), remaining)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    print(f"  ⏰ 到达截止时间，使用已完成的 {len(findings)} 个主题")
+                    break
+                
+                if not outcome.ok:
+                    print(f"  ⚠️ {outcome.key} 未完成，已跳过: {outcome.error!r}")
+                    continue
+                findings.append(outcome.result.output)
+                batch.append(outcome.result.output)
+                print(f"  ✔ {outcome.key} (排队 {outcome.queued_s:.1f}s, 执行 {outcome.service_s:.1f}s)")
+                
+                if len(batch) >= self.batch_size:
+                    # 研究仍在继续，增量整合已经在后台开工
+                    partial_tasks.append((batch, asyncio.create_task(self._integrate_batch(batch))))
+                    batch = []
+        except BaseException:
+            # 出错或被调用方取消时，后台的增量整合任务不能继续消耗 LLM 调用
+            for _, task in partial_tasks:
+                task.cancel()
+            raise
+        finally:
+            # 已达 quorum：剩余主题不再等待，调度器会取消它们
+            await stream.aclose()
+        
+        if batch:
+            partial_tasks.append((batch, asyncio.create_task(self._integrate_batch(batch))))
+        
+        print(f"✅ 完成 {len(findings)}/{len(research_topics)} 个主题研究")
+        if not findings:
+            raise RuntimeError("没有任何研究主题在截止时间内完成，无法生成报告")
+        
+        # --- 阶段3: 合并阶段性报告 ---
+        print("\n" + "="*40)
+        print("📝 阶段3 - 合并阶段性报告")
+        print("="*40)
+        results = await asyncio.gather(*(task for _, task in partial_tasks), return_exceptions=True)
+        sections = []
+        for (part, _), result in zip(partial_tasks, results):
+            if isinstance(result, PartialReport):
+                sections.append(
+                    f"--- 阶段性报告: {', '.join(result.topics)} ---\n"
+                    f"摘要: {result.summary}\n"
+                    f"建议: {', '.join(result.recommendations)}"
+                )
+            else:
+                # 增量整合失败时退回原始发现，保证信息不丢
+                sections.extend(_format_finding(f) for f in part)
+        
+        merged = await self.report_merger.run(
+            "请将以下阶段性报告合并为最终研究报告:\n\n" + "\n\n".join(sections)
+        )
+        skeleton = merged.output
+        
+        print("\n🎉 多Agent协作任务完成!")
+        return ResearchReport(
+            title=skeleton.title,
+            executive_summary=skeleton.executive_summary,
+            findings=findings,
+            recommendations=skeleton.recommendations,
+        )
+
+
+def _format_finding(f: ResearchFinding) -> str:
+    return (
+        f"--- 研究发现: {f.topic} ---\n"
+        f"关键点: {', '.join(f.key_points)}\n"
+        f"参考来源: {', '.join(f.sources)}"
+    )
+
 
 # ==================== 使用示例 ====================
 
 async def main():
     """多Agent协作示例运行入口"""
     
+    # 默认顺序模式：所有主题研究完成后统一整合
     orchestrator = MultiAgentOrchestrator()
+    # 可选流水线模式：80% 的主题到齐（或 120 秒截止）即出报告，研究与整合重叠执行
+    # orchestrator = MultiAgentOrchestrator(pipelined=True, quorum=0.8, research_deadline=120.0)
     
     # 复杂的研究请求：可以随意更换，Agent 会自动分解
     research_request = """
@@ -206,7 +386,7 @@ async def main():
 # 1. async/await: 就像接力棒。async 函数会等待（await）耗时任务（如AI回复）完成后再继续。
 # 2. 类型提示 (List[str]): 帮助你清楚地知道变量里装的是什么。
 # 3. f-string: 优雅地在句子中插入变量。
-# 4. asyncio.gather: 并发神器，让多个 AI 同时为你工作。
+# 4. asyncio.gather: 并发神器，让多个 AI 同时为你工作；配合 TaskScheduler 的信号量和令牌桶，才能“快而不乱”。
 
 if __name__ == "__main__":
     asyncio.run(main())
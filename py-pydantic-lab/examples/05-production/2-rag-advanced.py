@@ -5,9 +5,11 @@
 """
 
 import asyncio
+import os
 import sys
+import tempfile
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterable, List, Dict, Optional, Sequence, Tuple
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent
 
@@ -15,6 +17,9 @@ from pydantic_ai import Agent
 root = Path(__file__).resolve().parents[1]
 sys.path.append(str(root))
 from common.models import get_model
+from common.graph_store import GraphStore
+from common.entity_linker import EntityLinker, Mention
+from common.vector_store import HashingEmbedder, VectorStore
 
 
 # ==================== 知识图谱领域模型 ====================
@@ -25,6 +30,7 @@ class KnowledgeEntity(BaseModel):
     name: str = Field(description="实体名称")
     type: str = Field(description="实体类型")
     description: str = Field(description="实体描述")
+    aliases: List[str] = Field(default_factory=list, description="实体别名（用于实体链接）")
 
 
 class KnowledgeRelation(BaseModel):
@@ -32,13 +38,62 @@ class KnowledgeRelation(BaseModel):
     source_id: str = Field(description="源实体ID")
     target_id: str = Field(description="目标实体ID") 
     relation_type: str = Field(description="关系类型")
-    weight: float = Field(description="关系权重", ge=0, le=1)
+    weight: float = Field(description="关系权重", gt=0, le=1)
 
 
-class KnowledgeGraph(BaseModel):
-    """知识图谱"""
-    entities: Dict[str, KnowledgeEntity] = Field(description="实体字典")
-    relations: List[KnowledgeRelation] = Field(description="关系列表")
+class KnowledgeGraph:
+    """
+    知识图谱
+    实体保留为 Pydantic 模型；关系存入带邻接索引的 GraphStore，
+    内部不为每条边创建模型对象，只在返回结果时才转换为 KnowledgeRelation。
+    """
+
+    def __init__(self, entities: Dict[str, KnowledgeEntity], relations: Iterable[KnowledgeRelation] = ()):
+        self.entities = entities
+        self.store = GraphStore()
+        for entity_id in entities:
+            self.store.add_node(entity_id)
+        for relation in relations:
+            self.add_relation(relation)
+
+    def add_relation(self, relation: KnowledgeRelation):
+        self.store.add_edge(relation.source_id, relation.target_id, relation.relation_type, relation.weight)
+
+    @property
+    def relation_count(self) -> int:
+        return self.store.edge_count
+
+    def _to_relation(self, edge_id: int) -> KnowledgeRelation:
+        edge = self.store.edge(edge_id)
+        return KnowledgeRelation(
+            source_id=edge.source,
+            target_id=edge.target,
+            relation_type=edge.relation_type,
+            weight=edge.weight,
+        )
+
+    def relations_from(self, entity_id: str, relation_types: Optional[Sequence[str]] = None) -> List[KnowledgeRelation]:
+        """以 entity_id 为源的关系（邻接索引，O(出度)）"""
+        return [self._to_relation(eid) for eid in self.store.edge_ids(entity_id, "out", relation_types)]
+
+    def relations_to(self, entity_id: str, relation_types: Optional[Sequence[str]] = None) -> List[KnowledgeRelation]:
+        """以 entity_id 为目标的关系（邻接索引，O(入度)）"""
+        return [self._to_relation(eid) for eid in self.store.edge_ids(entity_id, "in", relation_types)]
+
+    def expand(
+        self,
+        seed_ids: Iterable[str],
+        k: int = 2,
+        direction: str = "both",
+        min_weight: float = 0.0,
+        max_entities: Optional[int] = None,
+    ) -> Tuple[List[KnowledgeEntity], List[KnowledgeRelation]]:
+        """加权 k 跳扩展：返回按路径得分排序的实体，以及这些实体之间的关系"""
+        hops = self.store.k_hop(seed_ids, k=k, direction=direction, min_weight=min_weight, max_nodes=max_entities)
+        node_ids = [h.node for h in hops]
+        entities = [self.entities[n] for n in node_ids if n in self.entities]
+        relations = [self._to_relation(eid) for eid in self.store.subgraph_edges(node_ids)]
+        return entities, relations
 
 
 class RetrievedContext(BaseModel):
@@ -67,31 +122,36 @@ def create_medical_knowledge_graph() -> KnowledgeGraph:
             id="diabetes",
             name="糖尿病",
             type="disease", 
-            description="一种慢性代谢性疾病，特征是高血糖"
+            description="一种慢性代谢性疾病，特征是高血糖",
+            aliases=["diabetes", "消渴症"]
         ),
         "insulin": KnowledgeEntity(
             id="insulin", 
             name="胰岛素",
             type="treatment",
-            description="用于治疗糖尿病的激素药物"
+            description="用于治疗糖尿病的激素药物",
+            aliases=["insulin"]
         ),
         "metformin": KnowledgeEntity(
             id="metformin",
             name="二甲双胍",
             type="treatment",
-            description="口服降糖药物，常用于2型糖尿病"
+            description="口服降糖药物，常用于2型糖尿病",
+            aliases=["metformin"]
         ),
         "heart_disease": KnowledgeEntity(
             id="heart_disease",
             name="心脏病", 
             type="disease",
-            description="影响心脏功能的疾病总称"
+            description="影响心脏功能的疾病总称",
+            aliases=["心血管疾病"]
         ),
         "ai_diagnosis": KnowledgeEntity(
             id="ai_diagnosis",
             name="AI辅助诊断",
             type="technology",
-            description="使用人工智能技术辅助医疗诊断"
+            description="使用人工智能技术辅助医疗诊断",
+            aliases=["AI", "人工智能"]
         )
     }
     
@@ -125,6 +185,34 @@ def create_medical_knowledge_graph() -> KnowledgeGraph:
     return KnowledgeGraph(entities=entities, relations=relations)
 
 
+# 模拟的医疗文档语料：入库时会被切分为文本块并向量化
+MEDICAL_DOCUMENTS: Dict[str, str] = {
+    "diabetes_overview": (
+        "糖尿病是一种慢性代谢性疾病，全球有数亿患者。"
+        "长期高血糖会损伤血管和神经，血糖控制不佳的患者更容易出现心脏病等心血管并发症。"
+    ),
+    "diabetes_treatment": (
+        "胰岛素是治疗糖尿病的关键药物，需要定期注射。"
+        "二甲双胍是2型糖尿病的一线口服降糖药物，通常与饮食控制和运动配合使用。"
+    ),
+    "ai_in_medicine": (
+        "人工智能在医疗诊断中的应用包括影像分析、病历理解和风险预测。"
+        "AI技术可以辅助糖尿病诊断和个性化治疗方案制定，例如通过眼底照片筛查糖尿病视网膜病变。"
+    ),
+}
+
+# 向量索引持久化目录：重启后直接内存映射加载，无需重新向量化
+RAG_INDEX_DIR = Path(os.getenv("RAG_INDEX_DIR", Path(tempfile.gettempdir()) / "pydantic-lab-rag-index"))
+
+
+def build_entity_linker(graph: KnowledgeGraph) -> EntityLinker:
+    """用实体名称和别名构建实体链接索引（Aho-Corasick 自动机）"""
+    linker = EntityLinker()
+    for entity in graph.entities.values():
+        linker.add_entity(entity.id, [entity.name, *entity.aliases])
+    return linker.build()
+
+
 # ==================== RAG Agent 定义 ====================
 
 # 1. 查询理解Agent
@@ -158,61 +246,108 @@ multi_hop_reasoning_agent = Agent(
 class AdvancedRAGSystem:
     """知识图谱增强的RAG系统"""
     
-    def __init__(self):
+    def __init__(self, skip_analysis_threshold: float = 0.9, min_lexical_entities: int = 2):
+        # 快速通道：词典匹配的置信度 ≥ 阈值且命中足够多实体时，跳过 LLM 查询理解
+        self.skip_analysis_threshold = skip_analysis_threshold
+        self.min_lexical_entities = min_lexical_entities
         self.knowledge_graph = create_medical_knowledge_graph()
+        self.entity_linker = build_entity_linker(self.knowledge_graph)
+        # 离线哈希向量化即可运行示例；生产中可换成 OpenAIEmbedder 等真实 Embedding 模型
+        self.embedder = HashingEmbedder()
+        self.vector_store: Optional[VectorStore] = None
+        self._vector_store_lock = asyncio.Lock()  # 并发的首次检索只构建一次索引
         self.query_understander = query_understanding_agent
         self.knowledge_retriever = knowledge_retrieval_agent
         self.reasoning_engine = multi_hop_reasoning_agent
     
     def retrieve_from_knowledge_graph(self, query_analysis: str) -> RetrievedContext:
-        """从知识图谱中检索相关信息"""
+        """从知识图谱中检索相关信息：实体链接 → 图扩展"""
         
-        # 模拟检索逻辑 - 实际应该使用图数据库查询
-        entities = []
-        relations = []
-        text_chunks = []
-        
-        # 简单的内容匹配检索
-        if "糖尿病" in query_analysis:
-            entities.append(self.knowledge_graph.entities["diabetes"])
-            entities.append(self.knowledge_graph.entities["insulin"])
-            relations.extend([r for r in self.knowledge_graph.relations 
-                           if r.source_id == "diabetes"])
-            
-            text_chunks.extend([
-                "糖尿病是一种慢性代谢性疾病，全球有数亿患者",
-                "胰岛素是治疗糖尿病的关键药物，需要定期注射",
-                "AI技术可以辅助糖尿病诊断和个性化治疗方案制定"
-            ])
+        # 单次扫描文本即可找出所有实体提及，耗时与实体数量无关
+        return self.retrieve_for_entities(self.entity_linker.entity_ids(query_analysis))
+    
+    def retrieve_for_entities(self, seed_ids: List[str]) -> RetrievedContext:
+        """以给定实体为种子检索子图与文本证据"""
+        if not seed_ids:
+            return RetrievedContext(text_chunks=[], entities=[], relations=[])
         
-        if "AI" in query_analysis or "人工智能" in query_analysis:
-            entities.append(self.knowledge_graph.entities["ai_diagnosis"])
-            text_chunks.append(
-                "人工智能在医疗诊断中的应用包括影像分析、病历理解和风险预测"
-            )
+        # 以链接到的实体为种子，沿出边扩展一跳（治疗方式、并发症等）
+        entities, relations = self.knowledge_graph.expand(seed_ids, k=1, direction="out")
         
         return RetrievedContext(
-            text_chunks=text_chunks,
+            text_chunks=[],
             entities=entities,
             relations=relations
         )
     
+    async def retrieve_text_chunks(self, question: str, k: int = 4) -> List[str]:
+        """向量检索文本证据：首次调用时加载（或构建）持久化索引"""
+        if self.vector_store is None:
+            async with self._vector_store_lock:
+                if self.vector_store is None:
+                    self.vector_store = await VectorStore.open_or_build(
+                        RAG_INDEX_DIR, MEDICAL_DOCUMENTS, self.embedder
+                    )
+        hits = await self.vector_store.search(question, k=k, min_score=0.1)
+        return [hit.text for hit in hits]
+    
+    def lexical_confidence(self, mentions: List[Mention]) -> float:
+        """词典匹配置信度：无歧义（只对应一个实体）的提及占比；没有任何提及时为 0"""
+        if not mentions:
+            return 0.0
+        return sum(1 for m in mentions if len(m.entity_ids) == 1) / len(mentions)
+    
     async def answer_question(self, question: str) -> MultiHopAnswer:
         """回答复杂问题"""
         
         print(f"🧠 处理问题: {question}")
         
-        # 阶段1: 查询理解
-        print("🔍 阶段1 - 查询理解")
-        query_analysis = await self.query_understander.run(
-            f"请分析以下问题的关键实体和关系: {question}"
+        # 阶段1 + 阶段2: 查询理解与知识检索并行
+        # 词典实体链接是纯本地计算（微秒级），直接作用于原始问题；
+        # LLM 查询理解在后台同时进行，只用来“补充”词典没认出来的实体。
+        mentions = self.entity_linker.link(question)
+        lexical_ids = self.entity_linker.entity_ids(question)
+        confidence = self.lexical_confidence(mentions)
+        skip_analysis = (
+            confidence >= self.skip_analysis_threshold and len(lexical_ids) >= self.min_lexical_entities
         )
         
-        # 阶段2: 知识检索  
-        print("📚 阶段2 - 知识检索")
-        context = self.retrieve_from_knowledge_graph(query_analysis.output)
+        analysis_task = None
+        if skip_analysis:
+            print(f"⚡ 词典匹配无歧义 (置信度 {confidence:.2f})，跳过 LLM 查询理解")
+        else:
+            print("🔍 阶段1 - 查询理解（后台进行）")
+            analysis_task = asyncio.create_task(self.query_understander.run(
+                f"请分析以下问题的关键实体和关系: {question}"
+            ))
+        
+        # 不等 LLM：先用词典结果完成图检索，同时启动向量检索
+        print("📚 阶段2 - 知识检索（词典快速通道 + 向量检索）")
+        chunks_task = asyncio.create_task(self.retrieve_text_chunks(question))
+        try:
+            context = self.retrieve_for_entities(lexical_ids)
+
+            if analysis_task is not None:
+                try:
+                    query_analysis = await analysis_task
+                except Exception as e:
+                    # 查询理解只是“补充”：LLM 失败时沿用词典快速通道的检索结果，不让整次回答失败
+                    print(f"⚠️ 查询理解失败 ({type(e).__name__}: {e})，沿用词典检索结果")
+                else:
+                    # LLM 补充了新实体时才重新检索
+                    llm_ids = self.entity_linker.entity_ids(query_analysis.output)
+                    new_ids = [eid for eid in llm_ids if eid not in lexical_ids]
+                    if new_ids:
+                        print(f"🔁 查询理解补充了实体 {new_ids}，精化检索结果")
+                        context = self.retrieve_for_entities(lexical_ids + new_ids)
+            context.text_chunks = await chunks_task
+        finally:
+            # 任何一步失败（或调用方取消）时，不把后台任务留在事件循环里继续跑
+            for task in (analysis_task, chunks_task):
+                if task is not None and not task.done():
+                    task.cancel()
         
-        print(f"✅ 检索到 {len(context.entities)} 个实体, {len(context.relations)} 个关系")
+        print(f"✅ 检索到 {len(context.entities)} 个实体, {len(context.relations)} 个关系, {len(context.text_chunks)} 个文本片段")
         
         # 阶段3: 多跳推理
         print("🤔 阶段3 - 多跳推理")
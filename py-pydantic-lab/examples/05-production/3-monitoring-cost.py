@@ -5,44 +5,69 @@
 """
 
 import asyncio
+import os
+import tempfile
 import time
 import sys
 from pathlib import Path
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Any
 from datetime import datetime
+import numpy as np
 from pydantic import BaseModel, Field
 from pydantic_ai import Agent
+from pydantic_ai.models import Model
 
 # 环境配置
 root = Path(__file__).resolve().parents[1]
 sys.path.append(str(root))
-from common.models import get_model
+from common.models import current_model_key, get_model
+from common.pricing import PricingTable
+from common.metrics_store import APICallMetrics, MetricsRingBuffer, prompt_fingerprint
+from common.metrics_sketch import SketchRegistry
+from common.metrics_rollup import RollupEngine
+from common.metrics_concurrency import ConcurrencyTracker
+from common.metrics_export import ConsoleSink, JSONLSink, MetricsExporter, OpenMetricsSink, OTLPHttpSink
+from common.metrics_log import MetricsLog, MetricsLogSink
+from common.token_usage import TokenEstimator, default_estimator, token_counts_from_result
+from common.budget import BudgetExceededError, BudgetLimit, BudgetManager, Reservation
+from common.anomaly import MetricsAnalyzer
 
 
 # ==================== 监控领域模型 ====================
 
-@dataclass
-class APICallMetrics:
-    """API调用指标"""
-    timestamp: datetime
-    model: str
-    operation: str  # 'completion', 'chat', 'embedding'
-    prompt_tokens: int
-    completion_tokens: int
-    total_tokens: int
-    latency_ms: float
-    success: bool
-    cost_usd: float
+# APICallMetrics（单次API调用指标）定义在 common/metrics_store.py，与列式存储共用
+
+
+class LatencyPercentiles(BaseModel):
+    """延迟分位数（来自可合并的对数分桶直方图，相对误差约1%）"""
+    count: int = Field(description="样本数")
+    p50_ms: float = Field(description="P50延迟毫秒")
+    p95_ms: float = Field(description="P95延迟毫秒")
+    p99_ms: float = Field(description="P99延迟毫秒")
+    max_ms: float = Field(description="最大延迟毫秒")
 
 
 class SystemMetrics(BaseModel):
     """系统监控指标"""
     timestamp: datetime = Field(description="指标时间")
-    active_requests: int = Field(description="活跃请求数")
+    active_requests: int = Field(description="当前在途请求数（真实并发）")
+    inflight_by_model: Dict[str, int] = Field(default_factory=dict, description="各模型在途请求数")
+    waiting_requests: int = Field(default=0, description="等待并发槽位的请求数")
+    peak_concurrency_1m: int = Field(default=0, description="最近1分钟峰值并发")
+    suggested_concurrency_limit: int = Field(default=0, description="最近1小时每秒峰值并发的P99（信号量/连接池参考值）")
+    queue_wait_p95_ms: float = Field(default=0.0, description="排队等待P95毫秒")
+    service_time_p95_ms: float = Field(default=0.0, description="服务时间P95毫秒")
     error_rate: float = Field(description="错误率", ge=0, le=1)
     avg_latency_ms: float = Field(description="平均延迟毫秒")
+    latency: LatencyPercentiles = Field(description="全局延迟分位数")
+    latency_by_route: Dict[str, LatencyPercentiles] = Field(
+        default_factory=dict, description="按 模型/操作 划分的延迟分位数"
+    )
     total_cost_today: float = Field(description="今日总成本USD")
+    cache_read_tokens_today: int = Field(default=0, description="今日命中提示缓存的输入Token数")
+    cache_hit_ratio: float = Field(default=0.0, description="今日输入Token的缓存命中率", ge=0, le=1)
+    calls_last_5m: int = Field(default=0, description="最近5分钟调用数")
+    error_rate_last_5m: float = Field(default=0.0, description="最近5分钟错误率", ge=0, le=1)
     token_usage: Dict[str, int] = Field(description="各模型Token使用量")
 
 
@@ -59,65 +84,103 @@ class CostOptimizationAdvice(BaseModel):
 class MonitoringSystem:
     """监控系统"""
     
-    def __init__(self):
-        self.api_calls: List[APICallMetrics] = []
-        self.cost_rates = {
-            'gpt-4': {'input': 0.03, 'output': 0.06},  # 每1K tokens
-            'gpt-3.5-turbo': {'input': 0.0015, 'output': 0.002},
-            'claude-3': {'input': 0.015, 'output': 0.075}
-        }
+    def __init__(self, capacity: int = 100_000, exporter: Optional[MetricsExporter] = None,
+                 pricing: Optional[PricingTable] = None, provider: Optional[str] = None):
+        # 固定容量的列式环形缓冲区：内存有上限，聚合指标随写入增量更新
+        self.store = MetricsRingBuffer(capacity)
+        # 每个(模型, 操作)一个延迟直方图：内存恒定，多进程的直方图可直接合并
+        self.latency_sketches = SketchRegistry()
+        # 1秒/1分钟/1小时 滚动窗口预聚合（各自保留1小时/2天/30天），窗口查询不扫描原始记录
+        self.rollups = RollupEngine()
+        # 在途/排队计数、排队vs服务时间、每秒并发序列（由 MonitoredAgent 调用 track() 维护）
+        self.concurrency = ConcurrencyTracker()
+        # 异步导出管道：请求路径上只做入队，批量写出由后台任务完成
+        self.exporter = exporter
+        # 价格表从带版本号的价格文件加载（common/pricing.json 或 PRICING_FILE），按 供应商+模型通配符 匹配
+        self.pricing = pricing or PricingTable.load()
+        self.provider = provider
     
     def record_api_call(self, metrics: APICallMetrics):
         """记录API调用指标"""
-        self.api_calls.append(metrics)
+        self.store.append(metrics)
+        self.latency_sketches.record(metrics.model, metrics.operation, metrics.latency_ms)
+        self.rollups.add_call(metrics)
         
-        # 简单的控制台输出（实际应该发送到监控系统）
-        print(f"📊 API调用: {metrics.model} | Tokens: {metrics.total_tokens} | "
-              f"耗时: {metrics.latency_ms:.0f}ms | 成本: ${metrics.cost_usd:.6f}")
+        # 非阻塞入队；队列接近满时采样、满时丢弃，并计数
+        if self.exporter is not None:
+            self.exporter.submit(metrics)
     
-    def calculate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
-        """计算调用成本"""
-        if model not in self.cost_rates:
-            return 0.0
-        
-        rates = self.cost_rates[model]
-        input_cost = (prompt_tokens / 1000) * rates['input']
-        output_cost = (completion_tokens / 1000) * rates['output']
-        return input_cost + output_cost
+    def calculate_cost(self, model: str, prompt_tokens: int, completion_tokens: int,
+                       cache_read_tokens: int = 0, reasoning_tokens: int = 0,
+                       provider: Optional[str] = None) -> float:
+        """计算调用成本（缓存命中的输入Token与推理Token按各自费率计价）"""
+        return self.pricing.cost(
+            model, prompt_tokens, completion_tokens, cache_read_tokens, reasoning_tokens,
+            provider=provider or self.provider
+        )
+    
+    def reprice_buffered(self, pricing: Optional[PricingTable] = None) -> float:
+        """用(新)价格表向量化重算缓冲区内全部调用的成本，返回总额"""
+        pricing = pricing or self.pricing
+        return float(pricing.reprice(self.store.columns(), self.store.models, self.provider,
+                                     providers=self.store.providers).sum())
     
     def get_system_metrics(self) -> SystemMetrics:
-        """获取系统级指标"""
-        today_calls = [m for m in self.api_calls 
-                      if m.timestamp.date() == datetime.now().date()]
-        
-        if not today_calls:
-            return SystemMetrics(
-                timestamp=datetime.now(),
-                active_requests=0,
-                error_rate=0,
-                avg_latency_ms=0,
-                total_cost_today=0,
-                token_usage={}
-            )
-        
-        total_cost = sum(m.cost_usd for m in today_calls)
-        error_rate = sum(1 for m in today_calls if not m.success) / len(today_calls)
-        avg_latency = sum(m.latency_ms for m in today_calls) / len(today_calls)
-        
-        token_usage = {}
-        for call in today_calls:
-            if call.model not in token_usage:
-                token_usage[call.model] = 0
-            token_usage[call.model] += call.total_tokens
+        """获取系统级指标（读取增量维护的今日聚合，不扫描调用记录）"""
+        today = self.store.today_totals()
+        last_5m = self.rollups.window(300)
+        concurrency = self.concurrency
         
         return SystemMetrics(
             timestamp=datetime.now(),
-            active_requests=len([m for m in self.api_calls if m.latency_ms < 1000]),  # 简化
-            error_rate=error_rate,
-            avg_latency_ms=avg_latency,
-            total_cost_today=total_cost,
-            token_usage=token_usage
+            active_requests=concurrency.total_inflight,
+            inflight_by_model={model: n for model, n in concurrency.inflight.items() if n},
+            waiting_requests=sum(concurrency.waiting.values()),
+            peak_concurrency_1m=concurrency.peak_in_flight(60),
+            suggested_concurrency_limit=concurrency.suggested_limit(),
+            queue_wait_p95_ms=concurrency.queue_time.combined().percentiles().p95,
+            service_time_p95_ms=concurrency.service_time.combined().percentiles().p95,
+            error_rate=today.error_rate,
+            avg_latency_ms=today.avg_latency_ms,
+            latency=_to_percentiles(self.latency_sketches.combined()),
+            latency_by_route={
+                f"{model}/{operation}": _to_percentiles(sketch)
+                for (model, operation), sketch in self.latency_sketches.sketches.items()
+            },
+            total_cost_today=today.cost_usd,
+            cache_read_tokens_today=today.cache_read_tokens,
+            cache_hit_ratio=today.cache_hit_ratio,
+            calls_last_5m=last_5m.count,
+            error_rate_last_5m=last_5m.error_rate,
+            token_usage=self.store.token_usage(today)
         )
+    
+    def restore_from_log(self, log: MetricsLog, since_seconds: float = 30 * 86400) -> int:
+        """启动时从分段日志重放（mmap，无逐行解析）：恢复环形缓冲区、今日聚合、滚动窗口与延迟直方图"""
+        columns = log.read_columns(start=time.time() - since_seconds)
+        n = len(columns["timestamp"])
+        if not n:
+            return 0
+        models, operations = log.symbols("model"), log.symbols("operation")
+        self.store.load_columns(columns, models, operations, log.symbols("template"), log.symbols("provider"))
+        self.rollups.ingest_columns(columns)
+        # 按(模型, 操作)分组批量写入直方图
+        route = columns["model_id"].astype(np.int64) * len(operations) + columns["operation_id"]
+        for key in np.unique(route):
+            model_id, operation_id = divmod(int(key), len(operations))
+            self.latency_sketches.sketch(models[model_id], operations[operation_id]).add_many(
+                columns["latency_ms"][route == key])
+        return n
+    
+    def hourly_cost(self, days: int = 7) -> List[tuple]:
+        """最近N天的每小时成本（来自1小时粒度的预聚合桶）"""
+        return [(datetime.fromtimestamp(start), totals.cost_usd)
+                for start, totals in self.rollups.series("1h", days * 86400)]
+
+
+def _to_percentiles(sketch) -> LatencyPercentiles:
+    p = sketch.percentiles()
+    return LatencyPercentiles(count=p.count, p50_ms=p.p50, p95_ms=p.p95, p99_ms=p.p99, max_ms=p.max)
 
 
 # ==================== 成本优化Agent ====================
@@ -125,67 +188,146 @@ class MonitoringSystem:
 cost_optimization_agent = Agent(
     model=get_model(),
     output_type=CostOptimizationAdvice,
-    system_prompt="""你是一个成本优化专家。分析API使用模式，提出具体的成本优化建议。
-考虑模型选择、提示工程、缓存策略等方面。给出具体的节省估算。"""
+    system_prompt="""你是一个成本优化专家。你收到的是确定性分析器从监控数据中检测出的问题清单（含证据数字），
+而不是原始数据。基于这些发现提出具体的成本优化建议，考虑模型选择、提示工程、缓存策略等方面。
+节省估算必须以发现中给出的数字为依据。"""
 )
 
 
 # ==================== 带监控的Agent包装器 ====================
 
+class BudgetRoute(NamedTuple):
+    """预算不足时可改用的（更便宜的）模型"""
+    model_name: str
+    provider: Optional[str]
+    model: Optional[Model]  # None 表示使用Agent自身的模型
+
+
 class MonitoredAgent:
     """带监控的Agent包装器"""
     
-    def __init__(self, agent: Agent, model_name: str, monitoring: MonitoringSystem):
+    def __init__(self, agent: Agent, model_name: str, monitoring: MonitoringSystem,
+                 estimator: Optional[TokenEstimator] = None, max_concurrency: Optional[int] = None,
+                 budget: Optional[BudgetManager] = None, tenant: str = "default",
+                 cheaper_routes: Sequence[BudgetRoute] = (), expected_completion_tokens: int = 512):
         self.agent = agent
         self.model_name = model_name
         self.monitoring = monitoring
+        # 调用前的预算准入：按租户/全局滑动窗口预留预估用量，超限时改走更便宜的模型或拒绝
+        self.budget = budget
+        self.tenant = tenant
+        self.routes = [BudgetRoute(model_name, monitoring.provider, None), *cheaper_routes]
+        self.expected_completion_tokens = expected_completion_tokens
+        # 可选的并发上限：超出的调用在信号量上排队，排队时长计入 queue_time
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        # 仅在供应商未返回usage时使用的估算器（带缓存，优先tiktoken）
+        self.estimator = estimator or default_estimator()
     
-    async def run_with_monitoring(self, *args, **kwargs) -> Any:
-        """带监控的运行方法"""
-        start_time = time.time()
+    def _admit(self, user_prompt: Any) -> Tuple[BudgetRoute, Optional[Reservation]]:
+        """预估本次用量并在预算内预留；主模型超限则依次尝试更便宜的路由（同步执行，无需加锁）"""
+        if self.budget is None:
+            return self.routes[0], None
+        prompt_tokens = self.estimator.count(user_prompt) if isinstance(user_prompt, str) else 0
+        tokens = prompt_tokens + self.expected_completion_tokens
+        candidates = [
+            (tokens, self.monitoring.calculate_cost(
+                route.model_name, prompt_tokens, self.expected_completion_tokens, provider=route.provider))
+            for route in self.routes
+        ]
+        # 所有路由都超限时抛出 BudgetExceededError（只计一次拒绝）；用上更便宜路由时计一次改道
+        index, reservation = self.budget.reserve_first(self.tenant, candidates)
+        return self.routes[index], reservation
+    
+    async def run_with_monitoring(self, *args, template: str = "", **kwargs) -> Any:
+        """带监控的运行方法（预算准入 -> 排队 -> 调用 -> 用实际用量核销预留）
         
+        template: 提示模板/调用点标签，异常分析按 模型+模板 分组
+        """
+        user_prompt = args[0] if args else kwargs.get("user_prompt")
+        route, reservation = self._admit(user_prompt)
+        # 提示指纹用于发现重复提示（响应缓存的候选）
+        labels = {"template": template,
+                  "prompt_hash": prompt_fingerprint(user_prompt) if isinstance(user_prompt, str) else 0}
         try:
-            result = await self.agent.run(*args, **kwargs)
-            end_time = time.time()
+            return await self._run_route(route, reservation, labels, *args, **kwargs)
+        finally:
+            # 异常/取消时退还尚未核销的预留
+            if reservation is not None:
+                self.budget.release(reservation)
+    
+    async def _run_route(self, route: BudgetRoute, reservation: Optional[Reservation], labels: Dict[str, Any],
+                         *args, **kwargs) -> Any:
+        if route.model is not None:
+            kwargs["model"] = route.model
+        async with self.monitoring.concurrency.track(route.model_name, semaphore=self._semaphore):
+            # 拿到并发槽位后才开始计时：latency_ms 只含服务时间，排队时间由 track() 单独记录
+            start_time = time.time()
             
-            # 计算Token使用（简化，实际应该从响应中提取）
-            prompt_tokens = len(str(args)) // 4  # 近似计算
-            completion_tokens = len(str(result)) // 4
+            try:
+                result = await self.agent.run(*args, **kwargs)
+                end_time = time.time()
             
-            metrics = APICallMetrics(
-                timestamp=datetime.now(),
-                model=self.model_name,
-                operation='completion',
-                prompt_tokens=prompt_tokens,
-                completion_tokens=completion_tokens,
-                total_tokens=prompt_tokens + completion_tokens,
-                latency_ms=(end_time - start_time) * 1000,
-                success=True,
-                cost_usd=self.monitoring.calculate_cost(
-                    self.model_name, prompt_tokens, completion_tokens
+                # 使用供应商返回的真实用量；缺失时才根据消息内容估算（不再 str(result)）
+                usage = token_counts_from_result(result, self.estimator)
+            
+                metrics = APICallMetrics(
+                    timestamp=datetime.now(),
+                    model=route.model_name,
+                    operation='completion',
+                    provider=route.provider or "",  # 改道后的调用按实际供应商的价格重算
+                    prompt_tokens=usage.prompt_tokens,
+                    completion_tokens=usage.completion_tokens,
+                    total_tokens=usage.total_tokens,
+                    latency_ms=(end_time - start_time) * 1000,
+                    success=True,
+                    cost_usd=self.monitoring.calculate_cost(
+                        route.model_name, usage.prompt_tokens, usage.completion_tokens,
+                        usage.cache_read_tokens, usage.reasoning_tokens, provider=route.provider
+                    ),
+                    cache_read_tokens=usage.cache_read_tokens,
+                    reasoning_tokens=usage.reasoning_tokens,
+                    usage_estimated=usage.estimated,
+                    **labels,
                 )
-            )
             
-            self.monitoring.record_api_call(metrics)
-            return result
+                self.monitoring.record_api_call(metrics)
+                if reservation is not None:
+                    self.budget.reconcile(reservation, metrics.total_tokens, metrics.cost_usd)
+                return result
             
-        except Exception as e:
-            end_time = time.time()
+            except Exception as e:
+                end_time = time.time()
             
-            metrics = APICallMetrics(
-                timestamp=datetime.now(),
-                model=self.model_name,
-                operation='completion',
-                prompt_tokens=0,
-                completion_tokens=0,
-                total_tokens=0,
-                latency_ms=(end_time - start_time) * 1000,
-                success=False,
-                cost_usd=0
-            )
+                metrics = APICallMetrics(
+                    timestamp=datetime.now(),
+                    model=route.model_name,
+                    operation='completion',
+                    provider=route.provider or "",
+                    prompt_tokens=0,
+                    completion_tokens=0,
+                    total_tokens=0,
+                    latency_ms=(end_time - start_time) * 1000,
+                    success=False,
+                    cost_usd=0,
+                    **labels,
+                )
             
-            self.monitoring.record_api_call(metrics)
-            raise e
+                self.monitoring.record_api_call(metrics)
+                raise e
+
+
+# ==================== 导出管道配置 ====================
+
+def build_exporter(metrics_log: Optional[MetricsLog] = None) -> MetricsExporter:
+    """控制台 + JSONL文件 + OpenMetrics计数器（+ 分段日志）；设置 OTEL_EXPORTER_OTLP_ENDPOINT 时再推送到本地OTLP采集器"""
+    jsonl_path = os.getenv("METRICS_JSONL_PATH") or os.path.join(tempfile.gettempdir(), "pydantic-lab-metrics.jsonl")
+    sinks = [ConsoleSink(), JSONLSink(jsonl_path), OpenMetricsSink()]
+    if metrics_log is not None:
+        sinks.append(MetricsLogSink(metrics_log))
+    otlp_endpoint = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+    if otlp_endpoint:
+        sinks.append(OTLPHttpSink(otlp_endpoint.rstrip("/") + "/v1/metrics"))
+    return MetricsExporter(sinks, batch_size=100, flush_interval=1.0)
 
 
 # ==================== 使用示例 ====================
@@ -193,8 +335,17 @@ class MonitoredAgent:
 async def main():
     """监控与成本优化示例"""
     
-    # 初始化监控系统
-    monitoring_system = MonitoringSystem()
+    # 初始化监控系统（导出在后台任务中进行）；指标同时追加到磁盘分段日志，重启后可重放
+    metrics_log = MetricsLog(os.getenv("METRICS_LOG_DIR") or os.path.join(tempfile.gettempdir(), "pydantic-lab-metrics-log"))
+    exporter = build_exporter(metrics_log)
+    exporter.start()
+    model_key = current_model_key()
+    monitoring_system = MonitoringSystem(exporter=exporter, provider=model_key.provider)
+    
+    started = time.perf_counter()
+    restored = monitoring_system.restore_from_log(metrics_log)
+    if restored:
+        print(f"♻️ 从分段日志重放 {restored} 条历史调用，用时 {(time.perf_counter() - started) * 1000:.0f}ms")
     
     # 创建带监控的Agent
     base_agent = Agent(
@@ -202,10 +353,25 @@ async def main():
         system_prompt="你是一个有帮助的AI助手"
     )
     
+    # 预算：每租户每分钟Token上限 + 全局每日成本上限；可选的降级供应商用于超预算时改道
+    budget = BudgetManager(
+        global_limits=[BudgetLimit(86400, max_cost_usd=float(os.getenv("BUDGET_USD_PER_DAY", "1.0")))],
+        default_tenant_limits=[BudgetLimit(60, max_tokens=int(os.getenv("BUDGET_TOKENS_PER_MINUTE", "2000")))],
+    )
+    cheaper_routes = []
+    fallback_provider = os.getenv("BUDGET_FALLBACK_PROVIDER")
+    if fallback_provider:
+        fallback_key = current_model_key(fallback_provider)
+        cheaper_routes.append(BudgetRoute(fallback_key.model_name, fallback_key.provider, get_model(fallback_provider)))
+    
     monitored_agent = MonitoredAgent(
         agent=base_agent,
-        model_name="gpt-4",  # 假设使用GPT-4
-        monitoring=monitoring_system
+        model_name=model_key.model_name,  # 按实际使用的模型计价
+        monitoring=monitoring_system,
+        max_concurrency=2,  # 超出的请求排队，可在指标中看到排队时间
+        budget=budget,
+        tenant="demo",
+        cheaper_routes=cheaper_routes
     )
     
     print("🚀 开始模拟API调用...")
@@ -215,19 +381,27 @@ async def main():
         "请解释人工智能的基本概念",
         "写一篇关于机器学习的简短介绍", 
         "生成一些Python代码示例",
-        "帮助我理解深度学习"
+        "帮助我理解深度学习",
+        "请解释人工智能的基本概念"  # 重复提示：分析器会将其标记为缓存候选
     ]
     
-    for i, query in enumerate(queries, 1):
+    async def call(i: int, query: str):
+        # 模拟请求陆续到达
+        await asyncio.sleep(0.2 * i)
         print(f"\n📝 调用 {i}: {query}")
         try:
-            result = await monitored_agent.run_with_monitoring(query)
-            print(f"✅ 成功: {result.output[:100]}...")
+            result = await monitored_agent.run_with_monitoring(query, template="demo-question")
+            print(f"✅ 成功({i}): {result.output[:100]}...")
+        except BudgetExceededError as e:
+            print(f"⛔ 预算拒绝({i}): {e}")
         except Exception as e:
-            print(f"❌ 失败: {e}")
-        
-        # 模拟一些延迟
-        await asyncio.sleep(0.5)
+            print(f"❌ 失败({i}): {e}")
+    
+    # 并发发起调用：最多2个同时在途，其余排队
+    await asyncio.gather(*(call(i, query) for i, query in enumerate(queries, 1)))
+    
+    # 关闭前把队列中剩余的记录全部导出
+    await exporter.aclose()
     
     # 获取系统指标
     print("\n" + "="*60)
@@ -235,27 +409,40 @@ async def main():
     print("="*60)
     
     metrics = monitoring_system.get_system_metrics()
-    print(f"活跃请求数: {metrics.active_requests}")
+    print(f"在途请求数: {metrics.active_requests} | 最近1分钟峰值并发: {metrics.peak_concurrency_1m} | "
+          f"建议并发上限: {metrics.suggested_concurrency_limit}")
+    print(f"排队P95: {metrics.queue_wait_p95_ms:.0f}ms | 服务P95: {metrics.service_time_p95_ms:.0f}ms")
     print(f"错误率: {metrics.error_rate:.1%}")
     print(f"平均延迟: {metrics.avg_latency_ms:.0f}ms")
-    print(f"今日总成本: ${metrics.total_cost_today:.6f}")
+    print(f"延迟分位: P50 {metrics.latency.p50_ms:.0f}ms | P95 {metrics.latency.p95_ms:.0f}ms | "
+          f"P99 {metrics.latency.p99_ms:.0f}ms | MAX {metrics.latency.max_ms:.0f}ms")
+    print(f"今日总成本: ${metrics.total_cost_today:.6f} (价格表版本 {monitoring_system.pricing.version})")
     print(f"Token使用: {metrics.token_usage}")
+    print(f"缓存命中Token: {metrics.cache_read_tokens_today} (命中率 {metrics.cache_hit_ratio:.1%})")
+    print(f"最近5分钟: {metrics.calls_last_5m} 次调用 | 错误率 {metrics.error_rate_last_5m:.1%}")
+    for hour, cost in monitoring_system.hourly_cost(days=1):
+        if cost:
+            print(f"  {hour:%m-%d %H:00} 成本: ${cost:.6f}")
+    print(f"导出统计: {exporter.stats()}")
+    print(f"预算: 准入 {budget.admitted} | 拒绝 {budget.rejected} | 改道 {budget.rerouted} | "
+          f"用量 {budget.usage('demo')}")
     
     # 成本优化建议
     print("\n" + "="*60)
     print("💡 成本优化建议")
     print("="*60)
     
-    optimization_data = f"""
-系统指标:
-- 总调用次数: {len(monitoring_system.api_calls)}
-- 总成本: ${metrics.total_cost_today:.6f}
-- 主要模型: {list(metrics.token_usage.keys())}
-- Token使用分布: {metrics.token_usage}
-"""
+    # 确定性分析器直接扫描列式存储；LLM只看精简后的发现清单
+    findings = MetricsAnalyzer().analyze(monitoring_system.store)
+    if not findings:
+        print("未发现异常或明显的优化点，跳过LLM建议")
+        return
+    for finding in findings:
+        print(f"  {finding.to_line()}")
     
+    optimization_data = "\n".join(f"- {finding.to_line()} 证据: {finding.evidence}" for finding in findings)
     advice_result = await cost_optimization_agent.run(
-        f"请分析以下使用数据并提出成本优化建议:\n{optimization_data}"
+        f"今日总成本 ${metrics.total_cost_today:.6f}，分析器发现:\n{optimization_data}\n请给出成本优化建议。"
     )
     advice = advice_result.output
     
@@ -0,0 +1,158 @@
+"""
+示例 05-production/6-semantic-cache.py: 语义缓存 (Semantic Cache)
+
+核心价值：近似重复的问题不再重复付费
+精确匹配缓存只对逐字节相同的请求有效，而用户会用很多种说法问同一个问题
+（“如何开具发票” / “发票怎么开”）。语义缓存对归一化后的问题做向量检索，
+相似度超过阈值即直接返回缓存结果，跳过整次 LLM 调用。
+
+对应 JS 版 enterprise-routing/06-semantic-cache-routing.js，并补上：
+1. 命中结果按 Agent 当前的 output_type 重新校验，结构变了就作废、回源；
+2. 按 Agent 隔离命名空间，LRU + TTL 淘汰；
+3. 基于回放查询日志的基准测试：命中率、误命中率、节省的延迟。
+"""
+
+import asyncio
+import sys
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel, Field
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelMessage, ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, FunctionModel
+
+# 将 examples 目录添加到 sys.path
+examples_root = Path(__file__).resolve().parents[1]
+if str(examples_root) not in sys.path:
+    sys.path.append(str(examples_root))
+
+from common.models import get_model
+from common.semantic_cache import SemanticCache, SemanticCachedAgent
+from common.vector_store import HashingEmbedder
+
+# --- 1. 路由 Agent（结构化输出）与 FAQ Agent（文本输出） ---
+
+Route = Literal["BILLING", "TECHNICAL", "SALES", "ACCOUNT"]
+
+class RouteDecision(BaseModel):
+    route: Route = Field(description="目标部门")
+    reason: str = Field(description="一句话说明理由")
+
+router_agent = Agent(
+    get_model(),
+    name="router",
+    output_type=RouteDecision,
+    system_prompt=(
+        "你是客服路由器。把用户问题分派到一个部门："
+        "BILLING(发票/付款/退款)、TECHNICAL(故障/报错)、SALES(购买/报价/会员)、ACCOUNT(登录/密码/账号)。"
+    ),
+)
+
+faq_agent = Agent(
+    get_model(),
+    name="faq",
+    system_prompt="你是客服 FAQ 助手，用两三句话回答用户的问题。",
+)
+
+# --- 2. 演示：沿用 JS 版的查询，外加标点/空格变体 ---
+
+async def demo():
+    print("--- 示例: 语义缓存 ---")
+    # 离线哈希向量化即可运行示例；生产中可换成 OpenAIEmbedder 等真实 Embedding 模型（阈值需重新标定）
+    cache = SemanticCache(HashingEmbedder(), threshold=0.95, max_entries=1024, ttl_seconds=3600)
+    router = SemanticCachedAgent(router_agent, cache)  # 命名空间默认取 Agent 名称："router"
+    faq = SemanticCachedAgent(faq_agent, cache)        # 同一个缓存，另一个命名空间："faq"
+
+    for query in ["软件启动不了，报 404", "我想买你们的会员", "我想买你们的会员！", "我想买 你们的会员"]:
+        result = await router.run(query)
+        tag = f"🚀 命中 (相似度 {result.score:.4f}，原问题「{result.matched_query}」)" if result.cache_hit else "🐢 未命中，已回源并写入缓存"
+        print(f"\n[路由] {query}\n  {tag}\n  -> {result.output.route}: {result.output.reason} ({result.elapsed_s * 1000:.1f} ms)")
+
+    # 同一句话在 FAQ 命名空间里互不影响：路由结果不会被当成 FAQ 答案返回
+    result = await faq.run("我想买你们的会员")
+    print(f"\n[FAQ] 命中={result.cache_hit} -> {result.output}")
+
+    print(f"\n[缓存统计] {cache.stats()}")
+
+# --- 3. 基准测试：回放带意图标注的查询日志 ---
+
+# (查询, 人工标注的意图)。包含：原样重复、标点/空格/全角差异、换个说法、以及字面相近但意图不同的“陷阱”
+QUERY_LOG = [
+    ("如何开具发票", "BILLING"),
+    ("系统无法启动，提示 404 错误", "TECHNICAL"),
+    ("我想买你们的会员", "SALES"),
+    ("如何开具发票？", "BILLING"),
+    ("我的密码忘记了怎么办", "ACCOUNT"),
+    ("如何 开具 发票！", "BILLING"),
+    ("系统无法启动,提示404错误", "TECHNICAL"),
+    ("怎么开具发票", "BILLING"),
+    ("我想买你们的会员！", "SALES"),
+    ("我想退掉你们的会员", "BILLING"),
+    ("系统无法登录，提示密码错误", "ACCOUNT"),
+    ("ＶＩＰ会员多少钱", "SALES"),
+    ("vip会员多少钱", "SALES"),
+    ("我的密码忘记了，怎么办？", "ACCOUNT"),
+    ("发票抬头开错了怎么办", "BILLING"),
+    ("系统无法启动 提示 404 错误", "TECHNICAL"),
+    ("我想买你们的企业版会员", "SALES"),
+    ("如何开具增值税专用发票", "BILLING"),
+    ("系统启动后报 500 错误", "TECHNICAL"),
+    ("我的账号被锁定了怎么办", "ACCOUNT"),
+    ("如何开具发票", "BILLING"),
+    ("我想买你们的会员", "SALES"),
+    ("我的密码忘记了怎么办", "ACCOUNT"),
+    ("发票抬头开错了，怎么办？", "BILLING"),
+    ("我想退掉你们的会员。", "BILLING"),
+    ("VIP 会员多少钱？", "SALES"),
+]
+
+SIMULATED_LATENCY_S = 0.1  # 模拟一次 LLM 往返的耗时
+
+_KEYWORDS = [("BILLING", ("发票", "退", "付款")), ("ACCOUNT", ("密码", "账号", "登录")),
+             ("TECHNICAL", ("启动", "错误", "报")), ("SALES", ("买", "会员", "多少钱"))]
+
+async def simulated_router(messages: list[ModelMessage], info: AgentInfo) -> ModelResponse:
+    """离线模拟的路由模型：关键词规则 + 固定延迟，保证基准测试可复现且不产生费用。"""
+    await asyncio.sleep(SIMULATED_LATENCY_S)
+    prompt = messages[-1].parts[-1].content
+    route = next((r for r, words in _KEYWORDS if any(w in prompt for w in words)), "SALES")
+    return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"route": route, "reason": "关键词规则"})])
+
+async def benchmark(thresholds=(0.9999, 0.95, 0.7, 0.6, 0.5)):
+    print(f"\n--- 基准测试: 回放 {len(QUERY_LOG)} 条查询 (模拟 LLM 延迟 {SIMULATED_LATENCY_S * 1000:.0f} ms) ---")
+    print(f"{'阈值':>8} {'命中率':>8} {'误命中率':>8} {'节省延迟':>10} {'检索开销':>10}")
+    intent_of = {}
+    for query, intent in QUERY_LOG:
+        intent_of.setdefault(query, intent)
+
+    with router_agent.override(model=FunctionModel(simulated_router)):
+        for threshold in thresholds:
+            cache = SemanticCache(HashingEmbedder(), threshold=threshold)
+            router = SemanticCachedAgent(router_agent, cache)
+            hits = false_hits = 0
+            for query, intent in QUERY_LOG:
+                result = await router.run(query)
+                if result.cache_hit:
+                    hits += 1
+                    # 误命中：缓存里匹配到的原问题，其标注意图与当前问题不同
+                    false_hits += intent_of[result.matched_query] != intent
+            stats = cache.stats()
+            saved = stats["namespaces"]["router"]["latency_saved_s"]
+            print(f"{threshold:>10} {hits / len(QUERY_LOG):>10.1%} {(false_hits / hits if hits else 0):>11.1%}"
+                  f" {saved:>12.2f}s {stats['embed_seconds']:>12.3f}s")
+
+    # 【架构师笔记：语义缓存的阈值取舍】
+    # 1. 缓存追求精准 (Precision)：命中后直接绕过模型，一次误命中会在 TTL 内被反复返回。
+    #    阈值 ≈1 只命中“归一化后完全相同”的问题；阈值越低，命中率越高，误命中（“退会员”命中“买会员”）也随之出现。
+    # 2. 阈值的数值取决于 Embedding 模型：字符哈希向量对换个说法的相似度只有 0.5~0.7，语义 Embedding 模型的分布完全不同。
+    #    先用真实查询日志回放、标注意图，量出误命中率，再决定阈值；换 Embedding 模型后必须重新标定。
+    # 3. 命中结果按当前 output_type 重新校验：输出结构升级后，旧缓存自动作废并回源，不会返回过期结构。
+    # 4. 只缓存与用户、时间、deps 无关的单轮问题（路由、FAQ）；带 message_history、deps、model 或 output_type 参数的调用自动绕过缓存。
+
+async def main():
+    await demo()
+    await benchmark()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -7,6 +7,7 @@
 3. 角色化隔离：展示如何通过不同的 System Prompt 配合共享状态实现专业分工。
 """
 import asyncio
+import os
 import sys
 from dataclasses import dataclass, field
 from pathlib import Path
@@ -18,6 +19,7 @@ from pydantic_ai import Agent, RunContext
 root = Path(__file__).resolve().parents[1]
 sys.path.append(str(root))
 from common.models import get_model
+from common.response_cache import CachingModel, ResponseCache
 
 # 1. 定义共享会话状态
 # 【教练笔记】：这是典型的“移交模式 (Handoffs)”。
@@ -52,8 +54,12 @@ billing_agent = Agent(
     system_prompt="你是一个财务专家。请基于已确认的账单事实，处理退款或订阅问题。"
 )
 
+# 分拣是典型的 FAQ 型请求：同样的问题反复出现，直接复用上一次的分拣结果
+# （精确匹配：模型、系统提示、输出Schema、消息历史全部一致才命中；设置 RESPONSE_CACHE_PATH 可跨进程持久化）
+response_cache = ResponseCache(max_entries=1024, ttl_seconds=3600, sqlite_path=os.getenv("RESPONSE_CACHE_PATH"))
+
 triage_agent = Agent(
-    get_model(),
+    CachingModel(get_model(), response_cache),
     deps_type=SessionState,
     output_type=TriageResult,
     system_prompt=(
@@ -100,6 +106,12 @@ async def run_handoff_workflow(user_query: str):
     print(result.output)
     print("="*50)
 
+async def main():
+    # 测试：带有复杂背景的财务移交；同一问题第二次咨询时，分拣直接命中响应缓存
+    query = "我发现去年的年度订阅多扣了199元，但我现在的账号显示是基础版，请帮我核实退款"
+    for _ in range(2):
+        await run_handoff_workflow(query)
+    print(f"🗃️ 分拣响应缓存: {response_cache.stats()}")
+
 if __name__ == "__main__":
-    # 测试：带有复杂背景的财务移交
-    asyncio.run(run_handoff_workflow("我发现去年的年度订阅多扣了199元，但我现在的账号显示是基础版，请帮我核实退款"))
+    asyncio.run(main())
@@ -12,6 +12,7 @@
 # NeMo 使用 Colang 来定义边界，而我们在这里展示了如何使用“Pydantic 校验 + 审计 Agent”的组合，
 # 在不需要学习新语言的前提下，利用 PydanticAI 实现类似的数据安全审查能力。
 import asyncio
+import os
 import sys
 from pathlib import Path
 from pydantic import BaseModel, Field, field_validator
@@ -21,6 +22,7 @@ from pydantic_ai import Agent
 root = Path(__file__).resolve().parents[1]
 sys.path.append(str(root))
 from common.models import get_model
+from common.response_cache import CachingModel, ResponseCache
 
 # 1. 定义带强约束的输出模型
 class CustomerRecord(BaseModel):
@@ -42,8 +44,11 @@ business_agent = Agent(
 )
 
 # 3. 定义安全审查 Agent
+# 同一份数据的审计结论是确定的：开启精确匹配响应缓存，重复审计不再调用模型
+audit_cache = ResponseCache(max_entries=4096, ttl_seconds=86400, sqlite_path=os.getenv("RESPONSE_CACHE_PATH"))
+
 security_agent = Agent(
-    get_model(),
+    CachingModel(get_model(), audit_cache),
     system_prompt=(
         "你是一个安全审计员。检查输入的内容是否包含敏感信息（如密码、身份证号）。"
         "如果安全，回复 'SAFE'。如果包含敏感信息，回复 'UNSAFE' 并说明原因。"
@@ -77,4 +82,10 @@ if __name__ == "__main__":
     # asyncio.run(run_secure_workflow("我是小王，邮箱是 xiaowang@example.com"))
     
     # 测试场景 2：带风险数据（模拟用户在对话中无意透露敏感信息）
-    asyncio.run(run_secure_workflow("我是老李，我的邮箱是 laoli@example.com，我的银行卡号是 6222 0000 1111 2222"))
+    async def main():
+        # 同一条数据提交两次：第二次的安全审计命中缓存
+        for _ in range(2):
+            await run_secure_workflow("我是老李，我的邮箱是 laoli@example.com，我的银行卡号是 6222 0000 1111 2222")
+        print(f"🗃️ 审计响应缓存: {audit_cache.stats()}")
+
+    asyncio.run(main())
@@ -0,0 +1,223 @@
+"""
+Monitoring Anomaly Analyzer - Architectural Rationale:
+------------------------------------------------------
+Sending a text summary of aggregates to an LLM for "cost advice" is slow,
+costs money, is not reproducible, and cannot see anything the summary
+averaged away (a latency regression at 14:02, one template that explodes
+token usage, the same prompt sent 500 times).
+
+1. Deterministic Detectors: Run directly over the ring-buffer columns with
+   NumPy, grouped by model and prompt template (error bursts by model only,
+   since failures are usually a provider's, not a template's):
+   - latency regressions: EWMA baseline + one-sided CUSUM on log latency,
+   - error bursts: rolling error count against the model's baseline rate,
+   - token outliers: robust z-score (median / MAD) of total tokens,
+   - duplicate prompts: identical prompt fingerprints, i.e. cache candidates.
+2. Compact Findings: Each detector emits a few `Finding`s with the numbers
+   that justify them, ranked by severity; that list (not raw data) is what an
+   LLM advisor may be asked to turn into prose.
+"""
+
+import math
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+SEVERITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+
+@dataclass
+class Finding:
+    """One detected issue with the evidence behind it."""
+    kind: str          # latency_regression | error_burst | token_outlier | duplicate_prompts
+    severity: str      # high | medium | low
+    model: str
+    summary: str
+    template: Optional[str] = None
+    evidence: Dict[str, Any] = field(default_factory=dict)
+
+    def to_line(self) -> str:
+        scope = self.model if self.template is None else f"{self.model} / {self.template}"
+        return f"[{self.severity}] {self.kind} ({scope}): {self.summary}"
+
+
+@dataclass
+class AnalyzerConfig:
+    """Detector thresholds (defaults are deliberately conservative)."""
+    warmup: int = 30               # calls used to seed the latency baseline
+    ewma_alpha: float = 0.02
+    baseline_lag: int = 100        # calls before a point may update the baseline
+    cusum_k: float = 1.0           # allowed drift, in baseline standard deviations
+    cusum_h: float = 8.0           # alarm threshold, in baseline standard deviations
+    min_latency_ratio: float = 1.25  # ignore alarms whose shift is not material
+    error_window: int = 20         # calls per rolling error window
+    error_min_count: int = 3
+    error_factor: float = 3.0      # burst = window errors >= factor x expected
+    outlier_z: float = 5.0
+    outlier_min_samples: int = 10
+    duplicate_min_count: int = 2
+    max_findings_per_kind: int = 5
+
+
+def _ts(value: float) -> str:
+    return datetime.fromtimestamp(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+class MetricsAnalyzer:
+    """Runs the detectors over `MetricsRingBuffer` columns and returns ranked findings."""
+
+    def __init__(self, config: Optional[AnalyzerConfig] = None):
+        self.config = config or AnalyzerConfig()
+
+    # ---------- detectors ----------
+
+    def latency_regressions(self, ts: np.ndarray, latency: np.ndarray, ok: np.ndarray, model: str,
+                            template: Optional[str] = None) -> List[Finding]:
+        cfg = self.config
+        x = np.log(np.maximum(latency[ok], 1e-3))
+        times = ts[ok]
+        if len(x) <= cfg.warmup:
+            return []
+        mean = float(x[:cfg.warmup].mean())
+        var = max(float(x[:cfg.warmup].var()), 1e-4)
+        cusum = 0.0
+        for i in range(cfg.warmup, len(x)):
+            sd = math.sqrt(var)
+            z = (x[i] - mean) / sd
+            cusum = max(0.0, cusum + z - cfg.cusum_k)
+            if cusum > cfg.cusum_h:
+                before = float(np.exp(mean))
+                after = float(np.median(np.exp(x[i:])))
+                if after < cfg.min_latency_ratio * before:
+                    cusum = 0.0
+                    continue
+                severity = "high" if after > 2 * before else "medium"
+                return [Finding(
+                    "latency_regression", severity, model,
+                    f"latency shifted from ~{before:.0f}ms to ~{after:.0f}ms (median) since {_ts(times[i])}",
+                    template=template,
+                    evidence={"baseline_ms": round(before, 1), "recent_median_ms": round(after, 1),
+                              "detected_at": _ts(times[i]), "calls_after": int(len(x) - i)},
+                )]
+            # The EWMA baseline learns from points `baseline_lag` calls old (winsorized), so it tracks
+            # slow drift without absorbing a sudden shift before the CUSUM has had time to react
+            j = i - cfg.baseline_lag
+            if j >= cfg.warmup:
+                diff = float(np.clip(x[j] - mean, -3 * sd, 3 * sd))
+                mean += cfg.ewma_alpha * diff
+                var = max((1 - cfg.ewma_alpha) * (var + cfg.ewma_alpha * diff * diff), 1e-4)
+        return []
+
+    def error_bursts(self, ts: np.ndarray, success: np.ndarray, model: str) -> List[Finding]:
+        cfg = self.config
+        n = len(success)
+        if n < cfg.error_window:
+            return []
+        errors = (~success).astype(np.int64)
+        baseline = errors.mean()
+        window_errors = np.convolve(errors, np.ones(cfg.error_window, dtype=np.int64), mode="valid")
+        threshold = max(cfg.error_min_count, cfg.error_factor * baseline * cfg.error_window)
+        # Against a high baseline a "burst" is indistinguishable from the norm; require >50% within the window too
+        threshold = max(threshold, 0.5 * cfg.error_window) if baseline > 0.2 else threshold
+        peak = int(window_errors.argmax())
+        if window_errors[peak] < threshold:
+            return []
+        start, end = peak, peak + cfg.error_window - 1
+        severity = "high" if window_errors[peak] >= 0.5 * cfg.error_window else "medium"
+        return [Finding(
+            "error_burst", severity, model,
+            f"{int(window_errors[peak])}/{cfg.error_window} calls failed between {_ts(ts[start])} and {_ts(ts[end])} "
+            f"(overall error rate {baseline:.1%})",
+            evidence={"window_errors": int(window_errors[peak]), "window_calls": cfg.error_window,
+                      "baseline_error_rate": round(float(baseline), 4), "from": _ts(ts[start]), "to": _ts(ts[end])},
+        )]
+
+    def token_outliers(self, tokens: np.ndarray, cost: np.ndarray, model: str, template: str) -> List[Finding]:
+        cfg = self.config
+        if len(tokens) < cfg.outlier_min_samples:
+            return []
+        median = float(np.median(tokens))
+        mad = float(np.median(np.abs(tokens - median))) or max(1.0, 0.05 * median)
+        z = 0.6745 * (tokens - median) / mad
+        outliers = z > cfg.outlier_z
+        count = int(outliers.sum())
+        if not count:
+            return []
+        excess_cost = float(cost[outliers].sum() - count * np.median(cost))
+        return [Finding(
+            "token_outlier", "medium" if count > 1 else "low", model,
+            f"{count} calls used far more tokens than usual (max {int(tokens[outliers].max())} vs median {median:.0f})",
+            template=template,
+            evidence={"outlier_calls": count, "median_tokens": median, "max_tokens": int(tokens[outliers].max()),
+                      "excess_cost_usd": round(max(excess_cost, 0.0), 6)},
+        )]
+
+    def duplicate_prompts(self, columns: Dict[str, np.ndarray], models: List[str], templates: List[str]) -> List[Finding]:
+        cfg = self.config
+        hashes = columns["prompt_hash"]
+        known = hashes != 0
+        if not known.any():
+            return []
+        uniq, inverse, counts = np.unique(hashes[known], return_inverse=True, return_counts=True)
+        repeated = np.flatnonzero(counts >= cfg.duplicate_min_count)
+        if not len(repeated):
+            return []
+        cost = columns["cost_usd"][known]
+        model_ids = columns["model_id"][known]
+        template_ids = columns["template_id"][known]
+        cost_by_hash = np.bincount(inverse, weights=cost, minlength=len(uniq))
+        findings = []
+        # Rank by money that a response cache would have saved: every repeat after the first
+        savings = cost_by_hash[repeated] * (counts[repeated] - 1) / counts[repeated]
+        for pos in repeated[np.argsort(-savings)][:cfg.max_findings_per_kind]:
+            first = int(np.flatnonzero(inverse == pos)[0])
+            n = int(counts[pos])
+            saved = float(cost_by_hash[pos] * (n - 1) / n)
+            findings.append(Finding(
+                "duplicate_prompts", "medium" if n >= 5 else "low", models[model_ids[first]],
+                f"the same prompt was sent {n} times; caching would save ~${saved:.6f}",
+                template=templates[template_ids[first]] or None,
+                evidence={"prompt_hash": f"{int(uniq[pos]):016x}", "count": n, "savings_usd": round(saved, 6)},
+            ))
+        return findings
+
+    # ---------- entry point ----------
+
+    def analyze(self, store) -> List[Finding]:
+        """Run every detector over a MetricsRingBuffer and return findings, most severe first."""
+        columns = store.columns()
+        if not len(columns["timestamp"]):
+            return []
+        findings: List[Finding] = []
+        model_ids = columns["model_id"]
+        for mid in np.unique(model_ids):
+            rows = model_ids == mid
+            model = store.models[mid]
+            ts, success = columns["timestamp"][rows], columns["success"][rows]
+            findings += self.error_bursts(ts, success, model)
+            template_ids = columns["template_id"][rows]
+            latency = columns["latency_ms"][rows]
+            for tid in np.unique(template_ids):
+                # A slow template must not be averaged away by fast ones of the same model
+                in_template = template_ids == tid
+                template = store.templates[tid] or "default"
+                findings += self.latency_regressions(
+                    ts[in_template], latency[in_template], success[in_template], model, template,
+                )
+                sel = in_template & success
+                findings += self.token_outliers(
+                    columns["total_tokens"][rows][sel].astype(np.float64), columns["cost_usd"][rows][sel],
+                    model, template,
+                )
+        findings += self.duplicate_prompts(columns, store.models, store.templates)
+
+        findings.sort(key=lambda f: SEVERITY_ORDER.get(f.severity, 3))
+        limited: List[Finding] = []
+        per_kind: Dict[str, int] = {}
+        for f in findings:
+            per_kind[f.kind] = per_kind.get(f.kind, 0) + 1
+            if per_kind[f.kind] <= self.config.max_findings_per_kind:
+                limited.append(f)
+        return limited
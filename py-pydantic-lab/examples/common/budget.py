@@ -0,0 +1,198 @@
+"""
+Budget Admission Control - Architectural Rationale:
+---------------------------------------------------
+Recording cost after each call tells you the budget was blown; it does not
+stop the call that blew it.
+
+1. Pre-Flight Reservation: Before a call, its estimated tokens and cost are
+   reserved against every applicable budget (per tenant and global). If any
+   budget would be exceeded the call is rejected (or the caller reroutes it
+   to a cheaper model) before any money is spent.
+2. Sliding Windows: Each budget is a ring of sub-buckets covering its window
+   (e.g. 60 x 1s for a per-minute budget). Totals are maintained
+   incrementally, so a check touches O(1) amortized state.
+3. Reconciliation: After the call the reservation is corrected with actual
+   usage (refunded on failure), so estimation errors do not accumulate.
+4. Lock-Free: Check-and-reserve is synchronous code with no `await`, so on an
+   asyncio loop it is atomic without locks and costs microseconds.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class BudgetExceededError(Exception):
+    """Raised when a reservation would push a budget over its limit."""
+
+    def __init__(self, scope: str, limit: "BudgetLimit", used_tokens: float, used_cost: float):
+        self.scope = scope
+        self.limit = limit
+        self.used_tokens = used_tokens
+        self.used_cost = used_cost
+        super().__init__(
+            f"Budget exceeded for {scope} over {limit.window_seconds:g}s "
+            f"(used {used_tokens:.0f} tokens / ${used_cost:.6f}; "
+            f"limits {limit.max_tokens} tokens / ${limit.max_cost_usd})"
+        )
+
+
+@dataclass(frozen=True)
+class BudgetLimit:
+    """Token and/or cost ceiling over a sliding window. `None` disables that dimension."""
+    window_seconds: float
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+
+
+class SlidingWindow:
+    """Running token/cost totals over a sliding window made of `buckets` sub-buckets."""
+
+    def __init__(self, limit: BudgetLimit, buckets: int = 60):
+        self.limit = limit
+        self._width = limit.window_seconds / buckets
+        self._n = buckets
+        self._ids = [-1] * buckets
+        self._tokens = [0.0] * buckets
+        self._cost = [0.0] * buckets
+        self._head = -1
+        self.tokens = 0.0
+        self.cost = 0.0
+
+    def _advance(self, now: float) -> int:
+        current = int(now // self._width)
+        if current != self._head:
+            # Expire every bucket that fell out of the window since the last call (at most n)
+            for idx in range(max(self._head + 1, current - self._n + 1), current + 1):
+                slot = idx % self._n
+                if self._ids[slot] != -1:
+                    self.tokens -= self._tokens[slot]
+                    self.cost -= self._cost[slot]
+                self._ids[slot] = idx
+                self._tokens[slot] = 0.0
+                self._cost[slot] = 0.0
+            self._head = current
+        return current
+
+    def would_exceed(self, tokens: float, cost: float, now: float) -> bool:
+        self._advance(now)
+        limit = self.limit
+        return ((limit.max_tokens is not None and self.tokens + tokens > limit.max_tokens)
+                or (limit.max_cost_usd is not None and self.cost + cost > limit.max_cost_usd))
+
+    def add(self, tokens: float, cost: float, now: float) -> int:
+        idx = self._advance(now)
+        slot = idx % self._n
+        self._tokens[slot] += tokens
+        self._cost[slot] += cost
+        self.tokens += tokens
+        self.cost += cost
+        return idx
+
+    def totals(self, now: float) -> Tuple[float, float]:
+        self._advance(now)
+        return self.tokens, self.cost
+
+    def adjust(self, idx: int, tokens: float, cost: float, now: float):
+        """Correct a charge made into bucket `idx`; a no-op once that bucket has left the window."""
+        self._advance(now)
+        slot = idx % self._n
+        if self._ids[slot] == idx:
+            self._tokens[slot] += tokens
+            self._cost[slot] += cost
+            self.tokens += tokens
+            self.cost += cost
+
+
+@dataclass
+class Reservation:
+    """Pre-flight charge against one or more windows; settle it with reconcile() or release()."""
+    tenant: str
+    tokens: float
+    cost: float
+    charges: List[Tuple[SlidingWindow, int]] = field(default_factory=list)
+    settled: bool = False
+
+
+class BudgetManager:
+    """Per-tenant and global sliding-window budgets with pre-flight reservation and reconciliation."""
+
+    def __init__(
+        self,
+        global_limits: Sequence[BudgetLimit] = (),
+        tenant_limits: Optional[Dict[str, Sequence[BudgetLimit]]] = None,
+        default_tenant_limits: Sequence[BudgetLimit] = (),
+        buckets: int = 60,
+    ):
+        self._buckets = buckets
+        self._global = [SlidingWindow(limit, buckets) for limit in global_limits]
+        self._tenant_limits = dict(tenant_limits or {})
+        self._default_tenant_limits = tuple(default_tenant_limits)
+        self._tenants: Dict[str, List[SlidingWindow]] = {}
+        self.admitted = 0
+        self.rejected = 0   # calls no route could admit
+        self.rerouted = 0   # calls admitted on a fallback route
+
+    def _windows(self, tenant: str) -> List[Tuple[str, SlidingWindow]]:
+        windows = self._tenants.get(tenant)
+        if windows is None:
+            limits = self._tenant_limits.get(tenant, self._default_tenant_limits)
+            windows = self._tenants[tenant] = [SlidingWindow(limit, self._buckets) for limit in limits]
+        return [(f"tenant:{tenant}", w) for w in windows] + [("global", w) for w in self._global]
+
+    def check(self, tenant: str, tokens: float, cost: float) -> Optional[BudgetExceededError]:
+        """The error a reservation would raise right now, or None if it would be admitted."""
+        now = time.monotonic()
+        for scope, window in self._windows(tenant):
+            if window.would_exceed(tokens, cost, now):
+                return BudgetExceededError(scope, window.limit, window.tokens, window.cost)
+        return None
+
+    def reserve(self, tenant: str, tokens: float, cost: float) -> Reservation:
+        """Atomically (no await) check every applicable budget and charge the estimate to all of them."""
+        return self.reserve_first(tenant, [(tokens, cost)])[1]
+
+    def reserve_first(self, tenant: str, candidates: Sequence[Tuple[float, float]]) -> Tuple[int, Reservation]:
+        """
+        Reserve the first admissible `(tokens, cost)` estimate, e.g. one per route from the
+        preferred model to cheaper fallbacks; returns its index and the reservation. Raises the
+        first candidate's error (counted once in `rejected`) if none fits.
+        """
+        first_error: Optional[BudgetExceededError] = None
+        for i, (tokens, cost) in enumerate(candidates):
+            error = self.check(tenant, tokens, cost)
+            if error is not None:
+                first_error = first_error or error
+                continue
+            now = time.monotonic()
+            reservation = Reservation(tenant, tokens, cost)
+            for _, window in self._windows(tenant):
+                reservation.charges.append((window, window.add(tokens, cost, now)))
+            self.admitted += 1
+            if i:
+                self.rerouted += 1
+            return i, reservation
+        self.rejected += 1
+        raise first_error
+
+    def reconcile(self, reservation: Reservation, actual_tokens: float, actual_cost: float):
+        """Replace the estimate with actual usage."""
+        if reservation.settled:
+            return
+        now = time.monotonic()
+        for window, idx in reservation.charges:
+            window.adjust(idx, actual_tokens - reservation.tokens, actual_cost - reservation.cost, now)
+        reservation.settled = True
+
+    def release(self, reservation: Reservation):
+        """Refund a reservation whose call never reached the provider (or failed without usage)."""
+        self.reconcile(reservation, 0.0, 0.0)
+
+    def usage(self, tenant: Optional[str] = None) -> Dict[str, Dict[str, float]]:
+        now = time.monotonic()
+        scopes = self._windows(tenant) if tenant is not None else [("global", w) for w in self._global]
+        out = {}
+        for scope, window in scopes:
+            tokens, cost = window.totals(now)
+            out[f"{scope}/{window.limit.window_seconds:g}s"] = {"tokens": tokens, "cost_usd": cost}
+        return out
@@ -0,0 +1,163 @@
+"""
+Entity Linking - Architectural Rationale:
+-----------------------------------------
+Hard-coded `if "name" in text` checks cost O(entities x text) and silently miss
+every entity nobody wrote a check for.
+
+1. Aho-Corasick Automaton: All entity names and aliases are compiled into one
+   trie with failure links, so a single pass over the text finds every mention
+   in time linear in the text length (plus matches), independent of how many
+   entities are indexed.
+2. Leftmost-Longest Resolution: Overlapping matches are resolved the way a
+   reader would ("2型糖尿病" beats "糖尿病" at the same position).
+3. ID Mapping: Each surface form maps to one or more entity ids, ready for
+   graph expansion.
+"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+@dataclass(frozen=True)
+class Mention:
+    """One linked span of the input text."""
+    start: int
+    end: int
+    surface: str
+    entity_ids: Tuple[str, ...]
+
+
+class AhoCorasick:
+    """Multi-pattern string matcher (pure Python, built once, queried many times)."""
+
+    def __init__(self, case_sensitive: bool = False):
+        self.case_sensitive = case_sensitive
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Optional[int]] = [None]  # pattern id ending exactly at this state
+        self._dict_link: List[int] = [-1]        # nearest suffix state that ends a pattern
+        self._lengths: List[int] = []
+        self._built = False
+
+    def _norm(self, text: str) -> Iterable[str]:
+        # Fold case per character so match offsets stay aligned with the original text
+        if self.case_sensitive:
+            return text
+        return (low if len(low := ch.lower()) == 1 else ch for ch in text)
+
+    def add(self, pattern: str) -> int:
+        """Add a pattern and return its id (re-adding returns the existing id)."""
+        if self._built:
+            raise RuntimeError("Cannot add patterns after build().")
+        state = 0
+        for ch in self._norm(pattern):
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(None)
+                self._dict_link.append(-1)
+            state = nxt
+        if self._out[state] is None:
+            self._out[state] = len(self._lengths)
+            self._lengths.append(len(pattern))
+        return self._out[state]
+
+    def build(self):
+        """Compute failure and dictionary-suffix links (BFS over the trie)."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                fail_state = self._fail[nxt]
+                self._dict_link[nxt] = fail_state if self._out[fail_state] is not None else self._dict_link[fail_state]
+        self._built = True
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, int, int]]:
+        """Yield (start, end, pattern_id) for every occurrence, in one pass over `text`."""
+        if not self._built:
+            self.build()
+        goto, fail, out, dict_link, lengths = self._goto, self._fail, self._out, self._dict_link, self._lengths
+        state = 0
+        for i, ch in enumerate(self._norm(text)):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = state if out[state] is not None else dict_link[state]
+            while hit > 0:
+                pid = out[hit]
+                yield i + 1 - lengths[pid], i + 1, pid
+                hit = dict_link[hit]
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+def _on_word_boundary(text: str, start: int, end: int) -> bool:
+    # Latin names must not match inside longer words ("AI" in "MAIN"); CJK has no word breaks
+    if _is_word_char(text[start]) and start > 0 and _is_word_char(text[start - 1]):
+        return False
+    if _is_word_char(text[end - 1]) and end < len(text) and _is_word_char(text[end]):
+        return False
+    return True
+
+
+class EntityLinker:
+    """Maps mentions in free text to entity ids using an Aho-Corasick index of names and aliases."""
+
+    def __init__(self, case_sensitive: bool = False, min_length: int = 2):
+        self._matcher = AhoCorasick(case_sensitive=case_sensitive)
+        self._targets: List[Set[str]] = []
+        self.min_length = min_length
+
+    def add_entity(self, entity_id: str, names: Iterable[str]):
+        for name in names:
+            name = name.strip()
+            # Single-character aliases match almost everything in CJK text
+            if len(name) < self.min_length:
+                continue
+            pid = self._matcher.add(name)
+            if pid == len(self._targets):
+                self._targets.append(set())
+            self._targets[pid].add(entity_id)
+
+    def build(self) -> "EntityLinker":
+        self._matcher.build()
+        return self
+
+    def find_all(self, text: str) -> List[Mention]:
+        """Every match, including overlapping and nested ones."""
+        return [
+            Mention(start, end, text[start:end], tuple(sorted(self._targets[pid])))
+            for start, end, pid in self._matcher.iter_matches(text)
+            if _on_word_boundary(text, start, end)
+        ]
+
+    def link(self, text: str) -> List[Mention]:
+        """Non-overlapping mentions, leftmost-longest first, in text order."""
+        candidates = sorted(self.find_all(text), key=lambda m: (m.start, -(m.end - m.start)))
+        mentions: List[Mention] = []
+        covered_until = 0
+        for m in candidates:
+            if m.start >= covered_until:
+                mentions.append(m)
+                covered_until = m.end
+        return mentions
+
+    def entity_ids(self, text: str) -> List[str]:
+        """Distinct linked entity ids in order of first mention."""
+        seen: Dict[str, None] = {}
+        for m in self.link(text):
+            for eid in m.entity_ids:
+                seen.setdefault(eid, None)
+        return list(seen)
@@ -0,0 +1,243 @@
+"""
+Model Fallback Router - Architectural Rationale:
+------------------------------------------------
+A sequential "try A, then B, then C" loop pays the full timeout of every dead
+provider before reaching a healthy one, so p99 becomes the sum of all timeouts.
+
+1. Circuit Breakers: A provider that keeps failing is skipped outright until a
+   cool-down elapses, then probed with a single half-open trial. The probe goes
+   first, so a primary that failed before it ever answered can still recover.
+2. Latency Ordering: Healthy routes are tried fastest-first, based on rolling
+   latency stats; untried routes keep their declared priority.
+3. Hedged Requests: Optionally fire the next route once the current one is
+   slower than its own p95, take whichever answers first, and cancel the loser.
+4. Reuse: Each route owns one long-lived Agent instead of building one per attempt.
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from pydantic_ai import Agent
+from pydantic_ai.models import Model
+
+
+class AllRoutesFailedError(Exception):
+    """Raised when every route failed (or was skipped by its circuit breaker)."""
+
+    def __init__(self, errors: List[Tuple[str, BaseException]]):
+        self.errors = errors
+        detail = "; ".join(f"{name}: {err!r}" for name, err in errors) or "no route available"
+        super().__init__(f"All model routes failed ({detail})")
+
+
+@dataclass
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half-open -> closed."""
+    failure_threshold: int = 3
+    reset_timeout: float = 30.0
+    failures: int = 0
+    opened_at: Optional[float] = None
+    _probing: bool = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._probing)
+
+    def begin_attempt(self):
+        # In half-open state let exactly one trial request through
+        if self.state == "half_open":
+            self._probing = True
+
+    def abandon_attempt(self):
+        self._probing = False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+@dataclass
+class LatencyStats:
+    """Rolling window of successful-call latencies (seconds) plus an EWMA."""
+    window: int = 100
+    alpha: float = 0.2
+    ewma: Optional[float] = None
+    samples: Deque[float] = field(default_factory=deque)
+
+    def record(self, latency: float):
+        self.samples.append(latency)
+        if len(self.samples) > self.window:
+            self.samples.popleft()
+        self.ewma = latency if self.ewma is None else self.alpha * latency + (1 - self.alpha) * self.ewma
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+        return ordered[index]
+
+
+@dataclass
+class ModelRoute:
+    """One fallback candidate: a named, pre-built Agent with its health state."""
+    name: str
+    agent: Agent
+    priority: int = 0
+    breaker: CircuitBreaker = field(default_factory=CircuitBreaker)
+    stats: LatencyStats = field(default_factory=LatencyStats)
+
+
+class RoutedRun(NamedTuple):
+    """Result of a routed call: which route answered, its run result, and its latency."""
+    route: str
+    result: Any
+    latency_ms: float
+
+
+class FallbackRouter:
+    """Health-aware router that runs a prompt on the best available model route."""
+
+    def __init__(
+        self,
+        routes: Sequence[ModelRoute],
+        attempt_timeout: Optional[float] = None,
+        hedge: bool = False,
+        hedge_delay: float = 2.0,
+        min_hedge_samples: int = 5,
+    ):
+        if not routes:
+            raise ValueError("FallbackRouter needs at least one route.")
+        self.routes = list(routes)
+        self.attempt_timeout = attempt_timeout
+        self.hedge = hedge
+        self.hedge_delay = hedge_delay
+        self.min_hedge_samples = min_hedge_samples
+
+    @classmethod
+    def from_models(cls, models: Sequence[Tuple[str, Model]], agent_kwargs: Optional[Dict[str, Any]] = None,
+                    **router_kwargs) -> "FallbackRouter":
+        """Build one Agent per model (in priority order) sharing the same agent settings."""
+        agent_kwargs = agent_kwargs or {}
+        routes = [
+            ModelRoute(name=name, agent=Agent(model, **agent_kwargs), priority=i)
+            for i, (name, model) in enumerate(models)
+        ]
+        return cls(routes, **router_kwargs)
+
+    def ordered_routes(self) -> List[ModelRoute]:
+        """
+        Routes whose breaker allows traffic: half-open probes first, then fastest known,
+        then untried ones by priority. Without the probe going first, a route that tripped
+        before its first success (no EWMA) would sort behind every healthy route forever.
+        """
+        available = [r for r in self.routes if r.breaker.allow()]
+        return sorted(
+            available,
+            key=lambda r: (
+                r.breaker.state != "half_open",
+                r.stats.ewma if r.stats.ewma is not None else math.inf,
+                r.priority,
+            ),
+        )
+
+    def _hedge_after(self, route: ModelRoute) -> float:
+        if len(route.stats.samples) >= self.min_hedge_samples:
+            return route.stats.percentile(0.95)
+        return self.hedge_delay
+
+    async def _attempt(self, route: ModelRoute, prompt: str, run_kwargs: Dict[str, Any]) -> RoutedRun:
+        start = time.perf_counter()
+        try:
+            if self.attempt_timeout is not None:
+                result = await asyncio.wait_for(route.agent.run(prompt, **run_kwargs), self.attempt_timeout)
+            else:
+                result = await route.agent.run(prompt, **run_kwargs)
+        except asyncio.CancelledError:
+            # Lost a hedge race: not the provider's fault, do not trip the breaker
+            route.breaker.abandon_attempt()
+            raise
+        except Exception:
+            route.breaker.record_failure()
+            raise
+        latency = time.perf_counter() - start
+        route.breaker.record_success()
+        route.stats.record(latency)
+        return RoutedRun(route.name, result, latency * 1000)
+
+    async def run(self, prompt: str, **run_kwargs) -> RoutedRun:
+        """
+        Run `prompt` on the healthiest route, falling back (or hedging) as needed.
+        Extra keyword arguments are passed to `Agent.run`.
+        """
+        routes = self.ordered_routes()
+        errors: List[Tuple[str, BaseException]] = []
+        pending: Dict[asyncio.Task, ModelRoute] = {}
+        next_index = 0
+
+        def launch():
+            nonlocal next_index
+            route = routes[next_index]
+            next_index += 1
+            route.breaker.begin_attempt()
+            pending[asyncio.create_task(self._attempt(route, prompt, run_kwargs))] = route
+
+        if routes:
+            launch()
+        try:
+            while pending:
+                timeout = None
+                if self.hedge and next_index < len(routes):
+                    timeout = self._hedge_after(routes[next_index - 1])
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # Current route is slower than its p95: fire the backup in parallel
+                    launch()
+                    continue
+
+                for task in done:
+                    route = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        return task.result()
+                    errors.append((route.name, error))
+                if next_index < len(routes):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        raise AllRoutesFailedError(errors)
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        """Snapshot of breaker state and latency stats per route."""
+        return {
+            r.name: {
+                "state": r.breaker.state,
+                "failures": r.breaker.failures,
+                "ewma_ms": None if r.stats.ewma is None else r.stats.ewma * 1000,
+                "p95_ms": None if not r.stats.samples else r.stats.percentile(0.95) * 1000,
+            }
+            for r in self.routes
+        }
@@ -0,0 +1,232 @@
+"""
+Indexed Graph Store - Architectural Rationale:
+----------------------------------------------
+A knowledge graph kept as `List[Relation]` answers "neighbours of X" with a
+linear scan over every edge, and pays one Python object per edge.
+
+1. Interning: Node keys and relation types are mapped to dense integer ids once.
+2. Columnar Edges: Edges live in parallel `array` columns (source, target,
+   type, weight) instead of per-edge objects.
+3. Adjacency Indexes: Per-node outgoing/incoming edge lists and per-type edge
+   lists make neighbour lookups O(degree) instead of O(|E|).
+4. Traversal: Weighted k-hop expansion scores each reachable node by the best
+   product of edge weights along a path of at most k hops. Weights must lie in
+   (0, 1]: a product can then only shrink along a path, which is what lets a
+   best-first search settle each node on its first visit.
+"""
+
+import heapq
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+OUT = "out"
+IN = "in"
+BOTH = "both"
+
+
+@dataclass(frozen=True)
+class Edge:
+    """Materialized view of one stored edge (only built on request)."""
+    id: int
+    source: str
+    target: str
+    relation_type: str
+    weight: float
+
+
+@dataclass(frozen=True)
+class HopResult:
+    """A node reached by k-hop traversal: best path score, hop count and the edge it was reached through."""
+    node: str
+    score: float
+    hops: int
+    via_edge: Optional[int]
+
+
+class _Interner:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.keys: List[str] = []
+
+    def intern(self, key: str) -> int:
+        idx = self.ids.get(key)
+        if idx is None:
+            idx = len(self.keys)
+            self.ids[key] = idx
+            self.keys.append(key)
+        return idx
+
+
+class GraphStore:
+    """In-memory directed multigraph with adjacency indexes and integer-interned ids."""
+
+    def __init__(self):
+        self._nodes = _Interner()
+        self._types = _Interner()
+        self._src = array("i")
+        self._dst = array("i")
+        self._rtype = array("i")
+        self._weight = array("d")
+        self._out: List[array] = []
+        self._in: List[array] = []
+        self._by_type: List[array] = []
+
+    # ---------- construction ----------
+
+    def add_node(self, key: str) -> int:
+        idx = self._nodes.intern(key)
+        if idx == len(self._out):
+            self._out.append(array("i"))
+            self._in.append(array("i"))
+        return idx
+
+    def add_edge(self, source: str, target: str, relation_type: str, weight: float = 1.0) -> int:
+        """Append an edge and return its id. `weight` must be in (0, 1], otherwise `ValueError`."""
+        if not 0.0 < weight <= 1.0:
+            raise ValueError(f"Edge weight must be in (0, 1], got {weight!r} for {source} -[{relation_type}]-> {target}")
+        s = self.add_node(source)
+        t = self.add_node(target)
+        r = self._types.intern(relation_type)
+        if r == len(self._by_type):
+            self._by_type.append(array("i"))
+        eid = len(self._src)
+        self._src.append(s)
+        self._dst.append(t)
+        self._rtype.append(r)
+        self._weight.append(weight)
+        self._out[s].append(eid)
+        self._in[t].append(eid)
+        self._by_type[r].append(eid)
+        return eid
+
+    def add_edges(self, edges: Iterable[Tuple[str, str, str, float]]):
+        """Append (source, target, relation_type, weight) tuples; weights are checked like `add_edge`."""
+        for source, target, relation_type, weight in edges:
+            self.add_edge(source, target, relation_type, weight)
+
+    # ---------- lookups ----------
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._nodes.ids
+
+    @property
+    def node_count(self) -> int:
+        return len(self._nodes.keys)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._src)
+
+    def edge(self, eid: int) -> Edge:
+        keys = self._nodes.keys
+        return Edge(
+            id=eid,
+            source=keys[self._src[eid]],
+            target=keys[self._dst[eid]],
+            relation_type=self._types.keys[self._rtype[eid]],
+            weight=float(self._weight[eid]),
+        )
+
+    def _type_ids(self, relation_types: Optional[Sequence[str]]) -> Optional[set]:
+        if relation_types is None:
+            return None
+        return {self._types.ids[r] for r in relation_types if r in self._types.ids}
+
+    def _adjacent(self, node: int, direction: str) -> Iterator[Tuple[int, int]]:
+        """Yield (edge id, neighbour id) pairs for an interned node."""
+        if direction in (OUT, BOTH):
+            for eid in self._out[node]:
+                yield eid, self._dst[eid]
+        if direction in (IN, BOTH):
+            for eid in self._in[node]:
+                yield eid, self._src[eid]
+
+    def edge_ids(
+        self,
+        node: str,
+        direction: str = OUT,
+        relation_types: Optional[Sequence[str]] = None,
+        min_weight: float = 0.0,
+    ) -> List[int]:
+        """Edge ids touching `node`, filtered by direction, relation type and weight."""
+        idx = self._nodes.ids.get(node)
+        if idx is None:
+            return []
+        types = self._type_ids(relation_types)
+        return [
+            eid for eid, _ in self._adjacent(idx, direction)
+            if (types is None or self._rtype[eid] in types) and self._weight[eid] >= min_weight
+        ]
+
+    def edges_of_type(self, relation_type: str) -> List[int]:
+        r = self._types.ids.get(relation_type)
+        return [] if r is None else list(self._by_type[r])
+
+    def neighbors(self, node: str, direction: str = OUT, relation_types: Optional[Sequence[str]] = None,
+                  min_weight: float = 0.0) -> List[str]:
+        keys = self._nodes.keys
+        src, dst = self._src, self._dst
+        idx = self._nodes.ids.get(node)
+        return [
+            keys[dst[eid] if src[eid] == idx else src[eid]]
+            for eid in self.edge_ids(node, direction, relation_types, min_weight)
+        ]
+
+    # ---------- traversal ----------
+
+    def k_hop(
+        self,
+        seeds: Iterable[str],
+        k: int = 2,
+        direction: str = OUT,
+        relation_types: Optional[Sequence[str]] = None,
+        min_weight: float = 0.0,
+        max_nodes: Optional[int] = None,
+    ) -> List[HopResult]:
+        """
+        Weighted k-hop expansion from `seeds`.
+        A node's score is the best product of edge weights over paths of at most
+        k hops (seeds score 1.0). Results are sorted by score, best first.
+        """
+        types = self._type_ids(relation_types)
+        best: Dict[int, HopResult] = {}
+        heap: List[Tuple[float, int, int, Optional[int]]] = []
+        for key in seeds:
+            idx = self._nodes.ids.get(key)
+            if idx is not None:
+                heapq.heappush(heap, (-1.0, 0, idx, None))
+
+        # Best-first search: weights are <= 1, so the first pop of a node carries its best score.
+        # A node is expanded again only if later reached in fewer hops (more remaining budget).
+        expanded_at: Dict[int, int] = {}
+        while heap:
+            neg_score, hops, node, via = heapq.heappop(heap)
+            if node in best:
+                if hops >= expanded_at[node]:
+                    continue
+            else:
+                best[node] = HopResult(self._nodes.keys[node], -neg_score, hops, via)
+                if max_nodes is not None and len(best) >= max_nodes:
+                    break
+            expanded_at[node] = hops
+            if hops == k:
+                continue
+            for eid, nxt in self._adjacent(node, direction):
+                if expanded_at.get(nxt, k + 1) <= hops + 1:
+                    continue
+                w = self._weight[eid]
+                if w < min_weight or (types is not None and self._rtype[eid] not in types):
+                    continue
+                heapq.heappush(heap, (neg_score * w, hops + 1, nxt, eid))
+
+        return sorted(best.values(), key=lambda r: r.score, reverse=True)
+
+    def subgraph_edges(self, nodes: Iterable[str], relation_types: Optional[Sequence[str]] = None) -> List[int]:
+        """Edge ids whose both endpoints are in `nodes` (used to return the evidence of a traversal)."""
+        ids = {self._nodes.ids[n] for n in nodes if n in self._nodes.ids}
+        types = self._type_ids(relation_types)
+        return [
+            eid for n in ids for eid in self._out[n]
+            if self._dst[eid] in ids and (types is None or self._rtype[eid] in types)
+        ]
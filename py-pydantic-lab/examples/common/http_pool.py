@@ -0,0 +1,256 @@
+"""
+HTTP Client Pool - Architectural Rationale:
+-------------------------------------------
+Every LLM provider talks HTTP. Letting each provider build its own client means
+one connection pool per model instance, default limits, and no HTTP/2.
+
+1. One Pool per Endpoint: Clients are keyed by (endpoint origin, proxy), so all
+   agents hitting the same API share keep-alive connections and TLS sessions.
+2. Tunable Limits: Max connections, keep-alive size/expiry, timeout and HTTP/2
+   come from environment variables instead of SDK defaults.
+3. Event-Loop Safety: Connections are bound to the event loop that opened them.
+   Each client routes requests to a per-loop transport, so `run_sync` examples,
+   `asyncio.run` calls and per-job worker loops never touch a closed loop.
+   Every per-loop pool is tracked until it is closed: pools of closed loops
+   have their sockets closed on the next request.
+4. Explicit Shutdown: `aclose_loop()` releases the current loop's connections,
+   `aclose()` releases everything on exit (pools of loops running in other
+   threads are closed on their own loop).
+"""
+
+import asyncio
+import os
+import threading
+import warnings
+import weakref
+import httpx
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class PoolSettings:
+    """Connection pool tuning shared by every endpoint client."""
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 60.0
+    http2: bool = False
+
+    @classmethod
+    def from_env(cls) -> "PoolSettings":
+        """
+        Read overrides from the environment:
+        LLM_HTTP_MAX_CONNECTIONS, LLM_HTTP_MAX_KEEPALIVE, LLM_HTTP_KEEPALIVE_EXPIRY,
+        LLM_HTTP_TIMEOUT, LLM_HTTP2.
+        """
+        return cls(
+            max_connections=int(os.getenv('LLM_HTTP_MAX_CONNECTIONS', cls.max_connections)),
+            max_keepalive_connections=int(os.getenv('LLM_HTTP_MAX_KEEPALIVE', cls.max_keepalive_connections)),
+            keepalive_expiry=float(os.getenv('LLM_HTTP_KEEPALIVE_EXPIRY', cls.keepalive_expiry)),
+            timeout=float(os.getenv('LLM_HTTP_TIMEOUT', cls.timeout)),
+            http2=_env_bool('LLM_HTTP2'),
+        )
+
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def endpoint_origin(base_url: Optional[str]) -> str:
+    """Normalize a base URL to scheme://host[:port] so paths/versions share one pool."""
+    if not base_url:
+        return "default"
+    parts = urlsplit(base_url)
+    if not parts.scheme or not parts.netloc:
+        return base_url
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _close_sockets(transport: httpx.AsyncBaseTransport):
+    """
+    Synchronously close the sockets of a pool whose event loop is gone, so it can no
+    longer be awaited. Reaches into httpx/httpcore internals; if their layout changes
+    this degrades to leaving the sockets to the garbage collector.
+    """
+    pool = getattr(transport, "_pool", None)
+    for connection in list(getattr(pool, "connections", ())):
+        stream = getattr(getattr(connection, "_connection", None), "_network_stream", None)
+        sock = stream.get_extra_info("socket") if stream is not None else None
+        # asyncio hands out a TransportSocket wrapper; close the real socket so its later GC is a no-op
+        sock = getattr(sock, "_sock", sock)
+        if sock is not None:
+            sock.close()
+
+
+class LoopAwareTransport(httpx.AsyncBaseTransport):
+    """
+    Transport that keeps one real connection pool per running event loop.
+    A long-lived worker loop keeps its pool warm across jobs; a fresh loop
+    simply gets a fresh pool instead of failing with "Event loop is closed".
+    """
+
+    def __init__(self, factory: Callable[[], httpx.AsyncBaseTransport]):
+        self._factory = factory
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncBaseTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+        # Every pool ever created, until closed: a garbage-collected loop must not take its sockets with it
+        self._owned: "List[Tuple[weakref.ref, httpx.AsyncBaseTransport]]" = []
+        self._lock = threading.Lock()
+
+    def _reap_closed_loops(self):
+        # Sockets of a closed (or collected) loop cannot be closed gracefully anymore: close them directly
+        alive = []
+        for ref, transport in self._owned:
+            loop = ref()
+            if loop is None or loop.is_closed():
+                if loop is not None:
+                    self._transports.pop(loop, None)
+                _close_sockets(transport)
+            else:
+                alive.append((ref, transport))
+        self._owned = alive
+
+    def _transport_for(self, loop: asyncio.AbstractEventLoop) -> httpx.AsyncBaseTransport:
+        transport = self._transports.get(loop)
+        if transport is not None:
+            return transport
+        with self._lock:
+            self._reap_closed_loops()
+            transport = self._transports.get(loop)
+            if transport is None:
+                transport = self._factory()
+                self._transports[loop] = transport
+                self._owned.append((weakref.ref(loop), transport))
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self._transport_for(asyncio.get_running_loop())
+        return await transport.handle_async_request(request)
+
+    def loop_count(self) -> int:
+        with self._lock:
+            self._reap_closed_loops()
+            return len(self._transports)
+
+    async def aclose_loop(self):
+        """Close only the pool bound to the running loop (e.g. at the end of a job)."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+            self._owned = [(ref, t) for ref, t in self._owned if t is not transport]
+        if transport is not None:
+            await transport.aclose()
+
+    async def aclose(self):
+        """Close the pools of every loop: on their own loop when it is still running, directly otherwise."""
+        current = asyncio.get_running_loop()
+        with self._lock:
+            owned, self._owned = self._owned, []
+            self._transports.clear()
+        for ref, transport in owned:
+            loop = ref()
+            if loop is current:
+                await transport.aclose()
+            elif loop is not None and loop.is_running():
+                # Worker loop in another thread: its connections must be closed on that loop
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(transport.aclose(), loop))
+            else:
+                _close_sockets(transport)
+
+
+class HTTPClientPool:
+    """Registry of `httpx.AsyncClient` instances, one per (endpoint, proxy)."""
+
+    def __init__(self, settings: Optional[PoolSettings] = None):
+        self._settings = settings
+        self._clients: Dict[Tuple[str, Optional[str]], httpx.AsyncClient] = {}
+        self._transports: Dict[Tuple[str, Optional[str]], LoopAwareTransport] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def settings(self) -> PoolSettings:
+        # Resolved lazily so values from .env (loaded by get_model) are honored
+        if self._settings is None:
+            self._settings = PoolSettings.from_env()
+        return self._settings
+
+    def configure(self, settings: PoolSettings):
+        """Replace pool settings. Only affects clients created afterwards."""
+        self._settings = settings
+
+    def _create_client(self, key: Tuple[str, Optional[str]], proxy: Optional[str]) -> httpx.AsyncClient:
+        settings = self.settings
+        http2 = settings.http2
+        if http2 and not _http2_available():
+            warnings.warn("LLM_HTTP2 is enabled but the 'h2' package is missing; falling back to HTTP/1.1. "
+                          "Install it with `pip install httpx[http2]`.")
+            http2 = False
+        # Proxy, limits and HTTP/2 live on the per-loop transports, not on the client
+        transport = LoopAwareTransport(lambda: httpx.AsyncHTTPTransport(
+            proxy=proxy,
+            http2=http2,
+            limits=settings.limits(),
+        ))
+        self._transports[key] = transport
+        return httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(settings.timeout),
+        )
+
+    def get_client(self, base_url: Optional[str], proxy: Optional[str] = None) -> httpx.AsyncClient:
+        """Return the shared client for this endpoint, creating it on first use."""
+        key = (endpoint_origin(base_url), proxy)
+        client = self._clients.get(key)
+        if client is not None and not client.is_closed:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = self._create_client(key, proxy)
+                self._clients[key] = client
+            return client
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            transports = list(self._transports.values())
+        return {"clients": len(transports), "loop_pools": sum(t.loop_count() for t in transports)}
+
+    async def aclose_loop(self):
+        """
+        Release connections opened by the running loop while keeping clients usable.
+        Call before a per-job loop is closed; other loops keep their warm pools.
+        """
+        with self._lock:
+            transports = list(self._transports.values())
+        for transport in transports:
+            await transport.aclose_loop()
+
+    async def aclose(self):
+        """Close every pooled client. Call once on application shutdown."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._transports.clear()
+        for client in clients:
+            await client.aclose()
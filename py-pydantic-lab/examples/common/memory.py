@@ -0,0 +1,242 @@
+"""
+Conversation Memory Manager - Architectural Rationale:
+------------------------------------------------------
+Passing `result.all_messages()` back as `message_history` every turn makes
+input tokens grow linearly per turn, so the cost of a conversation grows
+quadratically with its length.
+
+1. Pinned Context: System prompt parts (which pydantic_ai only adds when the
+   history is empty) are always kept at the head of the history.
+2. Turn Window: History is split into turns, each starting at a user prompt.
+   A turn holds its tool-call and tool-return messages, so windowing never
+   separates a call from its return. The newest `keep_turns` turns that fit
+   the token budget are sent verbatim; with `trim_to` the window is trimmed
+   in batches, so the history prefix (and provider prompt cache) stays
+   stable between trims.
+3. Rolling Summary: Older turns are folded into a running summary by a
+   separate summarizer agent in a background task, off the request path.
+   Until a summary lands, unsummarized turns are still sent while the budget
+   allows. Without a summarizer the manager is a plain sliding window.
+4. Bounded State: Turns are discarded once summarized, so memory (and the
+   payload we serialize) stays proportional to the budget, not the
+   conversation length.
+"""
+
+import asyncio
+from dataclasses import dataclass, replace
+from typing import Any, List, Optional, Sequence
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    RetryPromptPart,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from common.token_usage import TokenEstimator, count_message_tokens, default_estimator
+
+SUMMARY_PREFIX = "以下是之前对话的摘要（较早的轮次已被压缩）：\n"
+
+SUMMARIZER_PROMPT = (
+    "你负责压缩对话记忆。根据已有摘要和新增的对话记录，输出一份更新后的简洁摘要，"
+    "保留用户的身份、偏好、已做出的决定、已执行的操作及其结果、尚未完成的事项。"
+    "不要编造内容，不要复述寒暄，直接输出摘要正文。"
+)
+
+
+@dataclass
+class Turn:
+    """One user turn: the prompt request and every response/tool message until the next prompt."""
+    messages: List[ModelMessage]
+    tokens: int
+
+
+@dataclass
+class MemoryStats:
+    turns: int = 0
+    summarized_turns: int = 0
+    summaries: int = 0
+    summary_errors: int = 0
+    last_history_tokens: int = 0
+    full_history_tokens: int = 0   # what passing all_messages() would have sent for the next run
+
+
+def _starts_turn(message: ModelMessage) -> bool:
+    return isinstance(message, ModelRequest) and any(isinstance(p, UserPromptPart) for p in message.parts)
+
+
+def _render(messages: List[ModelMessage]) -> str:
+    """Plain-text transcript for the summarizer."""
+    lines = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, UserPromptPart):
+                content = part.content if isinstance(part.content, str) else " ".join(
+                    item for item in part.content if isinstance(item, str))
+                lines.append(f"用户: {content}")
+            elif isinstance(part, TextPart):
+                lines.append(f"助手: {part.content}")
+            elif isinstance(part, ToolCallPart):
+                lines.append(f"助手调用工具 {part.tool_name}({part.args_as_json_str()})")
+            elif isinstance(part, ToolReturnPart):
+                lines.append(f"工具 {part.tool_name} 返回: {part.model_response_str()}")
+            elif isinstance(part, RetryPromptPart):
+                lines.append(f"重试提示: {part.model_response()}")
+    return "\n".join(lines)
+
+
+class MemoryManager:
+    """
+    Builds a token-budgeted `message_history`: pinned system parts + rolling
+    summary + the most recent turns. Feed every run in with `add_run(result)`.
+    """
+
+    def __init__(
+        self,
+        summarizer: Optional[Agent] = None,
+        max_tokens: int = 2000,
+        keep_turns: int = 6,
+        estimator: Optional[TokenEstimator] = None,
+        trim_to: Optional[int] = None,
+    ):
+        self.summarizer = summarizer
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        # Trimming one turn per run changes the history prefix every run (provider prompt-cache miss);
+        # trimming down to `trim_to` turns at once keeps it byte-identical until the next overflow
+        self.trim_to = min(trim_to or keep_turns, keep_turns)
+        self.estimator = estimator or default_estimator()
+        self.pinned: List[SystemPromptPart] = []
+        self.summary = ""
+        self.turns: List[Turn] = []         # retained turns, oldest first (all unsummarized)
+        self.stats = MemoryStats()
+        self._pinned_tokens = 0
+        self._summary_tokens = 0
+        self._task: Optional[asyncio.Task] = None
+        self._anchor = 0                    # absolute turn number where the verbatim window starts
+
+    # ---------- ingest ----------
+
+    def add_run(self, result: Any):
+        """Record one run's new messages and (maybe) start compressing turns that left the window."""
+        self.add_messages(result.new_messages())
+
+    def add_messages(self, messages: Sequence[ModelMessage]):
+        """Record messages directly, e.g. a history restored from a session store."""
+        for message in messages:
+            self._add_message(message)
+        self._maybe_summarize()
+
+    def _add_message(self, message: ModelMessage):
+        if isinstance(message, ModelRequest):
+            system = [p for p in message.parts if isinstance(p, SystemPromptPart)]
+            if system:
+                # System parts are pinned once and kept out of the turns, so trimming can never drop them
+                if not self.pinned:
+                    self.pinned = system
+                    self._pinned_tokens = sum(self.estimator.count(p.content) for p in system)
+                    self.stats.full_history_tokens += self._pinned_tokens
+                message = replace(message, parts=[p for p in message.parts if not isinstance(p, SystemPromptPart)])
+                if not message.parts:
+                    return
+        tokens = count_message_tokens(message, self.estimator)
+        self.stats.full_history_tokens += tokens
+        if _starts_turn(message) or not self.turns:
+            self.turns.append(Turn([message], tokens))
+            self.stats.turns += 1
+        else:
+            turn = self.turns[-1]
+            turn.messages.append(message)
+            turn.tokens += tokens
+
+    # ---------- window selection ----------
+
+    def _window_start(self) -> int:
+        """
+        Index of the oldest turn sent verbatim. The window start stays put while the
+        window holds at most `keep_turns` turns within the budget; once it overflows it
+        jumps forward to the newest `trim_to` turns that fit (always >= 1 turn).
+        """
+        budget = self.max_tokens - self._pinned_tokens - self._summary_tokens
+        start = max(self._anchor - self.stats.summarized_turns, 0)
+        if (len(self.turns) - start <= self.keep_turns
+                and sum(turn.tokens for turn in self.turns[start:]) <= budget):
+            return start
+        start = len(self.turns)
+        used = 0
+        while start > 0 and len(self.turns) - start < self.trim_to:
+            cost = self.turns[start - 1].tokens
+            if used + cost > budget and start < len(self.turns):
+                break
+            used += cost
+            start -= 1
+        self._anchor = self.stats.summarized_turns + start
+        return start
+
+    def messages(self) -> List[ModelMessage]:
+        """The history to pass as `message_history` for the next run."""
+        if not self.turns and not self.pinned:
+            return []
+        start = self._window_start()
+        budget = self.max_tokens - self._pinned_tokens - self._summary_tokens
+        used = sum(turn.tokens for turn in self.turns[start:])
+        # Turns waiting for the background summary are still sent, newest first, while the budget allows
+        while start > 0 and used + self.turns[start - 1].tokens <= budget:
+            start -= 1
+            used += self.turns[start].tokens
+
+        head: List[Any] = list(self.pinned)
+        if self.summary:
+            head.append(SystemPromptPart(SUMMARY_PREFIX + self.summary))
+        history: List[ModelMessage] = [m for turn in self.turns[start:] for m in turn.messages]
+        if head:
+            if history and isinstance(history[0], ModelRequest):
+                history[0] = replace(history[0], parts=head + list(history[0].parts))
+            else:
+                history.insert(0, ModelRequest(parts=head))
+        self.stats.last_history_tokens = self._pinned_tokens + self._summary_tokens + used
+        return history
+
+    # ---------- background summarization ----------
+
+    def _maybe_summarize(self):
+        if self._task is not None and not self._task.done():
+            return  # one summary at a time; the next one is scheduled when it finishes
+        evicted = self._window_start()
+        if not evicted:
+            return
+        if self.summarizer is None:
+            self._discard(evicted)
+            return
+        self._task = asyncio.create_task(self._summarize(evicted))
+
+    def _discard(self, count: int):
+        del self.turns[:count]
+        self.stats.summarized_turns += count
+
+    async def _summarize(self, count: int):
+        transcript = _render([m for turn in self.turns[:count] for m in turn.messages])
+        prompt = f"已有摘要：\n{self.summary or '（无）'}\n\n新增对话：\n{transcript}"
+        try:
+            result = await self.summarizer.run(prompt)
+        except Exception:
+            # Degrade to a sliding window rather than retrying the same turns forever
+            self.stats.summary_errors += 1
+        else:
+            self.summary = str(result.output).strip()
+            self._summary_tokens = self.estimator.count(SUMMARY_PREFIX + self.summary)
+            self.stats.summaries += 1
+        # Turns appended while the summarizer ran are after `count`, so this drops exactly the summarized ones
+        self._discard(count)
+        self._task = None
+        self._maybe_summarize()
+
+    async def drain(self):
+        """Wait for pending summarization (e.g. before persisting the memory or exiting)."""
+        while self._task is not None:
+            await self._task
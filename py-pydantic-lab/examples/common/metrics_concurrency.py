@@ -0,0 +1,155 @@
+"""
+Concurrency Gauges - Architectural Rationale:
+---------------------------------------------
+"Calls faster than 1s" is not a concurrency measure, and without real
+in-flight numbers semaphore limits and connection-pool sizes are guesses.
+
+1. Live Gauges: Every monitored call increments a per-model waiting gauge
+   while it queues for a slot and an in-flight gauge while it is served.
+2. Queue vs Service Time: Time spent waiting for a concurrency slot and time
+   spent in the provider call are recorded in separate latency sketches, so a
+   slow p95 can be attributed to our own limits or to the provider.
+3. Concurrency Series: In-flight count is integrated over time into 1-second
+   buckets (time-weighted average and peak), kept in a fixed ring. Quantiles
+   of the per-second peak are a data-driven starting point for pool sizes.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.metrics_sketch import SketchRegistry
+
+
+@dataclass
+class CallTiming:
+    """Filled in by `ConcurrencyTracker.track` for the caller to read after the block."""
+    queue_ms: float = 0.0
+    service_started: float = 0.0
+
+
+class ConcurrencyTracker:
+    """In-flight/waiting gauges per model, queue/service time sketches and a 1s concurrency series."""
+
+    def __init__(self, history_seconds: int = 3600):
+        self.inflight: Dict[str, int] = {}
+        self.waiting: Dict[str, int] = {}
+        self.peak: Dict[str, int] = {}
+        self.total_inflight = 0
+        self.queue_time = SketchRegistry()
+        self.service_time = SketchRegistry()
+
+        # Per-second series: integral of in-flight count over the second, and the peak within it
+        self._slots = history_seconds
+        self._second = np.full(history_seconds, -1, dtype=np.int64)
+        self._area = np.zeros(history_seconds, dtype=np.float64)
+        self._max = np.zeros(history_seconds, dtype=np.int64)
+        self._last_change = time.time()
+
+    # ---------- series bookkeeping ----------
+
+    def _slot(self, second: int) -> int:
+        slot = second % self._slots
+        if self._second[slot] != second:
+            self._second[slot] = second
+            self._area[slot] = 0.0
+            self._max[slot] = 0
+        return slot
+
+    def _advance(self, now: float):
+        """Credit the current in-flight count to every second elapsed since the last change."""
+        t, level = self._last_change, self.total_inflight
+        if level:
+            first, last = int(t), int(now)
+            # Only the last `history_seconds` can be stored; skip the rest of a long idle-free stretch
+            first = max(first, last - self._slots + 1)
+            for second in range(first, last + 1):
+                lo, hi = max(t, second), min(now, second + 1)
+                if hi > lo:
+                    slot = self._slot(second)
+                    self._area[slot] += level * (hi - lo)
+                    self._max[slot] = max(self._max[slot], level)
+        self._last_change = now
+
+    def _change(self, model: str, delta: int):
+        now = time.time()
+        self._advance(now)
+        self.total_inflight += delta
+        level = self.inflight[model] = self.inflight.get(model, 0) + delta
+        self.peak[model] = max(self.peak.get(model, 0), level)
+        slot = self._slot(int(now))
+        self._max[slot] = max(self._max[slot], self.total_inflight)
+
+    # ---------- instrumentation ----------
+
+    @asynccontextmanager
+    async def track(
+        self,
+        model: str,
+        operation: str = "completion",
+        semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> AsyncIterator[CallTiming]:
+        """
+        Wrap one call: waits for `semaphore` (if any) as queue time, then counts
+        the call as in flight until the block exits.
+        """
+        timing = CallTiming()
+        queued = time.perf_counter()
+        if semaphore is not None:
+            self.waiting[model] = self.waiting.get(model, 0) + 1
+            try:
+                await semaphore.acquire()
+            finally:
+                self.waiting[model] -= 1
+        timing.service_started = time.perf_counter()
+        timing.queue_ms = (timing.service_started - queued) * 1000
+        self.queue_time.record(model, operation, timing.queue_ms)
+
+        self._change(model, +1)
+        try:
+            yield timing
+        finally:
+            self._change(model, -1)
+            self.service_time.record(model, operation, (time.perf_counter() - timing.service_started) * 1000)
+            if semaphore is not None:
+                semaphore.release()
+
+    # ---------- reads ----------
+
+    def series(self, seconds: int = 60, now: Optional[float] = None) -> List[Tuple[int, float, int]]:
+        """(second, time-weighted average in flight, peak in flight) for the trailing window."""
+        now = time.time() if now is None else now
+        self._advance(now)
+        last = int(now)
+        out = []
+        for second in range(last - min(seconds, self._slots) + 1, last + 1):
+            slot = second % self._slots
+            if self._second[slot] == second:
+                # The current second is only partly elapsed
+                elapsed = min(1.0, now - second) if second == last else 1.0
+                out.append((second, float(self._area[slot]) / elapsed if elapsed else 0.0, int(self._max[slot])))
+            else:
+                out.append((second, 0.0, 0))
+        return out
+
+    def _peaks(self, seconds: int, now: Optional[float]) -> np.ndarray:
+        """Non-zero per-second peaks of the trailing window, as one vectorized mask over the ring."""
+        now = time.time() if now is None else now
+        self._advance(now)
+        last = int(now)
+        live = (self._second > last - min(seconds, self._slots)) & (self._second <= last) & (self._max > 0)
+        return self._max[live]
+
+    def peak_in_flight(self, seconds: int = 60, now: Optional[float] = None) -> int:
+        """Highest in-flight count over the trailing window."""
+        peaks = self._peaks(seconds, now)
+        return int(peaks.max()) if peaks.size else 0
+
+    def suggested_limit(self, seconds: int = 3600, quantile: float = 0.99, now: Optional[float] = None) -> int:
+        """Quantile of per-second peak concurrency over the window (a starting point for semaphores/pools)."""
+        peaks = self._peaks(seconds, now)
+        return int(np.ceil(np.quantile(peaks, quantile))) if peaks.size else 0
@@ -0,0 +1,303 @@
+"""
+Metrics Export Pipeline - Architectural Rationale:
+--------------------------------------------------
+`print()` inside `record_api_call` puts terminal I/O on the request path, and
+a real exporter called inline would add network latency (or an outage) to
+every agent call.
+
+1. Non-Blocking Submit: `submit()` only appends to a bounded in-memory queue
+   and returns immediately; export happens on a background task.
+2. Batching: The flusher drains the queue when a batch fills up or the flush
+   interval elapses, whichever comes first, and hands each batch to every sink.
+3. Backpressure by Shedding: Above a high-water mark only 1 in N records is
+   admitted (sampling); when the queue is full records are dropped. Both are
+   counted, so data loss is visible instead of silent.
+4. Pluggable Sinks: OpenMetrics text (scrape endpoint), JSONL file and OTLP/HTTP
+   JSON for a local collector. A failing sink is counted and does not affect
+   the others.
+"""
+
+import asyncio
+import json
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+
+class MetricsSink(ABC):
+    """Base class for export destinations. `write` receives batches of APICallMetrics records."""
+
+    name = "sink"
+
+    @abstractmethod
+    async def write(self, batch: Sequence[Any]):
+        ...
+
+    async def aclose(self):
+        pass
+
+
+class ConsoleSink(MetricsSink):
+    """Prints one line per call (what `record_api_call` used to do inline)."""
+
+    name = "console"
+
+    async def write(self, batch: Sequence[Any]):
+        for m in batch:
+            print(f"📊 API调用: {m.model} | Tokens: {m.total_tokens} | "
+                  f"耗时: {m.latency_ms:.0f}ms | 成本: ${m.cost_usd:.6f}")
+
+
+class JSONLSink(MetricsSink):
+    """Appends one JSON object per call to a file (written off the event loop)."""
+
+    name = "jsonl"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def _append(self, lines: str):
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def write(self, batch: Sequence[Any]):
+        lines = "".join(json.dumps(asdict(m), default=str, ensure_ascii=False) + "\n" for m in batch)
+        await asyncio.to_thread(self._append, lines)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class OpenMetricsSink(MetricsSink):
+    """
+    Keeps cumulative counters per (model, operation) and renders them in the
+    OpenMetrics text format; `serve()` exposes them on a /metrics endpoint.
+    """
+
+    name = "openmetrics"
+    _COUNTERS = (
+        ("llm_calls", "API calls", lambda m: 1),
+        ("llm_errors", "Failed API calls", lambda m: int(not m.success)),
+        ("llm_prompt_tokens", "Prompt tokens", lambda m: m.prompt_tokens),
+        ("llm_completion_tokens", "Completion tokens", lambda m: m.completion_tokens),
+        ("llm_cache_read_tokens", "Prompt tokens served from cache", lambda m: getattr(m, "cache_read_tokens", 0)),
+        ("llm_cost_usd", "Cost in USD", lambda m: m.cost_usd),
+        ("llm_latency_ms", "Summed latency in milliseconds", lambda m: m.latency_ms),
+    )
+
+    def __init__(self):
+        self.values: Dict[Tuple[str, str], List[float]] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def write(self, batch: Sequence[Any]):
+        for m in batch:
+            row = self.values.setdefault((m.model, m.operation), [0.0] * len(self._COUNTERS))
+            for i, (_, _, value) in enumerate(self._COUNTERS):
+                row[i] += value(m)
+
+    def render(self) -> str:
+        lines = []
+        for i, (name, help_text, _) in enumerate(self._COUNTERS):
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"# HELP {name} {help_text}.")
+            for (model, operation), row in sorted(self.values.items()):
+                labels = f'model="{_escape_label(model)}",operation="{_escape_label(operation)}"'
+                lines.append(f"{name}_total{{{labels}}} {row[i]:g}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # skip headers
+            if request_line.split(b" ")[1:2] == [b"/metrics"]:
+                body = self.render().encode()
+                head = "HTTP/1.1 200 OK\r\nContent-Type: application/openmetrics-text; version=1.0.0; charset=utf-8\r\n"
+            else:
+                body = b"not found\n"
+                head = "HTTP/1.1 404 Not Found\r\nContent-Type: text/plain\r\n"
+            writer.write(f"{head}Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9464) -> asyncio.AbstractServer:
+        """Start a minimal scrape endpoint at http://host:port/metrics."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def aclose(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+
+class OTLPHttpSink(MetricsSink):
+    """
+    Posts each batch as OTLP/HTTP JSON delta sums to a local collector
+    (e.g. the OpenTelemetry Collector's `otlp` receiver on :4318).
+    """
+
+    name = "otlp"
+
+    def __init__(self, endpoint: str = "http://localhost:4318/v1/metrics", service_name: str = "pydantic-lab",
+                 timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self._client = httpx.AsyncClient(timeout=timeout)
+        self._last_flush_ns = time.time_ns()
+
+    def _payload(self, batch: Sequence[Any]) -> Dict[str, Any]:
+        now_ns = time.time_ns()
+        start_ns, self._last_flush_ns = self._last_flush_ns, now_ns
+        sums: Dict[Tuple[str, str, str], float] = {}
+        for m in batch:
+            for metric, value in (("llm.calls", 1), ("llm.errors", int(not m.success)),
+                                  ("llm.tokens.prompt", m.prompt_tokens), ("llm.tokens.completion", m.completion_tokens),
+                                  ("llm.cost_usd", m.cost_usd), ("llm.latency_ms", m.latency_ms)):
+                key = (metric, m.model, m.operation)
+                sums[key] = sums.get(key, 0.0) + value
+
+        metrics: Dict[str, List[Dict[str, Any]]] = {}
+        for (metric, model, operation), value in sums.items():
+            metrics.setdefault(metric, []).append({
+                "attributes": [
+                    {"key": "model", "value": {"stringValue": model}},
+                    {"key": "operation", "value": {"stringValue": operation}},
+                ],
+                "startTimeUnixNano": str(start_ns),
+                "timeUnixNano": str(now_ns),
+                "asDouble": value,
+            })
+        return {"resourceMetrics": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeMetrics": [{
+                "scope": {"name": "common.metrics_export"},
+                "metrics": [
+                    # aggregationTemporality 1 = DELTA
+                    {"name": name, "sum": {"dataPoints": points, "aggregationTemporality": 1, "isMonotonic": True}}
+                    for name, points in metrics.items()
+                ],
+            }],
+        }]}
+
+    async def write(self, batch: Sequence[Any]):
+        response = await self._client.post(self.endpoint, json=self._payload(batch))
+        response.raise_for_status()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+
+class MetricsExporter:
+    """Bounded, batched, non-blocking fan-out of metric records to sinks."""
+
+    def __init__(
+        self,
+        sinks: Sequence[MetricsSink],
+        max_queue: int = 10_000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        high_water: float = 0.8,
+        sample_every: int = 10,
+    ):
+        self.sinks = list(sinks)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.high_water = int(max_queue * high_water)
+        self.sample_every = sample_every
+        self._queue: Deque[Any] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._over_high_water = 0
+
+        self.submitted = 0
+        self.exported = 0
+        self.dropped = 0       # rejected because the queue was full
+        self.sampled_out = 0   # skipped by sampling above the high-water mark
+        self.batches = 0
+        self.sink_errors: Dict[str, int] = {sink.name: 0 for sink in self.sinks}
+
+    # ---------- request path ----------
+
+    def submit(self, record: Any) -> bool:
+        """Enqueue a record without blocking. Returns False if it was shed."""
+        self.submitted += 1
+        depth = len(self._queue)
+        if depth >= self.max_queue:
+            self.dropped += 1
+            return False
+        if depth >= self.high_water:
+            self._over_high_water += 1
+            if self._over_high_water % self.sample_every:
+                self.sampled_out += 1
+                return False
+        else:
+            self._over_high_water = 0
+        self._queue.append(record)
+        if depth + 1 >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    # ---------- background flushing ----------
+
+    def start(self):
+        """Start the flusher on the running event loop (idempotent)."""
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Drain the queue in batches and write each batch to every sink."""
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+            results = await asyncio.gather(*(sink.write(batch) for sink in self.sinks), return_exceptions=True)
+            for sink, result in zip(self.sinks, results):
+                if isinstance(result, BaseException):
+                    self.sink_errors[sink.name] = self.sink_errors.get(sink.name, 0) + 1
+            self.exported += len(batch)
+            self.batches += 1
+
+    async def aclose(self):
+        """Stop the flusher, export whatever is still queued, and close the sinks."""
+        if self._task is not None:
+            # Let an in-progress batch finish rather than cancelling it half-written
+            self._closing = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        for sink in self.sinks:
+            await sink.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": len(self._queue),
+            "submitted": self.submitted,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "sampled_out": self.sampled_out,
+            "batches": self.batches,
+            "sink_errors": dict(self.sink_errors),
+        }
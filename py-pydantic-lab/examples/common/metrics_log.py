@@ -0,0 +1,301 @@
+"""
+Metrics Segment Log - Architectural Rationale:
+----------------------------------------------
+Monitoring state that only lives in process memory is gone after a restart,
+and a JSONL export is too slow to re-parse millions of lines at startup.
+
+1. Fixed-Width Records: Each call is one packed NumPy record (timestamps,
+   latencies, tokens, cost, flags, interned ids, prompt hash). Strings are
+   interned once into an append-only `symbols.jsonl`.
+2. Segments with Rotation: Records are appended to `seg-<seq>.bin` files that
+   rotate after `segment_records` rows; closed segments are immutable.
+   Each segment starts with a header (magic, format version, record size).
+3. Time Index: `index.jsonl` stores each closed segment's first/last
+   timestamp and row count, so time-range queries open only the segments
+   they need and binary-search timestamps inside them.
+4. mmap Replay: Segments are mapped with `np.memmap` (no parsing, no copies
+   until sliced), so millions of records rebuild the in-memory aggregates in
+   well under a second and remain queryable offline with NumPy.
+5. Single Writer: The symbol table, time index and active segment are owned
+   by one `MetricsLog`. It holds an exclusive `flock` on the directory's
+   `LOCK` file, so a second writer (another process or instance) fails fast
+   instead of interleaving ids and index entries.
+"""
+
+import asyncio
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, the single-writer rule is not enforced
+    fcntl = None
+
+from common.metrics_export import MetricsSink
+from common.metrics_store import APICallMetrics
+
+MAGIC = b"PLMLOG"
+FORMAT_VERSION = 1
+HEADER_SIZE = 64
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("latency_ms", "<f8"),
+    ("cost_usd", "<f8"),
+    ("prompt_tokens", "<i8"),
+    ("completion_tokens", "<i8"),
+    ("total_tokens", "<i8"),
+    ("cache_read_tokens", "<i8"),
+    ("reasoning_tokens", "<i8"),
+    ("prompt_hash", "<u8"),
+    ("model_id", "<i4"),
+    ("operation_id", "<i4"),
+    ("template_id", "<i4"),
+    ("success", "u1"),
+    ("usage_estimated", "u1"),
+    ("provider_id", "<u2"),  # was padding (always 0) in earlier writers, and 0 = default provider
+])
+
+_SYMBOL_KINDS = ("model", "operation", "template", "provider")
+
+
+class MetricsLog:
+    """Append-only, segment-rotated, fixed-width on-disk log of APICallMetrics."""
+
+    def __init__(self, directory: str, segment_records: int = 1_000_000, fsync: bool = False):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock_file = self._lock_directory()
+        self.segment_records = segment_records
+        self.fsync = fsync
+        self._symbols: Dict[str, List[str]] = {kind: [] for kind in _SYMBOL_KINDS}
+        self._symbol_ids: Dict[str, Dict[str, int]] = {kind: {} for kind in _SYMBOL_KINDS}
+        self._index: List[Dict] = []
+        # Provider id 0 is the deployment's default (""); implicit, never written to symbols.jsonl
+        self._symbols["provider"].append("")
+        self._symbol_ids["provider"][""] = 0
+        self._load_metadata()
+        self._active_seq, self._active_rows = self._open_active()
+
+    def _lock_directory(self):
+        lock_file = (self.directory / "LOCK").open("a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                raise RuntimeError(f"{self.directory} is already open by another MetricsLog writer") from None
+        return lock_file
+
+    def close(self):
+        """Release the directory lock; the log must not be appended to afterwards."""
+        if self._lock_file is not None:
+            self._lock_file.close()  # closing the descriptor drops the flock
+            self._lock_file = None
+
+    # ---------- metadata ----------
+
+    @staticmethod
+    def _read_jsonl(path: Path) -> List[Dict]:
+        """Entries of a JSON-lines file. A torn final line (crash mid-write) is cut off, so later appends stay aligned."""
+        if not path.exists():
+            return []
+        data = path.read_bytes()
+        if data and not data.endswith(b"\n"):
+            data = data[:data.rfind(b"\n") + 1]
+            os.truncate(path, len(data))
+        return [json.loads(line) for line in data.decode("utf-8").splitlines() if line]
+
+    def _load_metadata(self):
+        for entry in self._read_jsonl(self.directory / "symbols.jsonl"):
+            names = self._symbols[entry["kind"]]
+            if entry["id"] == len(names):
+                names.append(entry["value"])
+                self._symbol_ids[entry["kind"]][entry["value"]] = entry["id"]
+        self._index = self._read_jsonl(self.directory / "index.jsonl")
+
+    def _intern(self, kind: str, value: str, new_symbols: List[str]) -> int:
+        ids = self._symbol_ids[kind]
+        idx = ids.get(value)
+        if idx is None:
+            idx = ids[value] = len(self._symbols[kind])
+            self._symbols[kind].append(value)
+            new_symbols.append(json.dumps({"kind": kind, "id": idx, "value": value}, ensure_ascii=False))
+        return idx
+
+    def symbols(self, kind: str) -> List[str]:
+        return list(self._symbols[kind])
+
+    # ---------- segments ----------
+
+    def _segment_path(self, seq: int) -> Path:
+        return self.directory / f"seg-{seq:06d}.bin"
+
+    def _segments(self) -> List[int]:
+        return sorted(int(p.stem.split("-")[1]) for p in self.directory.glob("seg-*.bin"))
+
+    def _rows_in(self, path: Path) -> int:
+        # A torn trailing record (crash mid-write) is ignored by readers; `_open_active` cuts it off
+        return max(0, (path.stat().st_size - HEADER_SIZE) // RECORD_DTYPE.itemsize)
+
+    def _open_active(self) -> Tuple[int, int]:
+        indexed = {entry["seq"] for entry in self._index}
+        open_segments = [seq for seq in self._segments() if seq not in indexed]
+        if open_segments:
+            seq = open_segments[-1]
+            path = self._segment_path(seq)
+            if path.stat().st_size < HEADER_SIZE:
+                # Crashed while creating the segment: nothing was appended yet
+                self._create_segment(seq)
+                return seq, 0
+            self._check_header(path)
+            rows = self._rows_in(path)
+            # Drop a torn trailing record, otherwise every later "ab" append would be misaligned
+            os.truncate(path, HEADER_SIZE + rows * RECORD_DTYPE.itemsize)
+            return seq, rows
+        seq = max(indexed, default=-1) + 1
+        self._create_segment(seq)
+        return seq, 0
+
+    def _create_segment(self, seq: int):
+        header = MAGIC + struct.pack("<HH", FORMAT_VERSION, RECORD_DTYPE.itemsize)
+        with self._segment_path(seq).open("wb") as f:
+            f.write(header.ljust(HEADER_SIZE, b"\0"))
+
+    def _check_header(self, path: Path):
+        with path.open("rb") as f:
+            header = f.read(len(MAGIC) + 4)
+        if len(header) < len(MAGIC) + 4 or header[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a metrics log segment")
+        version, record_size = struct.unpack("<HH", header[len(MAGIC):])
+        if (version, record_size) != (FORMAT_VERSION, RECORD_DTYPE.itemsize):
+            raise ValueError(f"{path} uses segment format v{version} ({record_size}-byte records)")
+
+    def _seal_active(self):
+        rows = self._map(self._active_seq)
+        entry = {"seq": self._active_seq, "rows": len(rows),
+                 "first_ts": float(rows["timestamp"].min()) if len(rows) else None,
+                 "last_ts": float(rows["timestamp"].max()) if len(rows) else None}
+        with (self.directory / "index.jsonl").open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        self._index.append(entry)
+        self._active_seq += 1
+        self._active_rows = 0
+        self._create_segment(self._active_seq)
+
+    # ---------- writes ----------
+
+    def _encode(self, batch: Sequence[APICallMetrics], new_symbols: List[str]) -> np.ndarray:
+        records = np.zeros(len(batch), dtype=RECORD_DTYPE)
+        for i, m in enumerate(batch):
+            records[i] = (
+                m.timestamp.timestamp(), m.latency_ms, m.cost_usd, m.prompt_tokens, m.completion_tokens,
+                m.total_tokens, m.cache_read_tokens, m.reasoning_tokens, m.prompt_hash,
+                self._intern("model", m.model, new_symbols),
+                self._intern("operation", m.operation, new_symbols),
+                self._intern("template", m.template, new_symbols),
+                m.success, m.usage_estimated,
+                self._intern("provider", m.provider, new_symbols),
+            )
+        return records
+
+    def append_batch(self, batch: Sequence[APICallMetrics]):
+        """Append records, rotating segments as they fill. Symbols are persisted before the rows that use them."""
+        new_symbols: List[str] = []
+        records = self._encode(batch, new_symbols)
+        if new_symbols:
+            with (self.directory / "symbols.jsonl").open("a", encoding="utf-8") as f:
+                f.write("\n".join(new_symbols) + "\n")
+        offset = 0
+        while offset < len(records):
+            room = self.segment_records - self._active_rows
+            if room <= 0:
+                self._seal_active()
+                continue
+            chunk = records[offset:offset + room]
+            with self._segment_path(self._active_seq).open("ab") as f:
+                f.write(chunk.tobytes())
+                if self.fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._active_rows += len(chunk)
+            offset += len(chunk)
+
+    def append(self, metrics: APICallMetrics):
+        self.append_batch([metrics])
+
+    # ---------- reads ----------
+
+    def _map(self, seq: int) -> np.ndarray:
+        path = self._segment_path(seq)
+        rows = self._rows_in(path)
+        if not rows:
+            return np.zeros(0, dtype=RECORD_DTYPE)
+        self._check_header(path)
+        return np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(rows,))
+
+    def segments(self, start: Optional[float] = None, end: Optional[float] = None) -> List[np.ndarray]:
+        """Memory-mapped record arrays of the segments overlapping [start, end] (epoch seconds)."""
+        out = []
+        for entry in self._index:
+            if entry["rows"] and (start is None or entry["last_ts"] >= start) and (end is None or entry["first_ts"] <= end):
+                out.append(self._map(entry["seq"]))
+        active = self._map(self._active_seq)
+        if len(active):
+            out.append(active)
+        return out
+
+    @property
+    def row_count(self) -> int:
+        return sum(entry["rows"] for entry in self._index) + self._active_rows
+
+    def read_columns(self, start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Concatenate the matching segments into chronologically ordered columns (for NumPy analysis or replay)."""
+        parts = []
+        for records in self.segments(start, end):
+            ts = records["timestamp"]
+            if len(ts) < 2 or (ts[1:] >= ts[:-1]).all():
+                # Segments are written in arrival order, so timestamps are normally sorted: binary-search the range
+                lo = 0 if start is None else int(np.searchsorted(ts, start, side="left"))
+                hi = len(ts) if end is None else int(np.searchsorted(ts, end, side="right"))
+                parts.append(records[lo:hi])
+            else:
+                # Timestamps out of arrival order (stamped at call start, logged on completion; clock steps):
+                # filter exactly
+                mask = np.ones(len(ts), dtype=bool)
+                if start is not None:
+                    mask &= ts >= start
+                if end is not None:
+                    mask &= ts <= end
+                parts.append(records[mask])
+        names = [name for name in RECORD_DTYPE.names if not name.startswith("_")]
+        # One copy per field straight out of the mapped segments (no intermediate record array)
+        columns = {name: np.concatenate([p[name] for p in parts]) if parts else np.zeros(0, RECORD_DTYPE[name])
+                   for name in names}
+        ts = columns["timestamp"]
+        if len(ts) > 1 and not (ts[1:] >= ts[:-1]).all():
+            order = np.argsort(ts, kind="stable")
+            columns = {name: col[order] for name, col in columns.items()}
+        columns["success"] = columns["success"].view(bool)
+        columns["usage_estimated"] = columns["usage_estimated"].view(bool)
+        return columns
+
+
+class MetricsLogSink(MetricsSink):
+    """Export-pipeline sink that appends each batch to a MetricsLog off the event loop."""
+
+    name = "segment_log"
+
+    def __init__(self, log: MetricsLog):
+        self.log = log
+
+    async def write(self, batch: Sequence[APICallMetrics]):
+        await asyncio.to_thread(self.log.append_batch, batch)
+
+    async def aclose(self):
+        self.log.close()
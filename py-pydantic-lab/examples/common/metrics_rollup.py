@@ -0,0 +1,203 @@
+"""
+Metrics Rollups - Architectural Rationale:
+------------------------------------------
+Answering "error rate over the last 5 minutes" or "hourly cost for the last
+7 days" by filtering raw call records is a scan per query, and raw records
+cannot be kept for 7 days anyway.
+
+1. Tumbling Windows: Every call is added to a 1s, a 1m and a 1h bucket.
+   Buckets hold sums only (count, errors, latency, cost, tokens), so any
+   window is answered by adding a few pre-aggregated rows.
+2. Retention as Ring Size: Each resolution is a fixed ring of slots sized
+   `retention / bucket width`. A slot is reset when a newer bucket maps onto
+   it, so old data ages out with no cleanup pass and memory is bounded.
+3. Downsampling: Raw records live only in the bounded ring buffer; older
+   history survives as 1m and then 1h buckets. `ingest_columns` backfills
+   rollups from raw columns in one vectorized pass.
+"""
+
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+FIELDS = ("count", "errors", "latency_sum_ms", "cost_usd", "prompt_tokens", "completion_tokens", "cache_read_tokens")
+_COUNT, _ERRORS, _LATENCY, _COST, _PROMPT, _COMPLETION, _CACHE_READ = range(len(FIELDS))
+
+
+@dataclass(frozen=True)
+class Resolution:
+    """Bucket width and how long buckets of that width are kept (both in seconds)."""
+    name: str
+    seconds: int
+    retention: int
+
+    @property
+    def slots(self) -> int:
+        return -(-self.retention // self.seconds)
+
+
+DEFAULT_RESOLUTIONS = (
+    Resolution("1s", 1, 3600),             # 1 hour of per-second buckets
+    Resolution("1m", 60, 2 * 86400),       # 2 days of per-minute buckets
+    Resolution("1h", 3600, 30 * 86400),    # 30 days of hourly buckets
+)
+
+
+@dataclass(frozen=True)
+class RollupTotals:
+    """Sums over one bucket or window."""
+    count: int = 0
+    errors: int = 0
+    latency_sum_ms: float = 0.0
+    cost_usd: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_read_tokens: int = 0
+
+    @classmethod
+    def from_row(cls, row: np.ndarray) -> "RollupTotals":
+        return cls(int(row[_COUNT]), int(row[_ERRORS]), float(row[_LATENCY]), float(row[_COST]),
+                   int(row[_PROMPT]), int(row[_COMPLETION]), int(row[_CACHE_READ]))
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.count if self.count else 0.0
+
+    @property
+    def avg_latency_ms(self) -> float:
+        return self.latency_sum_ms / self.count if self.count else 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+class _Ring:
+    """Fixed ring of buckets for one resolution."""
+
+    def __init__(self, resolution: Resolution):
+        self.resolution = resolution
+        self.starts = np.full(resolution.slots, -1, dtype=np.int64)   # bucket start (epoch s), -1 = empty
+        self.values = np.zeros((resolution.slots, len(FIELDS)), dtype=np.float64)
+
+    def add(self, ts: float, row: Sequence[float]):
+        width = self.resolution.seconds
+        start = int(ts // width) * width
+        slot = (start // width) % len(self.starts)
+        current = self.starts[slot]
+        if current != start:
+            if current > start:
+                return  # older than this resolution's retention
+            self.starts[slot] = start
+            self.values[slot] = 0.0
+        self.values[slot] += row
+
+    def add_many(self, ts: np.ndarray, rows: np.ndarray):
+        width = self.resolution.seconds
+        starts = (ts // width).astype(np.int64) * width
+        newest = int(starts.max())
+        # Rows older than the ring can hold are dropped, like late single writes
+        keep = starts > newest - len(self.starts) * width
+        starts, rows = starts[keep], rows[keep]
+        slots = (starts // width) % len(self.starts)
+        # The newest bucket start seen for each slot claims it (vectorized, no per-row Python loop)
+        claim = np.full(len(self.starts), -1, dtype=np.int64)
+        np.maximum.at(claim, slots, starts)
+        reset = claim > self.starts
+        self.starts[reset] = claim[reset]
+        self.values[reset] = 0.0
+        live = self.starts[slots] == starts
+        if not live.all():
+            slots, rows = slots[live], rows[live]
+        for col in range(rows.shape[1]):
+            self.values[:, col] += np.bincount(slots, weights=rows[:, col], minlength=len(self.starts))
+
+    def window(self, start: float, end: float) -> np.ndarray:
+        """Sum of buckets whose start lies in [start, end)."""
+        mask = (self.starts >= start) & (self.starts < end)
+        return self.values[mask].sum(axis=0)
+
+    def series(self, start: float, end: float) -> List[Tuple[int, np.ndarray]]:
+        width = self.resolution.seconds
+        first = int(start // width) * width
+        out = []
+        for bucket_start in range(first, int(end), width):
+            slot = (bucket_start // width) % len(self.starts)
+            if self.starts[slot] == bucket_start:
+                out.append((bucket_start, self.values[slot]))
+            else:
+                out.append((bucket_start, np.zeros(len(FIELDS))))
+        return out
+
+
+def _row(latency_ms: float, cost_usd: float, success: bool, prompt_tokens: int, completion_tokens: int,
+         cache_read_tokens: int) -> np.ndarray:
+    return np.array([1, not success, latency_ms, cost_usd, prompt_tokens, completion_tokens, cache_read_tokens],
+                    dtype=np.float64)
+
+
+class RollupEngine:
+    """Multi-resolution tumbling-window aggregates with per-resolution retention."""
+
+    def __init__(self, resolutions: Sequence[Resolution] = DEFAULT_RESOLUTIONS):
+        self.resolutions = sorted(resolutions, key=lambda r: r.seconds)
+        self._rings: Dict[str, _Ring] = {r.name: _Ring(r) for r in self.resolutions}
+
+    # ---------- writes ----------
+
+    def add(self, timestamp: float, latency_ms: float, cost_usd: float, success: bool,
+            prompt_tokens: int = 0, completion_tokens: int = 0, cache_read_tokens: int = 0):
+        row = _row(latency_ms, cost_usd, success, prompt_tokens, completion_tokens, cache_read_tokens)
+        for ring in self._rings.values():
+            ring.add(timestamp, row)
+
+    def add_call(self, metrics) -> None:
+        """Convenience for APICallMetrics records."""
+        self.add(metrics.timestamp.timestamp(), metrics.latency_ms, metrics.cost_usd, metrics.success,
+                 metrics.prompt_tokens, metrics.completion_tokens, metrics.cache_read_tokens)
+
+    def ingest_columns(self, columns: Dict[str, np.ndarray]):
+        """Backfill from raw columns (e.g. `MetricsRingBuffer.columns()`) in one vectorized pass per resolution."""
+        ts = columns["timestamp"]
+        if not len(ts):
+            return
+        rows = np.column_stack([
+            np.ones(len(ts)),
+            ~columns["success"].astype(bool),
+            columns["latency_ms"],
+            columns["cost_usd"],
+            columns["prompt_tokens"],
+            columns["completion_tokens"],
+            columns.get("cache_read_tokens", np.zeros(len(ts))),
+        ]).astype(np.float64)
+        for ring in self._rings.values():
+            ring.add_many(ts, rows)
+
+    # ---------- queries ----------
+
+    def _pick(self, span_start: float, now: float, resolution: Optional[str]) -> _Ring:
+        if resolution is not None:
+            return self._rings[resolution]
+        # Finest resolution whose retention still covers the requested window
+        for r in self.resolutions:
+            if now - span_start <= r.retention:
+                return self._rings[r.name]
+        return self._rings[self.resolutions[-1].name]
+
+    def window(self, seconds: float, now: Optional[float] = None, resolution: Optional[str] = None) -> RollupTotals:
+        """Totals for the trailing window, e.g. `window(300).error_rate` for the last 5 minutes."""
+        now = time.time() if now is None else now
+        start = now - seconds
+        ring = self._pick(start, now, resolution)
+        width = ring.resolution.seconds
+        # Buckets are whole: the bucket containing `start` counts only if it starts inside the window,
+        # the (still open) bucket containing `now` always counts
+        return RollupTotals.from_row(ring.window(-(-start // width) * width, (now // width + 1) * width))
+
+    def series(self, resolution: str, seconds: float, now: Optional[float] = None) -> List[Tuple[float, RollupTotals]]:
+        """Per-bucket totals over the trailing window, e.g. `series("1h", 7 * 86400)` for hourly cost."""
+        now = time.time() if now is None else now
+        ring = self._rings[resolution]
+        return [(start, RollupTotals.from_row(row)) for start, row in ring.series(now - seconds, now)]
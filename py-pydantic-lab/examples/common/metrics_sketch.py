@@ -0,0 +1,189 @@
+"""
+Latency Sketch - Architectural Rationale:
+-----------------------------------------
+An average hides the tail: one request in a hundred taking 30s barely moves
+`avg_latency_ms`, yet it is exactly what users notice and what SLOs are
+written against.
+
+1. Log-Bucketed Histogram: Latencies are counted in logarithmically spaced
+   buckets (DDSketch-style), so every quantile is reported within a fixed
+   relative error (1% by default) across microseconds to minutes.
+2. Constant Memory: The bucket array is allocated once for the trackable
+   range; recording a million calls costs the same memory as recording one.
+3. Mergeable: Two sketches with the same parameters merge by adding bucket
+   counts, so per-process sketches can be shipped (`to_bytes`) and combined
+   into a fleet-wide view without losing accuracy.
+"""
+
+import math
+import struct
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+_HEADER = struct.Struct("<dddQdd")  # relative_accuracy, min_ms, max_ms, count, observed min/max
+
+
+@dataclass(frozen=True)
+class Percentiles:
+    """Quantile summary of one sketch."""
+    count: int
+    p50: float
+    p95: float
+    p99: float
+    max: float
+
+
+class LatencySketch:
+    """Fixed-size, mergeable log-bucketed histogram of latencies in milliseconds."""
+
+    def __init__(self, relative_accuracy: float = 0.01, min_ms: float = 0.01, max_ms: float = 3_600_000.0):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be in (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self.min_ms = min_ms
+        self.max_ms = max_ms
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._offset = self._raw_index(min_ms)
+        # Bucket 0 also absorbs everything below min_ms, the last bucket everything above max_ms
+        self.counts = np.zeros(self._raw_index(max_ms) - self._offset + 1, dtype=np.int64)
+        self.count = 0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _raw_index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _bucket(self, value_ms: float) -> int:
+        if value_ms <= self.min_ms:
+            return 0
+        return min(self._raw_index(value_ms) - self._offset, len(self.counts) - 1)
+
+    def _value(self, bucket: int) -> float:
+        # Midpoint (in relative terms) of the bucket, which bounds the relative error
+        return 2 * self._gamma ** (bucket + self._offset) / (1 + self._gamma)
+
+    # ---------- writes ----------
+
+    def add(self, value_ms: float, n: int = 1):
+        self.counts[self._bucket(value_ms)] += n
+        self.count += n
+        self.min = min(self.min, value_ms)
+        self.max = max(self.max, value_ms)
+
+    def add_many(self, values_ms: Iterable[float]):
+        """Vectorized bulk insert (e.g. when backfilling from the ring buffer)."""
+        values = np.fromiter(values_ms, dtype=np.float64) if not isinstance(values_ms, np.ndarray) \
+            else values_ms.astype(np.float64, copy=False)
+        if not values.size:
+            return
+        clipped = np.maximum(values, self.min_ms)
+        idx = np.ceil(np.log(clipped) / self._log_gamma).astype(np.int64) - self._offset
+        idx = np.clip(idx, 0, len(self.counts) - 1)
+        np.add.at(self.counts, idx, 1)
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    def _check_compatible(self, other: "LatencySketch"):
+        if (self.relative_accuracy, self.min_ms, self.max_ms) != (other.relative_accuracy, other.min_ms, other.max_ms):
+            raise ValueError("Cannot merge sketches with different parameters")
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        """Add `other`'s counts into this sketch (in place) and return self."""
+        self._check_compatible(other)
+        self.counts += other.counts
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    # ---------- reads ----------
+
+    def _at(self, cumulative: np.ndarray, q: float) -> float:
+        bucket = int(np.searchsorted(cumulative, q * (self.count - 1), side="right"))
+        # Clamp to the exact extremes so p99 never exceeds the observed max
+        return min(max(self._value(bucket), self.min), self.max)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        if q <= 0:
+            return self.min
+        if q >= 1:
+            return self.max
+        return self._at(np.cumsum(self.counts), q)
+
+    def percentiles(self) -> Percentiles:
+        if not self.count:
+            return Percentiles(0, 0.0, 0.0, 0.0, 0.0)
+        cumulative = np.cumsum(self.counts)
+        return Percentiles(
+            self.count, self._at(cumulative, 0.50), self._at(cumulative, 0.95), self._at(cumulative, 0.99), self.max
+        )
+
+    # ---------- cross-process transport ----------
+
+    def to_bytes(self) -> bytes:
+        """Compact encoding: header plus (bucket, count) pairs for non-empty buckets only."""
+        nonzero = np.flatnonzero(self.counts).astype(np.int32)
+        header = _HEADER.pack(self.relative_accuracy, self.min_ms, self.max_ms, self.count,
+                              self.min if self.count else 0.0, self.max)
+        return header + nonzero.tobytes() + self.counts[nonzero].astype(np.int64).tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "LatencySketch":
+        accuracy, min_ms, max_ms, count, observed_min, observed_max = _HEADER.unpack_from(data)
+        sketch = cls(accuracy, min_ms, max_ms)
+        body = memoryview(data)[_HEADER.size:]
+        n = len(body) // 12
+        buckets = np.frombuffer(body[:4 * n], dtype=np.int32)
+        sketch.counts[buckets] = np.frombuffer(body[4 * n:], dtype=np.int64)
+        sketch.count = count
+        sketch.min = observed_min if count else math.inf
+        sketch.max = observed_max
+        return sketch
+
+
+class SketchRegistry:
+    """One LatencySketch per (model, operation), plus helpers to merge registries from other workers."""
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self.sketches: Dict[Tuple[str, str], LatencySketch] = {}
+
+    def sketch(self, model: str, operation: str) -> LatencySketch:
+        key = (model, operation)
+        sketch = self.sketches.get(key)
+        if sketch is None:
+            sketch = self.sketches[key] = LatencySketch(self.relative_accuracy)
+        return sketch
+
+    def record(self, model: str, operation: str, latency_ms: float):
+        self.sketch(model, operation).add(latency_ms)
+
+    def combined(self, model: Optional[str] = None, operation: Optional[str] = None) -> LatencySketch:
+        """Merge every sketch matching the (optional) model/operation filter."""
+        total = LatencySketch(self.relative_accuracy)
+        for (m, op), sketch in self.sketches.items():
+            if (model is None or m == model) and (operation is None or op == operation):
+                total.merge(sketch)
+        return total
+
+    def merge(self, other: "SketchRegistry") -> "SketchRegistry":
+        for (model, operation), sketch in other.sketches.items():
+            self.sketch(model, operation).merge(sketch)
+        return self
+
+    def to_dict(self) -> Dict[str, bytes]:
+        return {f"{m}\x1f{op}": sketch.to_bytes() for (m, op), sketch in self.sketches.items()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, bytes], relative_accuracy: float = 0.01) -> "SketchRegistry":
+        registry = cls(relative_accuracy)
+        for key, blob in data.items():
+            model, operation = key.split("\x1f", 1)
+            registry.sketches[(model, operation)] = LatencySketch.from_bytes(blob)
+        return registry
@@ -0,0 +1,294 @@
+"""
+Metrics Store - Architectural Rationale:
+----------------------------------------
+Keeping every API call as a dataclass in an unbounded list means memory grows
+forever and each dashboard poll rescans the whole history several times.
+
+1. Bounded Memory: Calls are written into fixed-capacity NumPy columns
+   (timestamp, latency, tokens, cost, success, model/operation id) used as a
+   ring buffer; the oldest rows are overwritten.
+2. Interning: Model and operation names are stored once and referenced by id.
+3. Running Aggregates: Counters for the buffered window and for the current
+   day are updated on every write (and on eviction), so snapshots are O(1)
+   in the number of calls.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+
+@dataclass
+class APICallMetrics:
+    """API调用指标"""
+    timestamp: datetime
+    model: str
+    operation: str  # 'completion', 'chat', 'embedding'
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    latency_ms: float
+    success: bool
+    cost_usd: float
+    cache_read_tokens: int = 0   # prompt-cache hits (included in prompt_tokens)
+    reasoning_tokens: int = 0    # reasoning/thinking tokens (included in completion_tokens)
+    usage_estimated: bool = False  # True when the provider reported no usage
+    template: str = ""           # prompt template / call site label
+    prompt_hash: int = 0         # 64-bit fingerprint of the normalized prompt (0 = unknown)
+    provider: str = ""           # provider that served the call ("" = the deployment's default)
+
+
+def prompt_fingerprint(prompt: str) -> int:
+    """Stable non-zero 64-bit hash of a whitespace-normalized prompt (for duplicate detection)."""
+    normalized = " ".join(prompt.split())
+    return int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little") or 1
+
+
+@dataclass
+class Aggregates:
+    """Running sums that can be incremented on write and decremented on eviction."""
+    count: int = 0
+    errors: int = 0
+    latency_sum_ms: float = 0.0
+    cost_usd: float = 0.0
+    prompt_tokens: int = 0
+    cache_read_tokens: int = 0
+    tokens_by_model: Dict[int, int] = field(default_factory=dict)
+
+    def add(self, latency_ms: float, cost_usd: float, total_tokens: int, success: bool, model_id: int,
+            prompt_tokens: int = 0, cache_read_tokens: int = 0, sign: int = 1):
+        self.count += sign
+        self.errors += sign * (not success)
+        self.latency_sum_ms += sign * latency_ms
+        self.cost_usd += sign * cost_usd
+        self.prompt_tokens += sign * prompt_tokens
+        self.cache_read_tokens += sign * cache_read_tokens
+        self.tokens_by_model[model_id] = self.tokens_by_model.get(model_id, 0) + sign * total_tokens
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, np.ndarray]) -> "Aggregates":
+        """Vectorized equivalent of calling add() for every row (used when replaying a log)."""
+        model_ids = columns["model_id"]
+        tokens = np.bincount(model_ids, weights=columns["total_tokens"]) if len(model_ids) else np.zeros(0)
+        return cls(
+            count=len(model_ids),
+            errors=int((~columns["success"].astype(bool)).sum()),
+            latency_sum_ms=float(columns["latency_ms"].sum()),
+            cost_usd=float(columns["cost_usd"].sum()),
+            prompt_tokens=int(columns["prompt_tokens"].sum()),
+            cache_read_tokens=int(columns["cache_read_tokens"].sum()),
+            tokens_by_model={m: int(t) for m, t in enumerate(tokens) if t},
+        )
+
+    @property
+    def error_rate(self) -> float:
+        return self.errors / self.count if self.count else 0.0
+
+    @property
+    def avg_latency_ms(self) -> float:
+        return self.latency_sum_ms / self.count if self.count else 0.0
+
+    @property
+    def cache_hit_ratio(self) -> float:
+        """Share of prompt tokens served from the provider's prompt cache."""
+        return self.cache_read_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+COLUMNS = ("timestamp", "latency_ms", "prompt_tokens", "completion_tokens", "total_tokens",
+           "cache_read_tokens", "reasoning_tokens", "cost_usd", "success", "usage_estimated", "model_id",
+           "operation_id", "template_id", "provider_id", "prompt_hash")
+
+
+class MetricsRingBuffer:
+    """Fixed-capacity columnar store of API call metrics with O(1) snapshots."""
+
+    def __init__(self, capacity: int = 100_000):
+        self.capacity = capacity
+        self.timestamp = np.zeros(capacity, dtype=np.float64)  # epoch seconds
+        self.latency_ms = np.zeros(capacity, dtype=np.float64)
+        self.prompt_tokens = np.zeros(capacity, dtype=np.int64)
+        self.completion_tokens = np.zeros(capacity, dtype=np.int64)
+        self.total_tokens = np.zeros(capacity, dtype=np.int64)
+        self.cache_read_tokens = np.zeros(capacity, dtype=np.int64)
+        self.reasoning_tokens = np.zeros(capacity, dtype=np.int64)
+        self.cost_usd = np.zeros(capacity, dtype=np.float64)
+        self.success = np.zeros(capacity, dtype=np.bool_)
+        self.usage_estimated = np.zeros(capacity, dtype=np.bool_)
+        self.model_id = np.zeros(capacity, dtype=np.int32)
+        self.operation_id = np.zeros(capacity, dtype=np.int32)
+        self.template_id = np.zeros(capacity, dtype=np.int32)
+        self.provider_id = np.zeros(capacity, dtype=np.int32)
+        self.prompt_hash = np.zeros(capacity, dtype=np.uint64)
+
+        self.models: List[str] = []
+        self.operations: List[str] = []
+        self.templates: List[str] = []
+        self.providers: List[str] = []
+        self._model_ids: Dict[str, int] = {}
+        self._operation_ids: Dict[str, int] = {}
+        self._template_ids: Dict[str, int] = {}
+        self._provider_ids: Dict[str, int] = {}
+        self.provider_index("")  # id 0 = the deployment's default provider
+
+        self.size = 0          # rows currently held
+        self.total_count = 0   # rows ever written
+        self._next = 0
+        self.window = Aggregates()
+        self.today = Aggregates()
+        self._today: Optional[date] = None
+
+    # ---------- interning ----------
+
+    def model_index(self, model: str) -> int:
+        idx = self._model_ids.get(model)
+        if idx is None:
+            idx = self._model_ids[model] = len(self.models)
+            self.models.append(model)
+        return idx
+
+    def operation_index(self, operation: str) -> int:
+        idx = self._operation_ids.get(operation)
+        if idx is None:
+            idx = self._operation_ids[operation] = len(self.operations)
+            self.operations.append(operation)
+        return idx
+
+    def template_index(self, template: str) -> int:
+        idx = self._template_ids.get(template)
+        if idx is None:
+            idx = self._template_ids[template] = len(self.templates)
+            self.templates.append(template)
+        return idx
+
+    def provider_index(self, provider: str) -> int:
+        idx = self._provider_ids.get(provider)
+        if idx is None:
+            idx = self._provider_ids[provider] = len(self.providers)
+            self.providers.append(provider)
+        return idx
+
+    # ---------- writes ----------
+
+    def _roll_day(self, day: date):
+        if self._today != day:
+            self._today = day
+            self.today = Aggregates()
+
+    def append(self, metrics: APICallMetrics) -> int:
+        """Write one call; returns its slot. Evicts (and un-aggregates) the oldest row when full."""
+        slot = self._next
+        if self.size == self.capacity:
+            self.window.add(
+                float(self.latency_ms[slot]), float(self.cost_usd[slot]), int(self.total_tokens[slot]),
+                bool(self.success[slot]), int(self.model_id[slot]),
+                int(self.prompt_tokens[slot]), int(self.cache_read_tokens[slot]), sign=-1,
+            )
+        else:
+            self.size += 1
+
+        model_id = self.model_index(metrics.model)
+        self.timestamp[slot] = metrics.timestamp.timestamp()
+        self.latency_ms[slot] = metrics.latency_ms
+        self.prompt_tokens[slot] = metrics.prompt_tokens
+        self.completion_tokens[slot] = metrics.completion_tokens
+        self.total_tokens[slot] = metrics.total_tokens
+        self.cache_read_tokens[slot] = metrics.cache_read_tokens
+        self.reasoning_tokens[slot] = metrics.reasoning_tokens
+        self.cost_usd[slot] = metrics.cost_usd
+        self.success[slot] = metrics.success
+        self.usage_estimated[slot] = metrics.usage_estimated
+        self.model_id[slot] = model_id
+        self.operation_id[slot] = self.operation_index(metrics.operation)
+        self.template_id[slot] = self.template_index(metrics.template)
+        self.provider_id[slot] = self.provider_index(metrics.provider)
+        self.prompt_hash[slot] = metrics.prompt_hash
+
+        row = (metrics.latency_ms, metrics.cost_usd, metrics.total_tokens, metrics.success, model_id,
+               metrics.prompt_tokens, metrics.cache_read_tokens)
+        self.window.add(*row)
+        day = metrics.timestamp.date()
+        if self._today is None or day >= self._today:
+            self._roll_day(day)
+            self.today.add(*row)
+
+        self._next = (slot + 1) % self.capacity
+        self.total_count += 1
+        return slot
+
+    def load_columns(self, columns: Dict[str, np.ndarray], models: List[str], operations: List[str],
+                     templates: List[str], providers: Sequence[str] = ("",), now: Optional[datetime] = None):
+        """
+        Bulk-load chronologically ordered rows (e.g. replayed from disk), replacing the
+        current contents. `*_id` columns index into the given name lists. Only the newest
+        `capacity` rows are kept, but today's aggregates cover every row.
+        """
+        remap = {
+            "model_id": np.array([self.model_index(m) for m in models], dtype=np.int32),
+            "operation_id": np.array([self.operation_index(o) for o in operations], dtype=np.int32),
+            "template_id": np.array([self.template_index(t) for t in templates], dtype=np.int32),
+            "provider_id": np.array([self.provider_index(p) for p in providers], dtype=np.int32),
+        }
+        n = len(columns["timestamp"])
+        columns = {"provider_id": np.zeros(n, dtype=np.int32), **columns}
+        columns = {name: (remap[name][col] if name in remap else col) for name, col in columns.items()}
+        keep = min(n, self.capacity)
+        for name in COLUMNS:
+            getattr(self, name)[:keep] = columns[name][n - keep:]
+        self.size = keep
+        self._next = keep % self.capacity
+        self.total_count = n
+
+        self.window = Aggregates.from_columns({name: col[n - keep:] for name, col in columns.items()})
+        day = (now or datetime.now()).date()
+        midnight = datetime.combine(day, datetime.min.time()).timestamp()
+        first_today = int(np.searchsorted(columns["timestamp"], midnight, side="left"))
+        self._today = day
+        self.today = Aggregates.from_columns({name: col[first_today:] for name, col in columns.items()})
+
+    # ---------- reads ----------
+
+    def today_totals(self, now: Optional[datetime] = None) -> Aggregates:
+        """Aggregates for the current calendar day (all calls, including evicted ones)."""
+        self._roll_day((now or datetime.now()).date())
+        return self.today
+
+    def token_usage(self, aggregates: Aggregates) -> Dict[str, int]:
+        return {self.models[m]: tokens for m, tokens in aggregates.tokens_by_model.items() if tokens}
+
+    def _order(self) -> np.ndarray:
+        """Slot indexes from oldest to newest."""
+        if self.size < self.capacity:
+            return np.arange(self.size)
+        return (np.arange(self.size) + self._next) % self.capacity
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """Chronologically ordered copies of every column (for offline analysis)."""
+        order = self._order()
+        return {name: getattr(self, name)[order] for name in COLUMNS}
+
+    def recent(self, n: Optional[int] = None) -> Iterator[APICallMetrics]:
+        """Materialize the newest `n` buffered calls (oldest first) as dataclasses."""
+        order = self._order()
+        if n is not None:
+            order = order[-n:]
+        for i in order:
+            yield APICallMetrics(
+                timestamp=datetime.fromtimestamp(float(self.timestamp[i])),
+                model=self.models[self.model_id[i]],
+                operation=self.operations[self.operation_id[i]],
+                prompt_tokens=int(self.prompt_tokens[i]),
+                completion_tokens=int(self.completion_tokens[i]),
+                total_tokens=int(self.total_tokens[i]),
+                latency_ms=float(self.latency_ms[i]),
+                success=bool(self.success[i]),
+                cost_usd=float(self.cost_usd[i]),
+                cache_read_tokens=int(self.cache_read_tokens[i]),
+                reasoning_tokens=int(self.reasoning_tokens[i]),
+                usage_estimated=bool(self.usage_estimated[i]),
+                template=self.templates[self.template_id[i]],
+                prompt_hash=int(self.prompt_hash[i]),
+                provider=self.providers[self.provider_id[i]],
+            )
@@ -10,14 +10,18 @@ This module implements the 'Factory Pattern' to decouple Agent logic from LLM pr
 3. Environment Adaptability: Seamlessly switch between local testing (DeepSeek) 
    and production (OpenAI) via environment variables.
 4. Fail-Fast Validation: Ensures all required API keys are present at startup.
+5. Process-Wide Registry: Identical configurations resolve to one shared model
+   instance, so defining N agents does not build N providers/credentials.
 """
 
 import os
+import threading
 import httpx
 from enum import Enum
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Dict, NamedTuple, Optional
 from dotenv import load_dotenv
+from pydantic_ai.models import Model
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.providers.deepseek import DeepSeekProvider
@@ -25,6 +29,7 @@ from pydantic_ai.providers.ollama import OllamaProvider
 from pydantic_ai.providers.azure import AzureProvider
 from pydantic_ai.models.google import GoogleModel
 from pydantic_ai.providers.google import GoogleProvider
+from common.http_pool import HTTPClientPool
 
 class LLMProvider(str, Enum):
     DEEPSEEK = "deepseek"
@@ -35,73 +40,161 @@ class LLMProvider(str, Enum):
     ZHIPU = "zhipu"
     CUSTOM = "custom"
 
-# Global singleton client for connection pooling
-_shared_http_client: Optional[httpx.AsyncClient] = None
+# Process-wide connection pools: one shared client per provider endpoint
+http_pool = HTTPClientPool()
 
-def _get_http_client() -> Optional[httpx.AsyncClient]:
+def _get_http_client(base_url: Optional[str]) -> httpx.AsyncClient:
     """
-    Helper to create/retrieve a singleton AsyncClient with proxy settings.
-    Implements connection pooling for high performance.
+    Helper to retrieve the pooled AsyncClient for an endpoint (with proxy settings if any).
+    Implements connection pooling for high performance, with or without LLM_PROXY_URL.
     """
-    global _shared_http_client
-    proxy_url = os.getenv('LLM_PROXY_URL')
-    
-    if not proxy_url:
-        return None
-        
-    if _shared_http_client is None:
-        # Optimization: Use singleton pattern to reuse connection pool
-        _shared_http_client = httpx.AsyncClient(
-            proxy=proxy_url,
-            # Production-grade settings:
-            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
-            timeout=httpx.Timeout(60.0)
-        )
-    return _shared_http_client
+    return http_pool.get_client(base_url, os.getenv('LLM_PROXY_URL'))
 
-# Factory pattern: Unified interface for multiple LLM providers.
-# This ensures that switching between providers is a one-line change.
-def get_model(provider_override: Optional[str] = None):
+class ModelKey(NamedTuple):
+    """Identity of a model configuration inside the registry."""
+    provider: LLMProvider
+    model_name: str
+    base_url: Optional[str]
+    proxy: Optional[str]
+
+
+class ModelRegistry:
     """
-    Returns a model instance based on environment variables.
-    Implements validation and type safety.
+    Process-wide memoization of model instances.
+    Every Agent calls get_model() at import time; the registry makes repeated
+    calls with the same configuration return the already-built model instead
+    of constructing a new provider (and credential chain) each time.
     """
-    # Load .env from root
+
+    def __init__(self):
+        self._models: Dict[ModelKey, Model] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_create(self, key: ModelKey, factory: Callable[[], Model]) -> Model:
+        """Return the cached model for `key`, building it with `factory` on first use."""
+        model = self._models.get(key)
+        if model is not None:
+            self.hits += 1
+            return model
+        with self._lock:
+            # Double-checked: another thread may have built it while we waited
+            model = self._models.get(key)
+            if model is not None:
+                self.hits += 1
+                return model
+            model = factory()
+            self._models[key] = model
+            self.misses += 1
+            return model
+
+    def invalidate(self, provider: Optional[LLMProvider] = None) -> int:
+        """Drop cached models (all, or only those of one provider). Returns the number removed."""
+        with self._lock:
+            if provider is None:
+                removed = len(self._models)
+                self._models.clear()
+                return removed
+            stale = [k for k in self._models if k.provider == provider]
+            for k in stale:
+                del self._models[k]
+            return len(stale)
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._models), "hits": self.hits, "misses": self.misses}
+
+
+model_registry = ModelRegistry()
+_env_loaded = False
+
+
+def _load_env(force: bool = False):
+    """Load .env from root once per process (or again when forced, overriding values already in os.environ)."""
+    global _env_loaded
+    if _env_loaded and not force:
+        return
     root_env = Path(__file__).resolve().parents[3] / ".env"
-    load_dotenv(dotenv_path=root_env)
-    
-    # Resolve provider
+    load_dotenv(dotenv_path=root_env, override=force)
+    _env_loaded = True
+
+
+def _resolve_provider(provider_override: Optional[str]) -> LLMProvider:
     provider_str = provider_override or os.getenv('LLM_PROVIDER', LLMProvider.DEEPSEEK)
     try:
-        provider = LLMProvider(provider_str.lower())
+        return LLMProvider(provider_str.lower())
     except ValueError:
         raise ValueError(f"Unsupported provider: {provider_str}. Valid options: {[e.value for e in LLMProvider]}")
 
+
+def _resolve_key(provider: LLMProvider) -> ModelKey:
+    """Read the model name / endpoint that identify a configuration, without building anything."""
+    proxy = os.getenv('LLM_PROXY_URL')
+
+    if provider == LLMProvider.DEEPSEEK:
+        return ModelKey(provider, 'deepseek-chat', 'https://api.deepseek.com', proxy)
+    elif provider == LLMProvider.OPENAI:
+        return ModelKey(provider, os.getenv('OPENAI_MODEL_NAME', 'gpt-4o'), 'https://api.openai.com/v1', proxy)
+    elif provider == LLMProvider.OLLAMA:
+        return ModelKey(
+            provider,
+            os.getenv('OLLAMA_MODEL_NAME', 'llama3'),
+            os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434/v1'),
+            proxy,
+        )
+    elif provider == LLMProvider.AZURE_AD:
+        return ModelKey(
+            provider,
+            os.getenv('AZURE_OPENAI_MODEL_NAME', 'gpt-4o'),
+            os.getenv('AZURE_OPENAI_ENDPOINT'),
+            proxy,
+        )
+    elif provider == LLMProvider.GEMINI_VERTEX:
+        location = os.getenv('GOOGLE_LOCATION', 'us-central1')
+        project = os.getenv('GOOGLE_PROJECT_ID')
+        return ModelKey(
+            provider,
+            os.getenv('GOOGLE_MODEL_NAME', 'gemini-1.5-pro'),
+            f"vertex://{project}/{location}" if project else None,
+            proxy,
+        )
+    elif provider == LLMProvider.ZHIPU:
+        return ModelKey(
+            provider,
+            os.getenv('ZHIPU_MODEL_NAME', 'glm-4v'),
+            os.getenv('ZHIPU_BASE_URL', 'https://open.bigmodel.cn/api/paas/v4/'),
+            proxy,
+        )
+    # CUSTOM
+    return ModelKey(provider, os.getenv('LLM_MODEL_NAME') or '', os.getenv('LLM_BASE_URL'), proxy)
+
+
+def _build_model(key: ModelKey) -> Model:
+    """Construct a brand-new model + provider for `key` (registry miss path)."""
+    provider = key.provider
+
     if provider == LLMProvider.DEEPSEEK:
         api_key = os.getenv('DEEPSEEK_API_KEY')
         if not api_key:
             raise ValueError("DEEPSEEK_API_KEY is not set in environment.")
         return OpenAIChatModel(
-            'deepseek-chat',
-            provider=DeepSeekProvider(api_key=api_key, http_client=_get_http_client()),
+            key.model_name,
+            provider=DeepSeekProvider(api_key=api_key, http_client=_get_http_client(key.base_url)),
         )
         
     elif provider == LLMProvider.OPENAI:
         api_key = os.getenv('OPENAI_API_KEY')
         if not api_key:
             raise ValueError("OPENAI_API_KEY is not set in environment.")
-        model_name = os.getenv('OPENAI_MODEL_NAME', 'gpt-4o')
         return OpenAIChatModel(
-            model_name, 
-            provider=OpenAIProvider(api_key=api_key, http_client=_get_http_client())
+            key.model_name, 
+            provider=OpenAIProvider(api_key=api_key, http_client=_get_http_client(key.base_url))
         )
         
     elif provider == LLMProvider.OLLAMA:
-        base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434/v1')
-        model_name = os.getenv('OLLAMA_MODEL_NAME', 'llama3')
         return OpenAIChatModel(
-            model_name,
-            provider=OllamaProvider(base_url=base_url, http_client=_get_http_client()),
+            key.model_name,
+            provider=OllamaProvider(base_url=key.base_url, http_client=_get_http_client(key.base_url)),
         )
 
     elif provider == LLMProvider.AZURE_AD:
@@ -109,9 +202,8 @@ def get_model(provider_override: Optional[str] = None):
         from azure.identity import DefaultAzureCredential, get_bearer_token_provider
         from openai import AsyncAzureOpenAI
         
-        endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
+        endpoint = key.base_url
         api_version = os.getenv('AZURE_OPENAI_API_VERSION', '2024-08-01-preview')
-        model_name = os.getenv('AZURE_OPENAI_MODEL_NAME', 'gpt-4o')
         
         if not endpoint:
             raise ValueError("AZURE_OPENAI_ENDPOINT is required for AZURE_AD provider.")
@@ -125,58 +217,95 @@ def get_model(provider_override: Optional[str] = None):
             azure_endpoint=endpoint,
             azure_ad_token_provider=token_provider,
             api_version=api_version,
-            http_client=_get_http_client()
+            http_client=_get_http_client(key.base_url)
         )
         
         return OpenAIChatModel(
-            model_name,
+            key.model_name,
             provider=AzureProvider(openai_client=az_client)
         )
         
     elif provider == LLMProvider.GEMINI_VERTEX:
         project = os.getenv('GOOGLE_PROJECT_ID')
         location = os.getenv('GOOGLE_LOCATION', 'us-central1')
-        model_name = os.getenv('GOOGLE_MODEL_NAME', 'gemini-1.5-pro')
         
         if not project:
             raise ValueError("GOOGLE_PROJECT_ID is required for GEMINI_VERTEX provider.")
             
         return GoogleModel(
-            model_name,
+            key.model_name,
             provider=GoogleProvider(
                 vertexai=True,
                 project=project,
                 location=location,
-                http_client=_get_http_client()
+                http_client=_get_http_client(f"https://{location}-aiplatform.googleapis.com")
             )
         )
         
     elif provider == LLMProvider.ZHIPU:
         api_key = os.getenv('ZHIPU_API_KEY')
-        base_url = os.getenv('ZHIPU_BASE_URL', 'https://open.bigmodel.cn/api/paas/v4/')
-        model_name = os.getenv('ZHIPU_MODEL_NAME', 'glm-4v')
         return OpenAIChatModel(
-            model_name,
+            key.model_name,
             provider=OpenAIProvider(
-                base_url=base_url,
+                base_url=key.base_url,
                 api_key=api_key,
-                http_client=_get_http_client()
+                http_client=_get_http_client(key.base_url)
             )
         )
 
-    if provider == LLMProvider.CUSTOM:
-        base_url = os.getenv('LLM_BASE_URL')
-        api_key = os.getenv('LLM_API_KEY')
-        model_name = os.getenv('LLM_MODEL_NAME')
+    # CUSTOM
+    api_key = os.getenv('LLM_API_KEY')
+    if not all([key.base_url, api_key, key.model_name]):
+        raise ValueError("For CUSTOM provider, LLM_BASE_URL, LLM_API_KEY, and LLM_MODEL_NAME must all be set.")
         
-        if not all([base_url, api_key, model_name]):
-            raise ValueError("For CUSTOM provider, LLM_BASE_URL, LLM_API_KEY, and LLM_MODEL_NAME must all be set.")
-            
-        return OpenAIChatModel(
-            model_name, 
-            provider=OpenAIProvider(
-                base_url=base_url, 
-                api_key=api_key, 
-                http_client=_get_http_client()
-            )
+    return OpenAIChatModel(
+        key.model_name, 
+        provider=OpenAIProvider(
+            base_url=key.base_url, 
+            api_key=api_key, 
+            http_client=_get_http_client(key.base_url)
         )
+    )
+
+
+# Factory pattern: Unified interface for multiple LLM providers.
+# This ensures that switching between providers is a one-line change.
+def get_model(provider_override: Optional[str] = None, use_cache: bool = True) -> Model:
+    """
+    Returns a model instance based on environment variables.
+    Implements validation and type safety.
+    Instances are memoized in `model_registry`; pass use_cache=False to force
+    a private, freshly-built model.
+    """
+    _load_env()
+    provider = _resolve_provider(provider_override)
+    key = _resolve_key(provider)
+
+    if not use_cache:
+        return _build_model(key)
+    return model_registry.get_or_create(key, lambda: _build_model(key))
+
+
+def current_model_key(provider_override: Optional[str] = None) -> ModelKey:
+    """Provider / model name that get_model() would build, e.g. for pricing and metrics labels."""
+    _load_env()
+    return _resolve_key(_resolve_provider(provider_override))
+
+
+def reload_models(provider: Optional[str] = None) -> int:
+    """
+    Re-read .env and drop cached models so the next get_model() rebuilds them.
+    Use after rotating API keys or switching endpoints at runtime.
+    """
+    _load_env(force=True)
+    return model_registry.invalidate(LLMProvider(provider.lower()) if provider else None)
+
+
+async def aclose_all():
+    """
+    Shutdown hook: close every pooled HTTP client.
+    Cached models keep referencing their clients, so the registry is cleared
+    too and the next get_model() rebuilds on fresh pools.
+    """
+    await http_pool.aclose()
+    model_registry.invalidate()
@@ -0,0 +1,169 @@
+"""
+Pricing Engine - Architectural Rationale:
+-----------------------------------------
+A hard-coded `{model: {input, output}}` dict prices three models, silently
+returns $0 for everything else (including every model `get_model()` builds),
+and cannot express prompt-cache discounts or reasoning tokens.
+
+1. Versioned Price File: Rates live in `pricing.json` (or `PRICING_FILE`),
+   stamped with a version so every computed cost can say which prices it used.
+2. Provider + Wildcards: Entries are keyed by `LLMProvider` value and a model
+   glob (`gpt-4o*`); the most specific match wins (exact provider over `*`,
+   exact model over the longest pattern). Lookups are memoized.
+3. Token Classes: Input, cached input, output and reasoning tokens each have
+   their own rate; cached and reasoning rates fall back to input/output.
+4. Vectorized Repricing: `reprice()` turns a day of ring-buffer columns into
+   costs with NumPy array arithmetic, e.g. after a price change.
+"""
+
+import fnmatch
+import json
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+DEFAULT_PRICE_FILE = Path(__file__).with_name("pricing.json")
+_PER_TOKEN = {"per_1m_tokens": 1e-6, "per_1k_tokens": 1e-3, "per_token": 1.0}
+
+
+@dataclass(frozen=True)
+class PriceEntry:
+    """Rates in USD per token for one provider/model pattern."""
+    provider: str
+    model: str
+    input: float
+    output: float
+    cached_input: Optional[float] = None
+    reasoning: Optional[float] = None
+
+    @property
+    def cached_rate(self) -> float:
+        return self.input if self.cached_input is None else self.cached_input
+
+    @property
+    def reasoning_rate(self) -> float:
+        return self.output if self.reasoning is None else self.reasoning
+
+    def specificity(self) -> Tuple[int, int, int]:
+        wildcard = any(c in self.model for c in "*?[")
+        return (self.provider != "*", not wildcard, len(self.model))
+
+
+def _provider_value(provider: Optional[str]) -> str:
+    # Accepts plain strings or LLMProvider members (a str Enum)
+    if provider is None:
+        return "*"
+    return getattr(provider, "value", provider).lower()
+
+
+class PricingTable:
+    """Resolves (provider, model) to a PriceEntry and computes per-call or bulk costs."""
+
+    def __init__(self, entries: Sequence[PriceEntry], version: str = "unversioned", currency: str = "USD"):
+        self.entries = list(entries)
+        self.version = version
+        self.currency = currency
+        self._cache: Dict[Tuple[str, str], Optional[PriceEntry]] = {}
+
+    @classmethod
+    def load(cls, path: Optional[Union[str, Path]] = None) -> "PricingTable":
+        path = Path(path or os.getenv("PRICING_FILE") or DEFAULT_PRICE_FILE)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        scale = _PER_TOKEN[data.get("unit", "per_1m_tokens")]
+
+        def rate(value: Optional[float]) -> Optional[float]:
+            return None if value is None else value * scale
+
+        entries = [
+            PriceEntry(
+                provider=p.get("provider", "*").lower(),
+                model=p["model"],
+                input=rate(p["input"]),
+                output=rate(p["output"]),
+                cached_input=rate(p.get("cached_input")),
+                reasoning=rate(p.get("reasoning")),
+            )
+            for p in data["prices"]
+        ]
+        return cls(entries, version=data.get("version", "unversioned"), currency=data.get("currency", "USD"))
+
+    def lookup(self, model: str, provider: Optional[str] = None) -> Optional[PriceEntry]:
+        """Most specific entry matching the provider (or `*`) and model, or None if unpriced."""
+        key = (_provider_value(provider), model)
+        if key not in self._cache:
+            prov, name = key
+            candidates = [
+                e for e in self.entries
+                if (e.provider == "*" or e.provider == prov) and fnmatch.fnmatchcase(name, e.model)
+            ]
+            self._cache[key] = max(candidates, key=PriceEntry.specificity) if candidates else None
+        return self._cache[key]
+
+    def cost(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        cache_read_tokens: int = 0,
+        reasoning_tokens: int = 0,
+        provider: Optional[str] = None,
+    ) -> float:
+        """
+        Cost of one call. `prompt_tokens` includes cache reads and `completion_tokens`
+        includes reasoning tokens (as providers report them).
+        """
+        entry = self.lookup(model, provider)
+        if entry is None:
+            return 0.0
+        return (
+            (prompt_tokens - cache_read_tokens) * entry.input
+            + cache_read_tokens * entry.cached_rate
+            + (completion_tokens - reasoning_tokens) * entry.output
+            + reasoning_tokens * entry.reasoning_rate
+        )
+
+    def rate_matrix(self, models: Sequence[str], provider: Optional[str] = None) -> np.ndarray:
+        """Rows of [input, cached_input, output, reasoning] per model (zeros when unpriced)."""
+        rates = np.zeros((len(models), 4), dtype=np.float64)
+        for i, model in enumerate(models):
+            entry = self.lookup(model, provider)
+            if entry is not None:
+                rates[i] = (entry.input, entry.cached_rate, entry.output, entry.reasoning_rate)
+        return rates
+
+    def reprice(
+        self,
+        columns: Dict[str, np.ndarray],
+        models: Sequence[str],
+        provider: Optional[str] = None,
+        providers: Optional[Sequence[str]] = None,
+    ) -> np.ndarray:
+        """
+        Vectorized cost for many calls, e.g. `MetricsRingBuffer.columns()` with
+        `models=store.models`; `model_id` indexes into `models`. With `providers`
+        (e.g. `store.providers`), each call is priced at the rates of the provider in
+        its `provider_id` column; an empty provider name falls back to `provider`.
+        """
+        if providers is None or "provider_id" not in columns:
+            rates = self.rate_matrix(models, provider)[columns["model_id"]]
+        else:
+            # One rate lookup per distinct (provider, model) pair, then broadcast back to the calls
+            pairs = columns["provider_id"].astype(np.int64) * len(models) + columns["model_id"]
+            unique, inverse = np.unique(pairs, return_inverse=True)
+            pair_rates = np.zeros((len(unique), 4), dtype=np.float64)
+            for i, pair in enumerate(unique):
+                provider_id, model_id = divmod(int(pair), len(models))
+                pair_rates[i] = self.rate_matrix([models[model_id]], providers[provider_id] or provider)[0]
+            rates = pair_rates[inverse]
+        prompt = columns["prompt_tokens"].astype(np.float64)
+        completion = columns["completion_tokens"].astype(np.float64)
+        cached = columns.get("cache_read_tokens", np.zeros_like(prompt)).astype(np.float64)
+        reasoning = columns.get("reasoning_tokens", np.zeros_like(prompt)).astype(np.float64)
+        return ((prompt - cached) * rates[:, 0] + cached * rates[:, 1]
+                + (completion - reasoning) * rates[:, 2] + reasoning * rates[:, 3])
+
+    def unpriced(self, models: Sequence[str], provider: Optional[str] = None) -> List[str]:
+        return [m for m in models if self.lookup(m, provider) is None]
@@ -0,0 +1,164 @@
+"""
+Prompt Prefix Stability - Architectural Rationale:
+--------------------------------------------------
+Provider prompt caches (OpenAI, DeepSeek, Anthropic, ...) only reuse the
+longest byte-identical prefix of a request. A system prompt that starts with
+the user's name or the current time makes every request unique from the
+first token on, so long static instructions are re-billed at full price.
+
+1. Tiered Assembly: Prompt sections are declared as static (identical for
+   every request), semi-static (a handful of variants, e.g. per role or per
+   day) or volatile (per request: user name, timestamps, request ids).
+   The system prompt is static sections followed by semi-static ones, in
+   declaration order, so the shared prefix is as long as possible.
+2. Volatile Context Last: Volatile sections are appended to the current user
+   prompt instead of the system prompt, so they never end up in the
+   (re-sent) history prefix of later turns.
+3. Measured, Not Assumed: `PromptCacheTracker` accumulates provider-reported
+   cache-read vs uncached prompt tokens per agent and counts distinct
+   system-prompt prefixes, so cache hit rates (and prefix fragmentation)
+   are visible.
+"""
+
+import hashlib
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Callable, Dict, Generic, List, Set, TypeVar, Union
+
+from pydantic_ai import Agent, RunContext
+
+from common.token_usage import TokenCounts, token_counts_from_result
+
+DepsT = TypeVar("DepsT")
+
+Section = Union[str, Callable[[Any], str]]
+
+
+class PromptTier(IntEnum):
+    STATIC = 0
+    SEMI_STATIC = 1
+    VOLATILE = 2
+
+
+@dataclass
+class _Section:
+    tier: PromptTier
+    name: str
+    content: Section
+
+    def render(self, deps: Any) -> str:
+        return self.content if isinstance(self.content, str) else self.content(deps)
+
+
+class PromptAssembler(Generic[DepsT]):
+    """Collects prompt sections by stability tier and renders them in cache-friendly order."""
+
+    def __init__(self, separator: str = "\n\n", volatile_header: str = "[本次请求上下文]"):
+        self.separator = separator
+        self.volatile_header = volatile_header
+        self._sections: List[_Section] = []
+
+    # ---------- declaration ----------
+
+    def add(self, tier: PromptTier, content: Section, name: str = "") -> Section:
+        self._sections.append(_Section(tier, name or getattr(content, "__name__", f"section{len(self._sections)}"), content))
+        return content
+
+    def static(self, content: Section) -> Section:
+        """Text (or a deps-independent function) identical for every request. Usable as a decorator."""
+        return self.add(PromptTier.STATIC, content)
+
+    def semi_static(self, content: Section) -> Section:
+        """Function of deps with few distinct outputs (role, tenant, locale, date). Usable as a decorator."""
+        return self.add(PromptTier.SEMI_STATIC, content)
+
+    def volatile(self, content: Section) -> Section:
+        """Per-request values; rendered after the user prompt. Usable as a decorator."""
+        return self.add(PromptTier.VOLATILE, content)
+
+    # ---------- rendering ----------
+
+    def _render(self, deps: Any, tiers: Set[PromptTier]) -> List[str]:
+        # Stable sort: tier first, declaration order within a tier
+        sections = sorted((s for s in self._sections if s.tier in tiers), key=lambda s: s.tier)
+        return [text for text in (s.render(deps) for s in sections) if text]
+
+    def system_prompt(self, deps: Any) -> str:
+        """Static sections, then semi-static ones (the cacheable prefix)."""
+        return self.separator.join(self._render(deps, {PromptTier.STATIC, PromptTier.SEMI_STATIC}))
+
+    def user_prompt(self, prompt: str, deps: Any) -> str:
+        """The user prompt followed by the volatile sections (the only part that differs per request)."""
+        volatile = self._render(deps, {PromptTier.VOLATILE})
+        if not volatile:
+            return prompt
+        return prompt + self.separator + self.volatile_header + "\n" + "\n".join(volatile)
+
+    def install(self, agent: Agent) -> Agent:
+        """Register the assembled system prompt on `agent` (not dynamic: history keeps the original prefix)."""
+
+        @agent.system_prompt
+        def assembled_system_prompt(ctx: RunContext[Any]) -> str:
+            return self.system_prompt(ctx.deps)
+
+        return agent
+
+
+def prefix_fingerprint(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+@dataclass
+class CacheUsage:
+    runs: int = 0
+    prompt_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    estimated_runs: int = 0
+    prefixes: Set[str] = field(default_factory=set)
+
+    @property
+    def uncached_tokens(self) -> int:
+        return self.prompt_tokens - self.cache_read_tokens
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.cache_read_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+class PromptCacheTracker:
+    """Per-agent cached vs uncached prompt tokens, from provider-reported usage."""
+
+    def __init__(self):
+        self.agents: Dict[str, CacheUsage] = {}
+
+    def record(self, agent_name: str, result: Any) -> TokenCounts:
+        counts = token_counts_from_result(result)
+        usage = self.agents.setdefault(agent_name, CacheUsage())
+        usage.runs += 1
+        usage.prompt_tokens += counts.prompt_tokens
+        usage.cache_read_tokens += counts.cache_read_tokens
+        usage.cache_write_tokens += counts.cache_write_tokens
+        usage.estimated_runs += counts.estimated
+        # Distinct system-prompt prefixes: many of them means the "static" part is not static
+        system = "".join(
+            part.content for message in result.all_messages()[:1] for part in message.parts
+            if getattr(part, "part_kind", "") == "system-prompt"
+        )
+        if system:
+            usage.prefixes.add(prefix_fingerprint(system))
+        return counts
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            name: {
+                "runs": u.runs,
+                "prompt_tokens": u.prompt_tokens,
+                "cached_tokens": u.cache_read_tokens,
+                "uncached_tokens": u.uncached_tokens,
+                "cache_hit_ratio": round(u.hit_ratio, 4),
+                "distinct_prefixes": len(u.prefixes),
+                "estimated_runs": u.estimated_runs,
+            }
+            for name, u in self.agents.items()
+        }
@@ -0,0 +1,240 @@
+"""
+Exact-Match Response Cache - Architectural Rationale:
+-----------------------------------------------------
+FAQ-style triage and guardrail audits send byte-identical requests over and
+over, and each repeat costs a full model call.
+
+1. Canonical Key at the Model Boundary: `CachingModel` wraps a model, so
+   `Agent.run`/`run_sync` and everything on top of them (output validation,
+   retries, tool execution) work unchanged. The key is a hash of what is
+   actually sent:
+   - model id,
+   - rendered system prompt, instructions and message history,
+   - tool definitions and output schema (`ModelRequestParameters`),
+   - model settings.
+   Timestamps, run ids and provider-generated ids are stripped from the
+   messages, so identical conversations hash identically.
+2. Two Tiers: An in-memory LRU with TTL serves hot keys. An optional SQLite
+   tier survives restarts and is shared between processes. Disk hits are
+   promoted into memory.
+3. Single-Flight: Concurrent identical requests share one in-flight provider
+   call instead of all missing the cache at once.
+4. Honest Accounting: Cached responses carry zero usage (nothing was billed)
+   and are marked in `provider_details`. The tokens and bytes they saved are
+   counted in `stats()`.
+
+Only model responses are cached: if a cached response asks for a tool call,
+the tool still runs. Do not cache models whose responses must differ per
+call (high-temperature creative generation).
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Dict, Optional, Tuple
+
+from pydantic_core import to_jsonable_python
+from pydantic_ai.messages import ModelMessagesTypeAdapter, ModelResponse
+from pydantic_ai.models import Model, ModelRequestParameters
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.usage import RequestUsage
+
+# Fields that differ between otherwise identical requests. They are stripped only from the top level
+# of each message, each part and the request parameters: never from tool args, tool-return content
+# or JSON schemas, where the same names are ordinary user data.
+_VOLATILE_KEYS = frozenset({
+    "timestamp", "run_id", "conversation_id", "provider_response_id", "provider_details",
+    "provider_url", "usage", "tool_call_id", "metadata", "workspace_ref",
+})
+
+
+# `provider_details` entry that marks a response served from the cache (see `is_cache_hit`)
+CACHE_HIT_KEY = "response_cache"
+
+
+def is_cache_hit(response: ModelResponse) -> bool:
+    """True if `response` was served by `CachingModel` rather than billed by the provider."""
+    return (response.provider_details or {}).get(CACHE_HIT_KEY) == "hit"
+
+
+def _strip_volatile(fields: dict) -> dict:
+    return {k: v for k, v in fields.items() if k not in _VOLATILE_KEYS and v is not None}
+
+
+def _canonical_messages(messages: list) -> list:
+    return [
+        {**_strip_volatile(message), "parts": [_strip_volatile(part) for part in message.get("parts", [])]}
+        for message in ModelMessagesTypeAdapter.dump_python(messages, mode="json")
+    ]
+
+
+def model_id(model: Model) -> str:
+    return f"{model.system}:{model.model_name}"
+
+
+def request_key(model: Model, messages: list, model_settings: Any, parameters: ModelRequestParameters) -> str:
+    """Stable hash of a model request (see module docstring for what is included)."""
+    canonical = {
+        "model": model_id(model),
+        "messages": _canonical_messages(messages),
+        "settings": to_jsonable_python(model_settings or {}, fallback=repr),
+        "parameters": _strip_volatile(to_jsonable_python(parameters, fallback=repr)),
+    }
+    blob = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class ResponseCache:
+    """Key -> bytes store: LRU with TTL in memory, optional SQLite tier on disk."""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        if sqlite_path:
+            self._conn = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_cache ("
+                " key TEXT PRIMARY KEY, expires_at REAL NOT NULL, payload BLOB NOT NULL"
+                ") WITHOUT ROWID"
+            )
+        self.counters: Dict[str, int] = {
+            "memory_hits": 0, "disk_hits": 0, "misses": 0, "coalesced": 0, "stores": 0,
+            "evictions": 0, "expired": 0, "bytes_saved": 0, "tokens_saved": 0,
+        }
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return payload
+                del self._memory[key]
+                self.counters["expired"] += 1
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT expires_at, payload FROM response_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[0] > now:
+                    self._remember(key, row[0], row[1])
+                    self.counters["disk_hits"] += 1
+                    return row[1]
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, key: str, payload: bytes, ttl_seconds: Optional[float] = None):
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._remember(key, expires_at, payload)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO response_cache (key, expires_at, payload) VALUES (?, ?, ?)",
+                    (key, expires_at, payload),
+                )
+            self.counters["stores"] += 1
+
+    def _remember(self, key: str, expires_at: float, payload: bytes):
+        self._memory[key] = (expires_at, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def purge_expired(self) -> int:
+        """Drop expired rows from the disk tier (memory entries expire lazily)."""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            return self._conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["coalesced"]
+        lookups = hits + self.counters["misses"]
+        return {**self.counters, "entries": len(self._memory), "hit_ratio": round(hits / lookups, 4) if lookups else 0.0}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+def _encode_response(response: ModelResponse) -> bytes:
+    return zlib.compress(ModelMessagesTypeAdapter.dump_json([response]))
+
+
+def _decode_response(payload: bytes) -> ModelResponse:
+    return ModelMessagesTypeAdapter.validate_json(zlib.decompress(payload))[0]
+
+
+class CachingModel(WrapperModel):
+    """
+    Model wrapper that serves repeated requests from a `ResponseCache`. Opt in per agent:
+    `Agent(CachingModel(get_model(), cache), ...)`, or per run: `agent.run(..., model=CachingModel(...))`.
+    Streaming requests pass through uncached.
+    """
+
+    def __init__(self, wrapped: Model, cache: ResponseCache, ttl_seconds: Optional[float] = None):
+        super().__init__(wrapped)
+        self.cache = cache
+        self.ttl_seconds = ttl_seconds
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _hit(self, payload: bytes) -> ModelResponse:
+        response = _decode_response(payload)
+        counters = self.cache.counters
+        counters["bytes_saved"] += len(payload)
+        counters["tokens_saved"] += response.usage.input_tokens + response.usage.output_tokens
+        # Nothing was billed for this response; keep the original usage out of run accounting
+        return replace(response, usage=RequestUsage(),
+                       provider_details={**(response.provider_details or {}), CACHE_HIT_KEY: "hit"})
+
+    async def request(self, messages, model_settings, model_request_parameters) -> ModelResponse:
+        key = request_key(self.wrapped, messages, model_settings, model_request_parameters)
+        leader = self._inflight.get(key)
+        if leader is not None:
+            # An identical request is already in flight: share its result instead of calling again
+            try:
+                payload = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if not leader.cancelled() or asyncio.current_task().cancelling():
+                    raise  # we were cancelled ourselves (possibly together with the leader)
+                # The leader was cancelled, not failed: fall through and make our own call
+            else:
+                self.cache.counters["coalesced"] += 1
+                return self._hit(payload)
+
+        payload = self.cache.get(key)
+        if payload is not None:
+            return self._hit(payload)
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self.wrapped.request(messages, model_settings, model_request_parameters)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # followers re-raise it; avoid "exception was never retrieved"
+            raise
+        else:
+            payload = _encode_response(response)
+            self.cache.set(key, payload, self.ttl_seconds)
+            future.set_result(payload)
+            return response
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
@@ -0,0 +1,184 @@
+"""
+Bounded-Concurrency Scheduler - Architectural Rationale:
+--------------------------------------------------------
+`asyncio.gather(*tasks)` over an LLM-generated task list fires every call at
+once: 20 topics means 20 simultaneous requests and a wall of 429s.
+
+1. Concurrency Caps: A global semaphore plus one semaphore per provider bound
+   the number of in-flight calls.
+2. Rate Limits: Token buckets enforce requests-per-minute and tokens-per-minute
+   per provider; estimates are reconciled with real usage after each call.
+3. Deadlines: Each job has a deadline covering queueing and execution, so one
+   stuck call cannot hold the whole fan-out hostage.
+4. Streaming: Outcomes are yielded in completion order, letting consumers start
+   on early results while slower jobs are still running.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute / 60` tokens per second."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        # Waiters queue on the lock, so refills are handed out FIFO
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        """Charge (positive) or refund (negative) tokens after the fact; may go into debt."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+@dataclass
+class ProviderLimits:
+    """Per-provider admission limits. `None` disables a limit."""
+    max_concurrency: Optional[int] = None
+    requests_per_minute: Optional[float] = None
+    tokens_per_minute: Optional[float] = None
+
+
+@dataclass
+class ScheduledJob:
+    """A unit of work: `run` is called only once the job is admitted."""
+    key: Any
+    run: Callable[[], Awaitable[Any]]
+    provider: str = "default"
+    estimated_tokens: int = 0
+    deadline: Optional[float] = None  # seconds from submission
+
+
+@dataclass
+class JobOutcome:
+    """Result (or error) of a scheduled job, with queue and service time."""
+    key: Any
+    result: Any = None
+    error: Optional[BaseException] = None
+    queued_s: float = 0.0
+    service_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _usage_tokens(result: Any) -> Optional[int]:
+    # pydantic_ai run results expose usage (a method or a property); anything else is left as estimated
+    usage = getattr(result, "usage", None)
+    try:
+        return (usage() if callable(usage) else usage).total_tokens
+    except Exception:
+        return None
+
+
+@dataclass
+class _ProviderState:
+    semaphore: Optional[asyncio.Semaphore]
+    requests: Optional[TokenBucket]
+    tokens: Optional[TokenBucket]
+
+
+class TaskScheduler:
+    """Runs jobs under global/per-provider concurrency caps, rate limits and deadlines."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        provider_limits: Optional[Dict[str, ProviderLimits]] = None,
+        default_deadline: Optional[float] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.provider_limits = provider_limits or {}
+        self.default_deadline = default_deadline
+        self._global: Optional[asyncio.Semaphore] = None
+        self._providers: Dict[str, _ProviderState] = {}
+
+    def _ensure_global(self) -> asyncio.Semaphore:
+        # Created on first use, from inside a running loop, like the per-provider state
+        if self._global is None:
+            self._global = asyncio.Semaphore(self.max_concurrency)
+        return self._global
+
+    def _provider(self, name: str) -> _ProviderState:
+        state = self._providers.get(name)
+        if state is None:
+            limits = self.provider_limits.get(name, ProviderLimits())
+            state = _ProviderState(
+                semaphore=asyncio.Semaphore(limits.max_concurrency) if limits.max_concurrency else None,
+                requests=TokenBucket(limits.requests_per_minute) if limits.requests_per_minute else None,
+                tokens=TokenBucket(limits.tokens_per_minute) if limits.tokens_per_minute else None,
+            )
+            self._providers[name] = state
+        return state
+
+    async def _admit_and_run(self, job: ScheduledJob, outcome: JobOutcome, submitted: float):
+        provider = self._provider(job.provider)
+        async with self._ensure_global():
+            if provider.semaphore is not None:
+                await provider.semaphore.acquire()
+            try:
+                if provider.requests is not None:
+                    await provider.requests.acquire(1)
+                if provider.tokens is not None and job.estimated_tokens:
+                    await provider.tokens.acquire(job.estimated_tokens)
+                started = time.monotonic()
+                outcome.queued_s = started - submitted
+                try:
+                    outcome.result = await job.run()
+                finally:
+                    outcome.service_s = time.monotonic() - started
+                if provider.tokens is not None:
+                    actual = _usage_tokens(outcome.result)
+                    if actual is not None:
+                        provider.tokens.adjust(actual - job.estimated_tokens)
+            finally:
+                if provider.semaphore is not None:
+                    provider.semaphore.release()
+
+    async def _execute(self, job: ScheduledJob) -> JobOutcome:
+        outcome = JobOutcome(key=job.key)
+        submitted = time.monotonic()
+        deadline = job.deadline if job.deadline is not None else self.default_deadline
+        try:
+            await asyncio.wait_for(self._admit_and_run(job, outcome, submitted), deadline)
+        except Exception as e:  # includes asyncio.TimeoutError when the deadline passes
+            outcome.error = e
+        return outcome
+
+    async def as_completed(self, jobs: Iterable[ScheduledJob]) -> AsyncIterator[JobOutcome]:
+        """Schedule all jobs and yield their outcomes in completion order."""
+        tasks = [asyncio.create_task(self._execute(job)) for job in jobs]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumer stopped early (quorum reached, error, ...): cancel the rest
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run_all(self, jobs: Iterable[ScheduledJob]) -> Dict[Any, JobOutcome]:
+        """Convenience wrapper: wait for every job and return outcomes by key."""
+        return {outcome.key: outcome async for outcome in self.as_completed(jobs)}
@@ -0,0 +1,283 @@
+"""
+Semantic Response Cache - Architectural Rationale:
+--------------------------------------------------
+The exact-match `ResponseCache` only helps when a request is byte-identical.
+Users ask the same question in many ways ("怎么开发票" / "发票怎么开"), and
+each near-duplicate still pays for a full LLM round trip.
+
+1. Normalize, Embed, Search: The query is normalized (NFKC, case,
+   punctuation, whitespace), embedded with any `vector_store.Embedder`, and
+   compared by cosine similarity against the cached queries of the same
+   namespace: one matrix-vector product over a preallocated NumPy matrix.
+2. Precision Over Recall: A hit skips the model entirely, so a wrong hit
+   keeps serving a wrong answer until it expires. The default threshold is
+   high (0.95); measure hit rate against false-hit rate on a replayed query
+   log before lowering it.
+3. Revalidated Hits: Outputs are stored as JSON and validated against the
+   agent's current `output_type` on every hit. An entry that no longer fits
+   (the schema changed) is dropped and the query falls through to the model.
+4. Namespaces and Eviction: Each agent gets its own namespace with its own
+   capacity. Entries expire after a TTL; a full namespace evicts its least
+   recently used entry.
+
+Only single-shot string prompts are cached. Runs that pass message history,
+deps, a per-run model or a per-run output type bypass the cache, and output
+validators do not run on hits. Do not cache agents whose answer depends on
+the user or on the current time.
+"""
+
+import inspect
+import itertools
+import re
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+from pydantic import TypeAdapter, ValidationError
+from pydantic_ai import Agent
+from pydantic_ai.agent import AgentRunResult
+
+from common.vector_store import Embedder
+
+
+# `Agent.run` arguments that change the answer but are not part of the cache key
+_BYPASS_KWARGS = ("deps", "model", "output_type")
+
+# Whitespace next to a CJK character carries no meaning ("提示 404 错误" == "提示404错误")
+_CJK_SPACE = re.compile(r"(?<=[\u3400-\u9fff])\s+|\s+(?=[\u3400-\u9fff])")
+
+
+def normalize_query(text: str) -> str:
+    """NFKC (full-width -> half-width), lower case, punctuation dropped, whitespace collapsed."""
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text)
+    return _CJK_SPACE.sub("", re.sub(r"\s+", " ", text)).strip()
+
+
+def output_adapter(output_type: Any) -> Optional[TypeAdapter]:
+    """TypeAdapter for an agent's `output_type`, or None if it is not plain data (e.g. output functions)."""
+    types = tuple(output_type) if isinstance(output_type, (list, tuple)) else (output_type,)
+    if any(inspect.isfunction(t) or inspect.ismethod(t) for t in types):
+        return None  # output functions have side effects and must run
+    if len(types) > 1:
+        output_type = Union[types]
+    try:
+        return TypeAdapter(output_type)
+    except Exception:
+        return None
+
+
+@dataclass
+class _Entry:
+    query: str
+    payload: bytes
+    latency_s: float
+    hits: int = 0
+
+
+@dataclass
+class SemanticHit:
+    output: Any
+    score: float
+    matched_query: str
+    latency_saved_s: float
+
+
+def _new_counters() -> Dict[str, float]:
+    return {
+        "lookups": 0, "hits": 0, "misses": 0, "invalidated": 0, "stores": 0,
+        "evictions": 0, "expired": 0, "bypassed": 0, "latency_saved_s": 0.0,
+    }
+
+
+class _Namespace:
+    """Cached queries of one agent. A slot with `expires_at == 0` is free."""
+
+    def __init__(self, dim: int, max_entries: int):
+        self.max_entries = max_entries
+        capacity = min(max_entries, 64)
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.int64)
+        self.entries: List[Optional[_Entry]] = [None] * capacity
+        self.size = 0  # slots [0, size) have been used at least once
+        self.free: List[int] = []
+        self.counters = _new_counters()
+
+    def __len__(self) -> int:
+        return self.size - len(self.free)
+
+    def release(self, slot: int):
+        self.expires_at[slot] = 0.0
+        self.entries[slot] = None
+        self.free.append(slot)
+
+    def expire(self, now: float):
+        expires_at = self.expires_at[:self.size]
+        for slot in np.flatnonzero((expires_at > 0) & (expires_at <= now)):
+            self.release(int(slot))
+            self.counters["expired"] += 1
+
+    def allocate(self) -> int:
+        if self.free:
+            return self.free.pop()
+        if self.size == len(self.vectors) and self.size < self.max_entries:
+            capacity = min(self.max_entries, self.size * 2)
+            grow = capacity - self.size
+            self.vectors = np.vstack([self.vectors, np.zeros((grow, self.vectors.shape[1]), dtype=np.float32)])
+            self.expires_at = np.concatenate([self.expires_at, np.zeros(grow)])
+            self.last_used = np.concatenate([self.last_used, np.zeros(grow, dtype=np.int64)])
+            self.entries.extend([None] * grow)
+        if self.size < len(self.vectors):
+            self.size += 1
+            return self.size - 1
+        # Full: evict the least recently used entry
+        slot = int(np.argmin(self.last_used[:self.size]))
+        self.counters["evictions"] += 1
+        return slot
+
+
+class SemanticCache:
+    """Per-namespace semantic cache: query embedding -> serialized output, with LRU and TTL."""
+
+    def __init__(self, embedder: Embedder, threshold: float = 0.95, max_entries: int = 1024,
+                 ttl_seconds: float = 3600.0):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._namespaces: Dict[str, _Namespace] = {}
+        self._clock = itertools.count(1)
+        self._lock = threading.Lock()
+        self.embed_seconds = 0.0
+
+    async def embed(self, query: str) -> np.ndarray:
+        start = time.perf_counter()
+        vector = (await self.embedder.embed([normalize_query(query)]))[0]
+        self.embed_seconds += time.perf_counter() - start
+        return vector
+
+    def counters(self, namespace: str) -> Dict[str, float]:
+        ns = self._namespaces.get(namespace)
+        if ns is None:
+            return self._namespaces.setdefault(namespace, _Namespace(0, self.max_entries)).counters
+        return ns.counters
+
+    def lookup(self, namespace: str, vector: np.ndarray,
+               validate: Callable[[bytes], Any] = bytes) -> Optional[SemanticHit]:
+        """
+        Best cached match at or above the threshold, with its payload passed through `validate`.
+        A payload that fails validation (`ValidationError`) is dropped and the next best match is
+        tried; a miss only when no match above the threshold validates.
+        """
+        with self._lock:
+            counters = self.counters(namespace)
+            counters["lookups"] += 1
+            ns = self._namespaces[namespace]
+            ns.expire(time.time())
+            if len(ns) and ns.vectors.shape[1] == len(vector):
+                scores = ns.vectors[:ns.size] @ vector
+                scores[ns.expires_at[:ns.size] == 0] = -np.inf
+                candidates = np.flatnonzero(scores >= self.threshold)
+                for slot in candidates[np.argsort(-scores[candidates], kind="stable")]:
+                    slot = int(slot)
+                    entry = ns.entries[slot]
+                    try:
+                        output = validate(entry.payload)
+                    except ValidationError:
+                        ns.release(slot)
+                        counters["invalidated"] += 1
+                        continue
+                    ns.last_used[slot] = next(self._clock)
+                    entry.hits += 1
+                    counters["hits"] += 1
+                    counters["latency_saved_s"] += entry.latency_s
+                    return SemanticHit(output, float(scores[slot]), entry.query, entry.latency_s)
+            counters["misses"] += 1
+            return None
+
+    def store(self, namespace: str, query: str, vector: np.ndarray, payload: bytes, latency_s: float,
+              ttl_seconds: Optional[float] = None):
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None or ns.vectors.shape[1] != len(vector):
+                # First store (or the embedder changed): (re)create the namespace with the right dimension
+                counters = ns.counters if ns is not None else _new_counters()
+                ns = self._namespaces[namespace] = _Namespace(len(vector), self.max_entries)
+                ns.counters = counters
+            now = time.time()
+            ns.expire(now)  # reuse expired slots before evicting live ones
+            slot = ns.allocate()
+            ns.vectors[slot] = vector
+            ns.expires_at[slot] = now + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+            ns.last_used[slot] = next(self._clock)
+            ns.entries[slot] = _Entry(query, payload, latency_s)
+            ns.counters["stores"] += 1
+
+    def clear(self, namespace: Optional[str] = None):
+        """Drop all entries of one namespace (e.g. after its prompt changed), or of all namespaces."""
+        with self._lock:
+            for name in ([namespace] if namespace is not None else list(self._namespaces)):
+                ns = self._namespaces.get(name)
+                if ns is not None:
+                    self._namespaces[name] = _Namespace(0, self.max_entries)
+                    self._namespaces[name].counters = ns.counters
+
+    def stats(self) -> Dict[str, Any]:
+        namespaces = {}
+        for name, ns in self._namespaces.items():
+            c = ns.counters
+            namespaces[name] = {
+                **c, "latency_saved_s": round(c["latency_saved_s"], 3), "entries": len(ns),
+                "hit_ratio": round(c["hits"] / c["lookups"], 4) if c["lookups"] else 0.0,
+            }
+        return {"threshold": self.threshold, "embed_seconds": round(self.embed_seconds, 3), "namespaces": namespaces}
+
+
+@dataclass
+class SemanticRunResult:
+    """What `SemanticCachedAgent.run` returns; `run_result` is None on a cache hit."""
+    output: Any
+    cache_hit: bool
+    elapsed_s: float
+    score: Optional[float] = None
+    matched_query: Optional[str] = None
+    run_result: Optional[AgentRunResult] = None
+
+
+class SemanticCachedAgent:
+    """
+    Serves near-duplicate prompts of one agent from a shared `SemanticCache`.
+    The namespace defaults to the agent's name; agents sharing a cache need distinct names.
+    """
+
+    def __init__(self, agent: Agent, cache: SemanticCache, namespace: Optional[str] = None,
+                 ttl_seconds: Optional[float] = None):
+        self.agent = agent
+        self.cache = cache
+        self.namespace = namespace or agent.name or f"agent@{id(agent):x}"
+        self.ttl_seconds = ttl_seconds
+        self._adapter = output_adapter(agent.output_type)
+
+    async def run(self, user_prompt: Any, **kwargs) -> SemanticRunResult:
+        start = time.perf_counter()
+        if (self._adapter is None or not isinstance(user_prompt, str) or kwargs.get("message_history")
+                or any(kwargs.get(name) is not None for name in _BYPASS_KWARGS)):
+            self.cache.counters(self.namespace)["bypassed"] += 1
+            result = await self.agent.run(user_prompt, **kwargs)
+            return SemanticRunResult(result.output, False, time.perf_counter() - start, run_result=result)
+
+        vector = await self.cache.embed(user_prompt)
+        hit = self.cache.lookup(self.namespace, vector, self._adapter.validate_json)
+        if hit is not None:
+            return SemanticRunResult(hit.output, True, time.perf_counter() - start, hit.score, hit.matched_query)
+
+        model_start = time.perf_counter()
+        result = await self.agent.run(user_prompt, **kwargs)
+        latency = time.perf_counter() - model_start
+        self.cache.store(self.namespace, user_prompt, vector, self._adapter.dump_json(result.output), latency,
+                         self.ttl_seconds)
+        return SemanticRunResult(result.output, False, time.perf_counter() - start, run_result=result)
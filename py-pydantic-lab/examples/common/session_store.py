@@ -0,0 +1,198 @@
+"""
+Conversation Session Store - Architectural Rationale:
+-----------------------------------------------------
+Persisting history by re-serializing `result.all_messages()` every turn
+costs O(history) bytes per turn, and O(history²) over a conversation.
+
+1. Append-Only Deltas: Each turn stores only `result.new_messages()` as one
+   row `(session_id, seq, payload)`. Earlier rows are never rewritten.
+2. Compact Payloads: Deltas are serialized with pydantic_ai's
+   `ModelMessagesTypeAdapter` (lossless round-trip) and zlib-compressed.
+3. Sequential Loads: The SQLite table is `WITHOUT ROWID` with primary key
+   `(session_id, seq)`, so a session's deltas are stored contiguously in
+   key order and loading a session is one range scan. SQLite runs offline
+   with no server. WAL mode keeps readers and the appender from blocking
+   each other.
+4. Hot-Session Cache: Recently used sessions stay deserialized in an
+   in-process LRU, so a busy conversation does not hit the database or the
+   JSON parser at all between turns. Appending to a session that is not
+   cached only looks up its next sequence number; the history is decoded
+   when someone actually loads it.
+"""
+
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+import time
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+from pydantic_ai.messages import ModelMessage, ModelMessagesTypeAdapter
+
+
+def encode_messages(messages: Sequence[ModelMessage], level: int = 6) -> bytes:
+    return zlib.compress(ModelMessagesTypeAdapter.dump_json(list(messages)), level)
+
+
+def decode_messages(payload: bytes) -> List[ModelMessage]:
+    return ModelMessagesTypeAdapter.validate_json(zlib.decompress(payload))
+
+
+class SeqConflictError(Exception):
+    """A delta with the same (session_id, seq) already exists."""
+
+
+@dataclass
+class _CachedSession:
+    messages: List[ModelMessage]
+    next_seq: int
+
+
+class SessionStore(ABC):
+    """
+    Base class: per-session append-only delta log behind an LRU of hot sessions.
+    Backends implement `_read_deltas`, `_next_seq`, `_write_delta`, `_delete` and `session_ids`.
+    """
+
+    def __init__(self, cache_sessions: int = 256):
+        self.cache_sessions = cache_sessions
+        self._cache: "OrderedDict[str, _CachedSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_written = 0
+
+    # ---------- backend hooks ----------
+
+    @abstractmethod
+    def _read_deltas(self, session_id: str) -> List[tuple]:
+        """[(seq, payload), ...] in seq order."""
+
+    @abstractmethod
+    def _next_seq(self, session_id: str) -> int:
+        """Sequence number of the next delta (0 for an unknown session), without reading payloads."""
+
+    @abstractmethod
+    def _write_delta(self, session_id: str, seq: int, payload: bytes):
+        """Insert one delta; raise `SeqConflictError` if `seq` is already taken."""
+
+    @abstractmethod
+    def _delete(self, session_id: str):
+        """Remove every delta of a session."""
+
+    @abstractmethod
+    def session_ids(self) -> List[str]:
+        """Ids of all stored sessions."""
+
+    def close(self):
+        pass
+
+    # ---------- cache ----------
+
+    def _cached(self, session_id: str) -> _CachedSession:
+        entry = self._cache.get(session_id)
+        if entry is not None:
+            self._cache.move_to_end(session_id)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        messages: List[ModelMessage] = []
+        next_seq = 0
+        for seq, payload in self._read_deltas(session_id):
+            messages.extend(decode_messages(payload))
+            next_seq = seq + 1
+        entry = self._cache[session_id] = _CachedSession(messages, next_seq)
+        while len(self._cache) > self.cache_sessions:
+            self._cache.popitem(last=False)
+        return entry
+
+    # ---------- public API ----------
+
+    def load(self, session_id: str) -> List[ModelMessage]:
+        """Full message history of a session (empty for an unknown session)."""
+        with self._lock:
+            return list(self._cached(session_id).messages)
+
+    def append(self, session_id: str, messages: Sequence[ModelMessage]) -> int:
+        """Persist one turn's new messages; returns the bytes written."""
+        if not messages:
+            return 0
+        payload = encode_messages(messages)
+        with self._lock:
+            entry: Optional[_CachedSession] = self._cache.get(session_id)
+            if entry is not None:
+                self._cache.move_to_end(session_id)
+                self.hits += 1
+            seq = entry.next_seq if entry is not None else self._next_seq(session_id)
+            try:
+                self._write_delta(session_id, seq, payload)
+            except SeqConflictError:
+                # Another process appended to this session since we cached it: drop the stale copy, retry once
+                self._cache.pop(session_id, None)
+                entry = None
+                self._write_delta(session_id, self._next_seq(session_id), payload)
+            if entry is not None:
+                entry.messages.extend(messages)
+                entry.next_seq = seq + 1
+            self.bytes_written += len(payload)
+        return len(payload)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._cache.pop(session_id, None)
+            self._delete(session_id)
+
+    def stats(self) -> Dict[str, int]:
+        return {"cached_sessions": len(self._cache), "hits": self.hits, "misses": self.misses,
+                "bytes_written": self.bytes_written}
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store backed by one SQLite file (WAL mode, clustered by session)."""
+
+    def __init__(self, path: str, cache_sessions: int = 256):
+        super().__init__(cache_sessions)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_deltas ("
+            " session_id TEXT NOT NULL,"
+            " seq INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " payload BLOB NOT NULL,"
+            " PRIMARY KEY (session_id, seq)"
+            ") WITHOUT ROWID"
+        )
+
+    def _read_deltas(self, session_id: str) -> List[tuple]:
+        return self._conn.execute(
+            "SELECT seq, payload FROM session_deltas WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+
+    def _next_seq(self, session_id: str) -> int:
+        row = self._conn.execute(
+            "SELECT MAX(seq) FROM session_deltas WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return 0 if row[0] is None else row[0] + 1
+
+    def _write_delta(self, session_id: str, seq: int, payload: bytes):
+        try:
+            self._conn.execute(
+                "INSERT INTO session_deltas (session_id, seq, created_at, payload) VALUES (?, ?, ?, ?)",
+                (session_id, seq, time.time(), payload),
+            )
+        except sqlite3.IntegrityError as e:
+            raise SeqConflictError(f"{session_id}#{seq}") from e
+
+    def _delete(self, session_id: str):
+        self._conn.execute("DELETE FROM session_deltas WHERE session_id = ?", (session_id,))
+
+    def session_ids(self) -> List[str]:
+        return [row[0] for row in self._conn.execute("SELECT DISTINCT session_id FROM session_deltas")]
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,145 @@
+"""
+Token Accounting - Architectural Rationale:
+-------------------------------------------
+`len(str(x)) // 4` is wrong twice: it undercounts CJK text (roughly one token
+per character, not per four) and `str(result)` formats the whole run result,
+which is expensive for large structured outputs.
+
+1. Provider Usage First: Token counts come from the run's `RunUsage`
+   (input/output/cache read/cache write), i.e. what the provider billed.
+2. Cache Visibility: Cache-read (prompt cache hit) tokens are kept separate
+   so prompt-caching savings show up in monitoring and pricing.
+3. Estimation Fallback: Only when the provider omits usage are counts
+   estimated, from the run's message parts (never `str(result)`), using
+   tiktoken when installed and a CJK-aware heuristic otherwise. Repeated
+   texts (system prompts, tool schemas) hit an LRU cache.
+"""
+
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to the heuristic estimator
+    tiktoken = None
+
+from common.response_cache import is_cache_hit
+
+
+@dataclass(frozen=True)
+class TokenCounts:
+    """Token usage of one agent run. `prompt_tokens` includes `cache_read_tokens`."""
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    reasoning_tokens: int = 0
+    requests: int = 0
+    estimated: bool = False
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def _is_cjk(ch: str) -> bool:
+    code = ord(ch)
+    return 0x3000 <= code <= 0x9FFF or 0xAC00 <= code <= 0xD7AF or 0xF900 <= code <= 0xFAFF or 0xFF00 <= code <= 0xFFEF
+
+
+class TokenEstimator:
+    """Counts tokens with tiktoken when available, otherwise with a CJK-aware character heuristic."""
+
+    def __init__(self, encoding: str = "cl100k_base", cache_size: int = 4096):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding(encoding)
+            except Exception:  # encoding files unavailable (offline): use the heuristic
+                self._encoding = None
+        self.count = lru_cache(maxsize=cache_size)(self._count)
+
+    @property
+    def backend(self) -> str:
+        return "tiktoken" if self._encoding is not None else "heuristic"
+
+    def _count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        cjk = sum(1 for ch in text if _is_cjk(ch))
+        return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+_default_estimator: Optional[TokenEstimator] = None
+
+
+def default_estimator() -> TokenEstimator:
+    """Process-wide estimator (loading a tiktoken encoding is not free)."""
+    global _default_estimator
+    if _default_estimator is None:
+        _default_estimator = TokenEstimator()
+    return _default_estimator
+
+
+def _part_texts(part: Any) -> Iterable[str]:
+    if hasattr(part, "args_as_json_str"):       # tool calls
+        yield part.args_as_json_str()
+    elif hasattr(part, "model_response_str"):   # tool returns
+        yield part.model_response_str()
+    elif hasattr(part, "model_response"):       # retry prompts
+        yield part.model_response()
+    else:
+        content = getattr(part, "content", None)
+        if isinstance(content, str):
+            yield content
+        elif isinstance(content, (list, tuple)):  # multimodal user prompts: count the text items only
+            yield from (item for item in content if isinstance(item, str))
+
+
+def count_message_tokens(message: Any, estimator: Optional[TokenEstimator] = None) -> int:
+    """Estimated tokens of one ModelRequest/ModelResponse (its parts, plus instructions on requests)."""
+    estimator = estimator or default_estimator()
+    instructions = getattr(message, "instructions", None)
+    tokens = estimator.count(instructions) if instructions else 0
+    return tokens + sum(estimator.count(text) for part in message.parts for text in _part_texts(part))
+
+
+def estimate_token_counts(result: Any, estimator: Optional[TokenEstimator] = None) -> TokenCounts:
+    """Estimate usage from the run's new messages (requests -> prompt, responses -> completion)."""
+    estimator = estimator or default_estimator()
+    prompt = completion = requests = 0
+    for message in result.new_messages():
+        if message.kind == "request":
+            prompt += count_message_tokens(message, estimator)
+        else:
+            requests += 1
+            completion += count_message_tokens(message, estimator)
+    return TokenCounts(prompt, completion, requests=requests, estimated=True)
+
+
+def run_usage(result: Any) -> Any:
+    """The run's RunUsage; `usage` is a method on older pydantic_ai releases and a property on newer ones."""
+    usage = result.usage
+    return usage() if callable(usage) else usage
+
+
+def token_counts_from_result(result: Any, estimator: Optional[TokenEstimator] = None) -> TokenCounts:
+    """Provider-reported usage of a pydantic_ai run result, estimated only when the provider sent none."""
+    usage = run_usage(result)
+    if not (usage.input_tokens or usage.output_tokens):
+        responses = [m for m in result.new_messages() if m.kind == "response"]
+        if responses and all(is_cache_hit(m) for m in responses):
+            return TokenCounts(requests=len(responses))  # served by common/response_cache.py: nothing billed
+        return estimate_token_counts(result, estimator)
+    return TokenCounts(
+        prompt_tokens=usage.input_tokens,
+        completion_tokens=usage.output_tokens,
+        cache_read_tokens=usage.cache_read_tokens,
+        cache_write_tokens=usage.cache_write_tokens,
+        reasoning_tokens=usage.details.get("reasoning_tokens", 0),
+        requests=usage.requests,
+    )
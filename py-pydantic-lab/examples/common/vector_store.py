@@ -0,0 +1,376 @@
+"""
+Vector Chunk Store - Architectural Rationale:
+---------------------------------------------
+RAG answers are only as good as the text evidence retrieved for them. This
+module turns raw documents into searchable chunks.
+
+1. Ingestion: Documents are split on sentence boundaries into bounded chunks
+   and embedded through a pluggable embedder (offline hashing or any
+   OpenAI-compatible embeddings endpoint).
+2. Two Index Tiers: A NumPy flat index (exact cosine) for small corpora and an
+   IVF index (k-means buckets, probe the nearest `nprobe`) for large ones.
+3. Memory-Mapped Persistence: Vectors and index arrays are saved as .npy files
+   and reopened with `mmap_mode='r'`, so a restart neither re-embeds nor loads
+   the whole matrix into RAM. A corpus fingerprint triggers a rebuild only when
+   documents, chunking or embedder change. A save is staged in a sibling
+   directory and swapped in whole, so a crash never pairs a manifest with
+   half-written arrays.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import uuid
+import zlib
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+
+import numpy as np
+
+
+# ==================== Embedders ====================
+
+class Embedder(Protocol):
+    """Anything that turns texts into an (n, dim) float32 matrix."""
+    name: str
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray: ...
+
+
+class HashingEmbedder:
+    """
+    Offline embedder: signed feature hashing of character n-grams.
+    Deterministic across processes (crc32, not Python's salted hash) and good
+    enough for lexical-semantic matching in demos and tests.
+    """
+
+    def __init__(self, dim: int = 512, ngrams: Tuple[int, ...] = (1, 2, 3)):
+        self.dim = dim
+        self.ngrams = ngrams
+        self.name = f"hashing-{dim}-{'.'.join(map(str, ngrams))}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            text = re.sub(r"\s+", " ", text.lower())
+            for n in self.ngrams:
+                for i in range(len(text) - n + 1):
+                    h = zlib.crc32(text[i:i + n].encode("utf-8"))
+                    out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        return _normalize(out)
+
+
+class OpenAIEmbedder:
+    """Embeddings via any OpenAI-compatible `/embeddings` endpoint."""
+
+    def __init__(self, model: str = "text-embedding-3-small", client=None, batch_size: int = 64):
+        if client is None:
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI()
+        self.client = client
+        self.model = model
+        self.batch_size = batch_size
+        self.name = f"openai:{model}"
+
+    async def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[List[float]] = []
+        for i in range(0, len(texts), self.batch_size):
+            response = await self.client.embeddings.create(model=self.model, input=list(texts[i:i + self.batch_size]))
+            rows.extend(d.embedding for d in response.data)
+        return _normalize(np.asarray(rows, dtype=np.float32))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+# ==================== Chunking ====================
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;\n])|(?<=\.)\s")
+
+
+def chunk_text(text: str, chunk_size: int = 200, overlap: int = 40) -> List[str]:
+    """Pack sentences into chunks of at most `chunk_size` chars; over-long sentences are split with overlap."""
+    chunks: List[str] = []
+    current = ""
+    for sentence in (s.strip() for s in _SENTENCE_END.split(text)):
+        if not sentence:
+            continue
+        if len(sentence) > chunk_size:
+            if current:
+                chunks.append(current)
+                current = ""
+            step = max(1, chunk_size - overlap)
+            chunks.extend(sentence[i:i + chunk_size] for i in range(0, len(sentence) - overlap, step))
+            continue
+        if len(current) + len(sentence) > chunk_size and current:
+            chunks.append(current)
+            current = ""
+        if current and current[-1].isascii() and sentence[0].isascii():
+            current += " "
+        current += sentence
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+# ==================== Indexes ====================
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    if k >= len(scores):
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k - 1)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class FlatIndex:
+    """Exact cosine search: one matrix-vector product over all (normalized) vectors."""
+    kind = "flat"
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.vectors @ query
+        ids = _top_k(scores, k)
+        return ids, scores[ids]
+
+    def save(self, directory: Path):
+        pass
+
+    @classmethod
+    def load(cls, directory: Path, vectors: np.ndarray) -> "FlatIndex":
+        return cls(vectors)
+
+
+class IVFIndex:
+    """
+    Inverted-file index: vectors are bucketed by their nearest k-means centroid;
+    a query scans only the `nprobe` closest buckets.
+    """
+    kind = "ivf"
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray,
+                 nprobe: int = 8):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.order = order      # vector ids sorted by bucket
+        self.offsets = offsets  # bucket b spans order[offsets[b]:offsets[b + 1]]
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, vectors: np.ndarray, nlist: Optional[int] = None, nprobe: int = 8, iterations: int = 10,
+              sample_size: int = 50_000, seed: int = 0) -> "IVFIndex":
+        n = len(vectors)
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(n, size=min(n, sample_size), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=min(nlist, len(sample)), replace=False)].copy()
+        # Spherical k-means on a sample: vectors are normalized, so nearest == highest dot product
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(len(centroids)):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = _normalize(centroids)
+        assign = np.concatenate([
+            np.argmax(vectors[i:i + 65_536] @ centroids.T, axis=1) for i in range(0, n, 65_536)
+        ])
+        order = np.argsort(assign, kind="stable").astype(np.int64)
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))]).astype(np.int64)
+        return cls(vectors, centroids, order, offsets, nprobe)
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        probes = _top_k(self.centroids @ query, min(self.nprobe, len(self.centroids)))
+        candidates = np.concatenate([self.order[self.offsets[b]:self.offsets[b + 1]] for b in probes])
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = self.vectors[candidates] @ query
+        best = _top_k(scores, k)
+        return candidates[best], scores[best]
+
+    def save(self, directory: Path):
+        np.save(directory / "ivf_centroids.npy", self.centroids)
+        np.save(directory / "ivf_order.npy", self.order)
+        np.save(directory / "ivf_offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, directory: Path, vectors: np.ndarray, nprobe: int = 8) -> "IVFIndex":
+        return cls(
+            vectors,
+            np.load(directory / "ivf_centroids.npy"),
+            np.load(directory / "ivf_order.npy", mmap_mode="r"),
+            np.load(directory / "ivf_offsets.npy"),
+            nprobe,
+        )
+
+
+# ==================== Store ====================
+
+@dataclass
+class Chunk:
+    doc_id: str
+    text: str
+
+
+@dataclass
+class ChunkHit:
+    doc_id: str
+    text: str
+    score: float
+
+
+def corpus_fingerprint(documents: Dict[str, str], embedder_name: str, chunk_size: int, overlap: int) -> str:
+    digest = hashlib.sha256(f"{embedder_name}|{chunk_size}|{overlap}".encode())
+    for doc_id in sorted(documents):
+        digest.update(doc_id.encode())
+        digest.update(b"\0")
+        digest.update(documents[doc_id].encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class VectorStore:
+    """Chunk store with pluggable embedder, flat/IVF index and mmap persistence."""
+
+    def __init__(self, embedder: Embedder, chunk_size: int = 200, chunk_overlap: int = 40,
+                 ivf_threshold: int = 50_000, nprobe: int = 8):
+        self.embedder = embedder
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.ivf_threshold = ivf_threshold
+        self.nprobe = nprobe
+        self.chunks: List[Chunk] = []
+        self.vectors: Optional[np.ndarray] = None
+        self.fingerprint: Optional[str] = None
+        self._index = None
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    async def add_documents(self, documents: Dict[str, str]) -> int:
+        """Chunk and embed documents; returns the number of chunks added. Invalidates the index."""
+        new_chunks = [
+            Chunk(doc_id, piece)
+            for doc_id, text in documents.items()
+            for piece in chunk_text(text, self.chunk_size, self.chunk_overlap)
+        ]
+        if not new_chunks:
+            return 0
+        embedded = await self.embedder.embed([c.text for c in new_chunks])
+        self.vectors = embedded if self.vectors is None else np.concatenate([self.vectors, embedded])
+        self.chunks.extend(new_chunks)
+        self._index = None
+        return len(new_chunks)
+
+    def build_index(self, kind: str = "auto"):
+        if self.vectors is None:
+            raise ValueError("VectorStore is empty; add documents first.")
+        if kind == "auto":
+            kind = "ivf" if len(self.vectors) >= self.ivf_threshold else "flat"
+        self._index = IVFIndex.build(self.vectors, nprobe=self.nprobe) if kind == "ivf" else FlatIndex(self.vectors)
+        return self._index
+
+    async def search(self, query: str, k: int = 4, min_score: float = 0.0) -> List[ChunkHit]:
+        if not self.chunks:
+            return []
+        if self._index is None:
+            self.build_index()
+        query_vector = (await self.embedder.embed([query]))[0]
+        ids, scores = self._index.search(query_vector, k)
+        return [
+            ChunkHit(self.chunks[i].doc_id, self.chunks[i].text, float(s))
+            for i, s in zip(ids.tolist(), scores.tolist())
+            if s >= min_score
+        ]
+
+    # ---------- persistence ----------
+
+    def save(self, directory: Path):
+        """
+        Write the store into a sibling staging directory, then swap it in for `directory`.
+        Files are never overwritten in place: a crash leaves either the old index or none,
+        and arrays still memory-mapped from the old directory stay valid.
+        """
+        directory = Path(directory)
+        directory.parent.mkdir(parents=True, exist_ok=True)
+        if self._index is None:
+            self.build_index()
+        staging = directory.with_name(f".{directory.name}.tmp-{uuid.uuid4().hex[:8]}")
+        staging.mkdir()
+        try:
+            self._write(staging)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        # rename() cannot replace a non-empty directory: move the old one aside first.
+        # A crash in between leaves no index at all, which open_or_build rebuilds.
+        retired = None
+        if directory.exists():
+            retired = directory.with_name(f".{directory.name}.old-{uuid.uuid4().hex[:8]}")
+            os.replace(directory, retired)
+        os.replace(staging, directory)
+        if retired is not None:
+            shutil.rmtree(retired, ignore_errors=True)
+
+    def _write(self, directory: Path):
+        np.save(directory / "vectors.npy", np.ascontiguousarray(self.vectors, dtype=np.float32))
+        self._index.save(directory)
+        with open(directory / "chunks.jsonl", "w", encoding="utf-8") as f:
+            for chunk in self.chunks:
+                f.write(json.dumps(asdict(chunk), ensure_ascii=False) + "\n")
+        # Manifest last: a directory without one is treated as incomplete
+        manifest = {
+            "embedder": self.embedder.name,
+            "dim": int(self.vectors.shape[1]),
+            "count": len(self.chunks),
+            "index": self._index.kind,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "fingerprint": self.fingerprint,
+        }
+        (directory / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, directory: Path, embedder: Embedder, **kwargs) -> "VectorStore":
+        directory = Path(directory)
+        manifest = json.loads((directory / "manifest.json").read_text(encoding="utf-8"))
+        if manifest["embedder"] != embedder.name:
+            raise ValueError(f"Index at {directory} was built with {manifest['embedder']}, not {embedder.name}.")
+        store = cls(embedder, chunk_size=manifest["chunk_size"], chunk_overlap=manifest["chunk_overlap"], **kwargs)
+        store.vectors = np.load(directory / "vectors.npy", mmap_mode="r")
+        with open(directory / "chunks.jsonl", encoding="utf-8") as f:
+            store.chunks = [Chunk(**json.loads(line)) for line in f]
+        store.fingerprint = manifest.get("fingerprint")
+        if manifest["index"] == IVFIndex.kind:
+            store._index = IVFIndex.load(directory, store.vectors, store.nprobe)
+        else:
+            store._index = FlatIndex.load(directory, store.vectors)
+        return store
+
+    @classmethod
+    async def open_or_build(cls, directory: Path, documents: Dict[str, str], embedder: Embedder,
+                            **kwargs) -> "VectorStore":
+        """Reuse the persisted index when its fingerprint matches `documents`; otherwise re-embed and save."""
+        directory = Path(directory)
+        store = cls(embedder, **kwargs)
+        fingerprint = corpus_fingerprint(documents, embedder.name, store.chunk_size, store.chunk_overlap)
+        manifest_path = directory / "manifest.json"
+        if manifest_path.exists():
+            try:
+                if json.loads(manifest_path.read_text(encoding="utf-8")).get("fingerprint") == fingerprint:
+                    return cls.load(directory, embedder, **{k: v for k, v in kwargs.items()
+                                                             if k not in ("chunk_size", "chunk_overlap")})
+            except (ValueError, KeyError, OSError):
+                pass  # Corrupt or foreign index: rebuild below
+        await store.add_documents(documents)
+        store.fingerprint = fingerprint
+        store.build_index()
+        store.save(directory)
+        return store
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Tests import the shared modules the same way the examples do: `from common.x import ...`
+examples_root = Path(__file__).resolve().parents[1] / "examples"
+if str(examples_root) not in sys.path:
+    sys.path.append(str(examples_root))
@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from common.anomaly import MetricsAnalyzer
+from common.metrics_store import APICallMetrics, MetricsRingBuffer
+
+START = datetime(2026, 3, 1, 9, 0, 0)
+
+
+def _store(rows):
+    """rows: (model, template, latency_ms, success, total_tokens, prompt_hash)"""
+    store = MetricsRingBuffer(capacity=len(rows))
+    for i, (model, template, latency, success, tokens, prompt_hash) in enumerate(rows):
+        store.append(APICallMetrics(
+            START + timedelta(seconds=i), model, "chat", tokens, 0, tokens, latency, success, tokens * 1e-6,
+            template=template, prompt_hash=prompt_hash,
+        ))
+    return store
+
+
+def _noisy(rng, median, n):
+    return median * np.exp(rng.normal(0, 0.1, n))
+
+
+def test_slow_template_is_not_averaged_away_by_fast_ones():
+    rng = np.random.default_rng(0)
+    rows = []
+    for i in range(2000):
+        if i % 10:
+            rows.append(("m", "fast", float(_noisy(rng, 20, 1)[0]), True, 100, 0))
+        else:
+            # 1 call in 10 uses the slow template, which triples its latency after call 1000
+            rows.append(("m", "slow", float(_noisy(rng, 600 if i < 1000 else 1800, 1)[0]), True, 100, 0))
+    findings = [f for f in MetricsAnalyzer().analyze(_store(rows)) if f.kind == "latency_regression"]
+    assert [(f.model, f.template) for f in findings] == [("m", "slow")]
+    assert findings[0].severity == "high"
+    assert 1500 < findings[0].evidence["recent_median_ms"] < 2100
+
+
+def test_stable_latency_raises_nothing():
+    rng = np.random.default_rng(1)
+    rows = [("m", "", float(v), True, 100, 0) for v in _noisy(rng, 300, 1000)]
+    assert MetricsAnalyzer().analyze(_store(rows)) == []
+
+
+def test_error_burst_token_outlier_and_duplicates():
+    rows = [("m", "t", 100.0, not 200 <= i < 215, 100 + i % 7, 0) for i in range(400)]
+    rows[50] = ("m", "t", 100.0, True, 5000, 0)
+    rows += [("m", "t", 100.0, True, 100, 42)] * 6
+    findings = {f.kind: f for f in MetricsAnalyzer().analyze(_store(rows))}
+    assert findings["error_burst"].evidence["window_errors"] == 15
+    assert findings["token_outlier"].evidence["max_tokens"] == 5000
+    assert findings["token_outlier"].template == "t"
+    assert findings["duplicate_prompts"].evidence["count"] == 6
+    # Most severe first
+    assert list(findings)[0] == "error_burst"
@@ -0,0 +1,79 @@
+import pytest
+
+from common import budget as budget_module
+from common.budget import BudgetExceededError, BudgetLimit, BudgetManager, SlidingWindow
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(budget_module, "time", clock)
+    return clock
+
+
+def test_sliding_window_expires_old_buckets():
+    window = SlidingWindow(BudgetLimit(60, max_tokens=100), buckets=6)  # 10s buckets
+    window.add(40, 0.0, now=0)
+    window.add(30, 0.0, now=25)
+    assert window.totals(now=55) == (70, 0.0)
+    assert window.would_exceed(31, 0.0, now=55)
+    assert window.totals(now=60) == (30, 0.0)   # the bucket of t=0 left the window
+    assert not window.would_exceed(70, 0.0, now=60)
+    assert window.totals(now=1000) == (0, 0.0)  # long idle gap: everything expired
+
+
+def test_adjust_is_a_no_op_once_the_bucket_expired():
+    window = SlidingWindow(BudgetLimit(60, max_tokens=100), buckets=6)
+    idx = window.add(50, 0.5, now=0)
+    window.adjust(idx, -20, -0.2, now=5)
+    assert window.totals(now=5) == (30, pytest.approx(0.3))
+    window.adjust(idx, -30, -0.3, now=70)
+    assert window.totals(now=70) == (0, 0.0)
+
+
+def test_reserve_reconcile_and_release(clock):
+    manager = BudgetManager(global_limits=[BudgetLimit(60, max_tokens=1000, max_cost_usd=1.0)])
+    reservation = manager.reserve("t", 600, 0.1)
+    with pytest.raises(BudgetExceededError) as error:
+        manager.reserve("t", 500, 0.1)
+    assert error.value.scope == "global"
+    manager.reconcile(reservation, 300, 0.05)  # actual usage was lower than estimated
+    manager.reconcile(reservation, 0, 0)        # settling twice is a no-op
+    assert manager.usage()["global/60s"] == {"tokens": 300, "cost_usd": pytest.approx(0.05)}
+    second = manager.reserve("t", 500, 0.1)
+    manager.release(second)
+    assert manager.usage()["global/60s"]["tokens"] == 300
+    assert (manager.admitted, manager.rejected) == (2, 1)
+
+
+def test_tenant_limits_are_isolated(clock):
+    manager = BudgetManager(
+        tenant_limits={"vip": [BudgetLimit(60, max_tokens=10_000)]},
+        default_tenant_limits=[BudgetLimit(60, max_tokens=100)],
+    )
+    manager.reserve("a", 100, 0)
+    assert manager.check("a", 1, 0).scope == "tenant:a"
+    assert manager.check("b", 100, 0) is None
+    assert manager.check("vip", 5000, 0) is None
+    clock.now += 61
+    assert manager.check("a", 100, 0) is None
+
+
+def test_reserve_first_reroutes_and_counts_once(clock):
+    manager = BudgetManager(global_limits=[BudgetLimit(86400, max_cost_usd=1.0)])
+    manager.reserve("t", 0, 0.9)
+    index, reservation = manager.reserve_first("t", [(100, 0.5), (100, 0.05)])
+    assert index == 1 and reservation.cost == 0.05
+    with pytest.raises(BudgetExceededError) as error:
+        manager.reserve_first("t", [(100, 0.5), (100, 0.2)])
+    # The preferred route's error is reported; the rejection is counted once for the call
+    assert error.value.used_cost == pytest.approx(0.95)
+    assert (manager.admitted, manager.rerouted, manager.rejected) == (2, 1, 1)
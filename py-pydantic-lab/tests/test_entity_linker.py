@@ -0,0 +1,57 @@
+import random
+
+from common.entity_linker import AhoCorasick, EntityLinker
+
+
+def _linker():
+    linker = EntityLinker()
+    linker.add_entity("diabetes_t2", ["2型糖尿病", "T2D"])
+    linker.add_entity("diabetes", ["糖尿病"])
+    linker.add_entity("metformin", ["二甲双胍", "Metformin"])
+    linker.add_entity("ai", ["AI"])
+    return linker.build()
+
+
+def test_finds_overlapping_and_nested_matches():
+    surfaces = sorted((m.start, m.surface) for m in _linker().find_all("2型糖尿病用二甲双胍"))
+    assert surfaces == [(0, "2型糖尿病"), (2, "糖尿病"), (6, "二甲双胍")]
+
+
+def test_link_resolves_leftmost_longest():
+    mentions = _linker().link("2型糖尿病用二甲双胍")
+    assert [(m.surface, m.entity_ids) for m in mentions] == [("2型糖尿病", ("diabetes_t2",)), ("二甲双胍", ("metformin",))]
+
+
+def test_case_folding_keeps_original_offsets():
+    mentions = _linker().link("take METFORMIN for t2d")
+    assert [m.surface for m in mentions] == ["METFORMIN", "t2d"]
+    assert _linker().entity_ids("take METFORMIN for t2d") == ["metformin", "diabetes_t2"]
+
+
+def test_latin_names_respect_word_boundaries():
+    linker = _linker()
+    assert linker.link("MAIN street") == []
+    assert [m.surface for m in linker.link("AI辅助诊断, (AI)")] == ["AI", "AI"]
+
+
+def test_shared_alias_maps_to_every_entity():
+    linker = EntityLinker()
+    linker.add_entity("apple_fruit", ["苹果"])
+    linker.add_entity("apple_inc", ["苹果", "Apple"])
+    linker.add_entity("x", ["果"])  # below min_length: ignored
+    linker.build()
+    assert linker.link("苹果发布会")[0].entity_ids == ("apple_fruit", "apple_inc")
+    assert linker.entity_ids("水果") == []
+
+
+def test_automaton_matches_brute_force():
+    rng = random.Random(7)
+    patterns = sorted({"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(30)})
+    matcher = AhoCorasick(case_sensitive=True)
+    ids = {p: matcher.add(p) for p in patterns}
+    for _ in range(50):
+        text = "".join(rng.choice("abc") for _ in range(rng.randint(0, 30)))
+        expected = sorted(
+            (i, i + len(p), ids[p]) for p in patterns for i in range(len(text)) if text.startswith(p, i)
+        )
+        assert sorted(matcher.iter_matches(text)) == expected
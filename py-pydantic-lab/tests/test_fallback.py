@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+from common.fallback import AllRoutesFailedError, CircuitBreaker, FallbackRouter, ModelRoute
+
+
+def _route(name, priority, answer, reset_timeout=30.0):
+    """Route whose model calls `answer()`: returning text succeeds, raising fails."""
+    async def respond(messages, info):
+        return ModelResponse(parts=[TextPart(answer())])
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=reset_timeout)
+    return ModelRoute(name, Agent(FunctionModel(respond)), priority=priority, breaker=breaker)
+
+
+def test_falls_back_and_opens_breaker():
+    def fail():
+        raise RuntimeError("provider down")
+
+    router = FallbackRouter([_route("primary", 0, fail), _route("backup", 1, lambda: "backup")])
+    assert asyncio.run(router.run("hi")).route == "backup"
+    assert router.health()["primary"]["state"] == "open"
+    # While open, the primary is skipped outright
+    assert [r.name for r in router.ordered_routes()] == ["backup"]
+
+
+def test_primary_recovers_through_half_open_probe():
+    primary_up = False
+
+    def primary():
+        if not primary_up:
+            raise RuntimeError("provider down")
+        return "primary"
+
+    router = FallbackRouter([_route("primary", 0, primary, reset_timeout=0.05),
+                             _route("backup", 1, lambda: "backup")])
+    assert asyncio.run(router.run("hi")).route == "backup"
+
+    primary_up = True
+    time.sleep(0.06)
+    assert router.health()["primary"]["state"] == "half_open"
+    # The probe goes first even though only the backup has latency stats
+    assert asyncio.run(router.run("hi")).route == "primary"
+    assert router.health()["primary"]["state"] == "closed"
+
+
+def test_failed_probe_falls_back_and_reopens():
+    def fail():
+        raise RuntimeError("still down")
+
+    router = FallbackRouter([_route("primary", 0, fail, reset_timeout=0.05), _route("backup", 1, lambda: "backup")])
+    asyncio.run(router.run("hi"))
+    time.sleep(0.06)
+    assert asyncio.run(router.run("hi")).route == "backup"
+    assert router.health()["primary"]["state"] == "open"
+
+
+def test_all_routes_failed():
+    def fail():
+        raise RuntimeError("down")
+
+    router = FallbackRouter([_route("a", 0, fail), _route("b", 1, fail)])
+    try:
+        asyncio.run(router.run("hi"))
+    except AllRoutesFailedError as error:
+        assert [name for name, _ in error.errors] == ["a", "b"]
+    else:
+        raise AssertionError("expected AllRoutesFailedError")
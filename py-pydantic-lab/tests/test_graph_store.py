@@ -0,0 +1,55 @@
+import pytest
+
+from common.graph_store import BOTH, IN, GraphStore
+
+
+def _store():
+    store = GraphStore()
+    store.add_edges([
+        ("a", "b", "knows", 0.3),
+        ("a", "c", "knows", 0.9),
+        ("c", "b", "works_with", 0.9),
+        ("b", "d", "knows", 0.5),
+    ])
+    return store
+
+
+def test_neighbors_by_direction_and_type():
+    store = _store()
+    assert sorted(store.neighbors("a")) == ["b", "c"]
+    assert sorted(store.neighbors("b", direction=IN)) == ["a", "c"]
+    assert sorted(store.neighbors("b", direction=BOTH)) == ["a", "c", "d"]
+    assert store.neighbors("c", relation_types=["knows"]) == []
+    assert store.neighbors("a", min_weight=0.5) == ["c"]
+    assert store.neighbors("missing") == []
+
+
+def test_two_hop_path_beats_weaker_one_hop_path():
+    hops = {r.node: r for r in _store().k_hop(["a"], k=2)}
+    # a -> c -> b scores 0.81, better than the direct a -> b edge (0.3)
+    assert hops["b"].score == pytest.approx(0.81)
+    assert hops["b"].hops == 2
+    assert hops["c"].score == pytest.approx(0.9)
+    # d is 2 hops away only through the weak direct edge: 0.3 * 0.5
+    assert hops["d"].score == pytest.approx(0.15)
+    assert hops["d"].hops == 2
+
+
+def test_k_hop_respects_hop_limit_and_order():
+    results = _store().k_hop(["a"], k=1)
+    assert [r.node for r in results] == ["a", "c", "b"]
+    assert results[2].score == pytest.approx(0.3)
+
+
+@pytest.mark.parametrize("weight", [0.0, -0.1, 1.5, float("nan")])
+def test_rejects_weights_outside_unit_interval(weight):
+    store = GraphStore()
+    with pytest.raises(ValueError):
+        store.add_edge("a", "b", "knows", weight)
+    assert store.edge_count == 0
+
+
+def test_subgraph_edges():
+    store = _store()
+    edges = [store.edge(eid) for eid in store.subgraph_edges(["a", "b", "c"])]
+    assert sorted((e.source, e.target) for e in edges) == [("a", "b"), ("a", "c"), ("c", "b")]
@@ -0,0 +1,67 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from common.http_pool import LoopAwareTransport, _close_sockets
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _get(transport, url):
+    """One request on a fresh `asyncio.run` loop; the client stays open so the pool keeps its connection."""
+    client = httpx.AsyncClient(transport=transport)
+
+    async def request():
+        response = await client.get(url)
+        await response.aread()
+
+    asyncio.run(request())
+
+
+def test_close_sockets_matches_httpcore_layout(server_url):
+    """`_close_sockets` reaches into httpx/httpcore internals: fail loudly if that layout changes."""
+    pool = httpx.AsyncHTTPTransport()
+    _get(pool, server_url)
+
+    connections = pool._pool.connections
+    assert len(connections) == 1
+    stream = connections[0]._connection._network_stream
+    sock = stream.get_extra_info("socket")
+    real = getattr(sock, "_sock", sock)
+    assert real.fileno() != -1
+
+    _close_sockets(pool)
+    assert real.fileno() == -1
+
+
+def test_pools_of_closed_loops_are_reaped(server_url):
+    transport = LoopAwareTransport(httpx.AsyncHTTPTransport)
+    _get(transport, server_url)
+    _get(transport, server_url)
+    # Each asyncio.run loop got its own pool; both loops are closed now
+    assert transport.loop_count() == 0
+    assert transport._owned == []
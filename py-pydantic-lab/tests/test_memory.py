@@ -0,0 +1,108 @@
+import asyncio
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import (
+    ModelRequest,
+    ModelResponse,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+from pydantic_ai.models.function import FunctionModel
+
+from common.memory import SUMMARY_PREFIX, MemoryManager
+from common.token_usage import TokenEstimator
+
+
+def _estimator():
+    estimator = TokenEstimator()
+    estimator._encoding = None  # deterministic heuristic: one token per CJK character
+    return estimator
+
+
+def _turn(i, with_tool=False, system=None):
+    first = [SystemPromptPart(system)] if system else []
+    messages = [ModelRequest(parts=first + [UserPromptPart(f"问题{i}")])]
+    if with_tool:
+        messages += [
+            ModelResponse(parts=[ToolCallPart("lookup", {"q": i}, tool_call_id=f"c{i}")]),
+            ModelRequest(parts=[ToolReturnPart("lookup", "结果", tool_call_id=f"c{i}")]),
+        ]
+    return messages + [ModelResponse(parts=[TextPart(f"回答{i}")])]
+
+
+def _prompts(history):
+    return [p.content for m in history for p in m.parts if isinstance(p, UserPromptPart)]
+
+
+def test_sliding_window_keeps_system_prompt_and_tool_pairs():
+    memory = MemoryManager(max_tokens=10_000, keep_turns=3, estimator=_estimator())
+    memory.add_messages(_turn(0, system="你是助手"))
+    for i in range(1, 6):
+        memory.add_messages(_turn(i, with_tool=i == 4))
+    history = memory.messages()
+    assert _prompts(history) == ["问题3", "问题4", "问题5"]
+    assert isinstance(history[0].parts[0], SystemPromptPart) and history[0].parts[0].content == "你是助手"
+    calls = [p.tool_call_id for m in history for p in m.parts if isinstance(p, ToolCallPart)]
+    returns = [p.tool_call_id for m in history for p in m.parts if isinstance(p, ToolReturnPart)]
+    assert calls == returns == ["c4"]
+    assert memory.stats.summarized_turns == 3  # no summarizer: dropped turns are discarded
+
+
+def test_token_budget_limits_the_window():
+    memory = MemoryManager(max_tokens=12, keep_turns=10, estimator=_estimator())
+    for i in range(5):
+        memory.add_messages(_turn(i))  # 3 + 3 tokens per turn
+    assert _prompts(memory.messages()) == ["问题3", "问题4"]
+    assert memory.stats.last_history_tokens <= 12
+
+
+def test_trim_to_keeps_the_prefix_stable_between_trims():
+    memory = MemoryManager(max_tokens=10_000, keep_turns=4, trim_to=2, estimator=_estimator())
+    windows = []
+    for i in range(8):
+        memory.add_messages(_turn(i))
+        windows.append(_prompts(memory.messages())[0])
+    # The first prompt of the window only moves when the window overflows, then jumps by two turns
+    assert windows == ["问题0", "问题0", "问题0", "问题0", "问题3", "问题3", "问题3", "问题6"]
+
+
+def test_background_summary_replaces_old_turns():
+    seen = []
+
+    async def summarize(messages, info):
+        seen.append(messages[-1].parts[-1].content)
+        return ModelResponse(parts=[TextPart("用户问过问题0和问题1")])
+
+    async def run():
+        memory = MemoryManager(Agent(FunctionModel(summarize)), max_tokens=10_000, keep_turns=2,
+                               estimator=_estimator())
+        for i in range(3):
+            memory.add_messages(_turn(i))
+        await memory.drain()
+        return memory
+
+    memory = asyncio.run(run())
+    assert "问题0" in seen[0]
+    history = memory.messages()
+    assert history[0].parts[0].content == SUMMARY_PREFIX + "用户问过问题0和问题1"
+    assert _prompts(history) == ["问题1", "问题2"]
+    assert memory.stats.summaries == 1 and len(memory.turns) == 2
+
+
+def test_failed_summary_degrades_to_a_sliding_window():
+    async def broken(messages, info):
+        raise RuntimeError("summarizer down")
+
+    async def run():
+        memory = MemoryManager(Agent(FunctionModel(broken)), max_tokens=10_000, keep_turns=1, estimator=_estimator())
+        for i in range(3):
+            memory.add_messages(_turn(i))
+        await memory.drain()
+        return memory
+
+    memory = asyncio.run(run())
+    assert memory.summary == "" and memory.stats.summary_errors >= 1
+    assert _prompts(memory.messages()) == ["问题2"]
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+import pytest
+
+from common.metrics_concurrency import ConcurrencyTracker
+
+
+def _hold(tracker, start, end, level=1, model="m"):
+    """Simulate `level` calls in flight from `start` to `end` (epoch seconds)."""
+    tracker._last_change = start
+    for _ in range(level):
+        tracker._advance(start)
+        tracker.total_inflight += 1
+        tracker._max[tracker._slot(int(start))] = max(tracker._max[tracker._slot(int(start))], tracker.total_inflight)
+    tracker._advance(end)
+    tracker.total_inflight -= level
+
+
+def test_series_integrates_in_flight_time():
+    tracker = ConcurrencyTracker(history_seconds=10)
+    _hold(tracker, 100.5, 102.25, level=2)
+    series = {second: (avg, peak) for second, avg, peak in tracker.series(5, now=103.0)}
+    assert series[100] == (pytest.approx(1.0), 2)
+    assert series[101] == (pytest.approx(2.0), 2)
+    assert series[102] == (pytest.approx(0.5), 2)
+    assert series[103] == (0.0, 0)
+
+
+def test_peak_and_suggested_limit_match_series():
+    tracker = ConcurrencyTracker(history_seconds=100)
+    for second, level in enumerate([1, 3, 2, 5, 1, 4]):
+        _hold(tracker, 1000 + second, 1000 + second + 0.5, level=level)
+    now = 1010.0
+    peaks = [peak for _, _, peak in tracker.series(100, now=now) if peak]
+    assert tracker.peak_in_flight(60, now=now) == max(peaks) == 5
+    assert tracker.suggested_limit(100, quantile=0.5, now=now) == 3
+    assert tracker.suggested_limit(100, quantile=1.0, now=now) == 5
+    # Seconds outside the window or older than the ring do not count
+    assert tracker.peak_in_flight(5, now=now) == 0
+    assert tracker.suggested_limit(now=now + 1000) == 0
+
+
+def test_track_counts_queue_and_service_time():
+    async def run():
+        tracker = ConcurrencyTracker()
+        semaphore = asyncio.Semaphore(1)
+        seen = []
+
+        async def call():
+            async with tracker.track("m", semaphore=semaphore) as timing:
+                seen.append((tracker.inflight["m"], tracker.waiting["m"]))
+                await asyncio.sleep(0.02)
+            return timing.queue_ms
+
+        queue_ms = await asyncio.gather(call(), call())
+        return tracker, seen, queue_ms
+
+    tracker, seen, queue_ms = asyncio.run(run())
+    assert seen == [(1, 0), (1, 0)]  # the semaphore keeps one call in flight at a time
+    assert tracker.inflight["m"] == 0 and tracker.peak["m"] == 1
+    assert max(queue_ms) >= 15
+    assert tracker.service_time.combined().count == 2
+    assert tracker.peak_in_flight(60, now=time.time()) == 1
@@ -0,0 +1,87 @@
+import asyncio
+import json
+from datetime import datetime
+
+import pytest
+
+from common.metrics_export import JSONLSink, MetricsExporter, MetricsSink, OpenMetricsSink
+from common.metrics_store import APICallMetrics
+
+
+def _call(model="m", success=True):
+    return APICallMetrics(datetime(2026, 3, 1), model, "chat", 10, 5, 15, 12.5, success, 0.01)
+
+
+class _ListSink(MetricsSink):
+    name = "list"
+
+    def __init__(self):
+        self.batches = []
+
+    async def write(self, batch):
+        self.batches.append(list(batch))
+
+
+class _BrokenSink(MetricsSink):
+    name = "broken"
+
+    async def write(self, batch):
+        raise ConnectionError("collector down")
+
+
+def test_sink_without_write_cannot_be_instantiated():
+    class Incomplete(MetricsSink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_batches_and_isolates_failing_sinks():
+    sink = _ListSink()
+    exporter = MetricsExporter([sink, _BrokenSink()], batch_size=4)
+    for _ in range(10):
+        assert exporter.submit(_call())
+    asyncio.run(exporter.aclose())
+    assert [len(b) for b in sink.batches] == [4, 4, 2]
+    stats = exporter.stats()
+    assert stats["exported"] == 10 and stats["queued"] == 0
+    assert stats["sink_errors"] == {"list": 0, "broken": 3}
+
+
+def test_sheds_above_high_water_and_drops_when_full():
+    exporter = MetricsExporter([_ListSink()], max_queue=20, high_water=0.5, sample_every=5)
+    accepted = sum(exporter.submit(_call()) for _ in range(100))
+    stats = exporter.stats()
+    assert stats["queued"] == accepted == 20
+    assert stats["sampled_out"] > 0 and stats["dropped"] > 0
+    assert stats["sampled_out"] + stats["dropped"] + accepted == stats["submitted"] == 100
+
+
+def test_background_flusher_exports_on_interval():
+    sink = _ListSink()
+
+    async def run():
+        exporter = MetricsExporter([sink], flush_interval=0.01)
+        exporter.start()
+        exporter.submit(_call())
+        await asyncio.sleep(0.05)
+        exported = exporter.exported
+        await exporter.aclose()
+        return exported
+
+    assert asyncio.run(run()) == 1
+
+
+def test_openmetrics_and_jsonl_sinks(tmp_path):
+    om = OpenMetricsSink()
+    jsonl = JSONLSink(str(tmp_path / "out" / "metrics.jsonl"))
+    batch = [_call('we"ird'), _call('we"ird', success=False)]
+    asyncio.run(om.write(batch))
+    asyncio.run(jsonl.write(batch))
+    text = om.render()
+    assert 'llm_calls_total{model="we\\"ird",operation="chat"} 2' in text
+    assert 'llm_errors_total{model="we\\"ird",operation="chat"} 1' in text
+    assert text.endswith("# EOF\n")
+    lines = (tmp_path / "out" / "metrics.jsonl").read_text().splitlines()
+    assert [json.loads(line)["success"] for line in lines] == [True, False]
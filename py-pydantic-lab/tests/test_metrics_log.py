@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from common.metrics_log import HEADER_SIZE, RECORD_DTYPE, MetricsLog
+from common.metrics_store import APICallMetrics, MetricsRingBuffer
+
+START = datetime(2026, 3, 1, 12, 0, 0)
+
+
+def _call(i, model="m-a", provider=""):
+    return APICallMetrics(
+        START + timedelta(seconds=i), model, "chat", 10, 5, 15, float(i), i % 4 != 0, 0.001 * i,
+        template="t", prompt_hash=i + 1, provider=provider,
+    )
+
+
+def _reopen(log, **kwargs):
+    log.close()
+    return MetricsLog(str(log.directory), **kwargs)
+
+
+def test_round_trip_across_rotated_segments(tmp_path):
+    log = MetricsLog(str(tmp_path), segment_records=4)
+    log.append_batch([_call(i, model=f"m{i % 2}", provider="p" if i % 3 else "") for i in range(10)])
+    log = _reopen(log, segment_records=4)
+    assert len(list(tmp_path.glob("seg-*.bin"))) == 3
+    assert log.row_count == 10
+    columns = log.read_columns()
+    assert columns["latency_ms"].tolist() == [float(i) for i in range(10)]
+    assert columns["success"].dtype == bool and columns["success"].sum() == 7
+    assert [log.symbols("model")[m] for m in columns["model_id"][:2]] == ["m0", "m1"]
+    assert log.symbols("provider") == ["", "p"]
+    assert [log.symbols("provider")[p] for p in columns["provider_id"][:3]] == ["", "p", "p"]
+
+
+def test_time_range_reads_skip_segments(tmp_path):
+    log = MetricsLog(str(tmp_path), segment_records=4)
+    log.append_batch([_call(i) for i in range(10)])
+    start, end = (START + timedelta(seconds=5)).timestamp(), (START + timedelta(seconds=6)).timestamp()
+    assert len(log.segments(start, end)) == 2  # the second sealed segment and the active one
+    assert log.read_columns(start, end)["latency_ms"].tolist() == [5.0, 6.0]
+
+
+def test_out_of_order_timestamps_are_filtered_and_sorted(tmp_path):
+    log = MetricsLog(str(tmp_path))
+    log.append_batch([_call(i) for i in (3, 1, 2, 5, 4)])
+    start = (START + timedelta(seconds=2)).timestamp()
+    assert log.read_columns(start)["latency_ms"].tolist() == [2.0, 3.0, 4.0, 5.0]
+
+
+def test_torn_tails_are_cut_off_on_open(tmp_path):
+    log = MetricsLog(str(tmp_path), segment_records=4)
+    log.append_batch([_call(i) for i in range(6)])
+    log.close()
+    active = sorted(tmp_path.glob("seg-*.bin"))[-1]
+    with active.open("ab") as f:
+        f.write(b"\x01" * (RECORD_DTYPE.itemsize // 2))  # crash mid-record
+    with (tmp_path / "symbols.jsonl").open("a") as f:
+        f.write('{"kind": "model", "id": 1, "val')          # crash mid-line
+    with (tmp_path / "index.jsonl").open("a") as f:
+        f.write('{"seq": 1, "ro')
+
+    log = MetricsLog(str(tmp_path), segment_records=4)
+    assert active.stat().st_size == HEADER_SIZE + 2 * RECORD_DTYPE.itemsize
+    log.append_batch([_call(i, model="m-new") for i in range(6, 9)])
+    log = _reopen(log, segment_records=4)
+    columns = log.read_columns()
+    assert columns["latency_ms"].tolist() == [float(i) for i in range(9)]
+    assert log.symbols("model") == ["m-a", "m-new"]
+    assert log.row_count == 9
+
+
+def test_segment_without_header_is_recreated(tmp_path):
+    log = MetricsLog(str(tmp_path))
+    log.close()
+    (tmp_path / "seg-000000.bin").write_bytes(b"PLM")
+    log = MetricsLog(str(tmp_path))
+    log.append(_call(1))
+    assert _reopen(log).read_columns()["latency_ms"].tolist() == [1.0]
+
+
+def test_foreign_file_is_rejected(tmp_path):
+    (tmp_path / "seg-000000.bin").write_bytes(b"x" * 200)
+    with pytest.raises(ValueError):
+        MetricsLog(str(tmp_path))
+
+
+def test_second_writer_is_refused_until_close(tmp_path):
+    log = MetricsLog(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        MetricsLog(str(tmp_path))
+    log.close()
+    MetricsLog(str(tmp_path)).close()
+
+
+def test_replay_into_ring_buffer(tmp_path):
+    log = MetricsLog(str(tmp_path), segment_records=3)
+    calls = [_call(i, model=f"m{i % 3}") for i in range(10)]
+    log.append_batch(calls)
+    buffer = MetricsRingBuffer(capacity=5)
+    buffer.load_columns(log.read_columns(), log.symbols("model"), log.symbols("operation"),
+                        log.symbols("template"), log.symbols("provider"), now=START)
+    restored = list(buffer.recent())
+    assert [(c.model, c.latency_ms, c.success, c.prompt_hash) for c in restored] == \
+        [(c.model, c.latency_ms, c.success, c.prompt_hash) for c in calls[-5:]]
+    assert buffer.today_totals(now=START).cost_usd == pytest.approx(sum(c.cost_usd for c in calls))
+    assert np.isclose(buffer.window.cost_usd, sum(c.cost_usd for c in calls[-5:]))
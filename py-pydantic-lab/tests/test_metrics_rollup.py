@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from common.metrics_rollup import Resolution, RollupEngine
+
+T0 = 1_699_999_200  # a whole hour in epoch seconds
+SMALL = (Resolution("1s", 1, 10), Resolution("1m", 60, 600))
+
+
+def _columns(timestamps, latency=10.0, success=True):
+    n = len(timestamps)
+    return {
+        "timestamp": np.asarray(timestamps, dtype=np.float64),
+        "latency_ms": np.full(n, latency),
+        "cost_usd": np.full(n, 0.5),
+        "success": np.full(n, success),
+        "prompt_tokens": np.full(n, 100),
+        "completion_tokens": np.full(n, 20),
+        "cache_read_tokens": np.full(n, 40),
+    }
+
+
+def test_window_picks_finest_resolution_that_covers_it():
+    engine = RollupEngine(SMALL)
+    engine.add(T0 + 0.5, 10.0, 0.1, True)
+    engine.add(T0 + 1.5, 30.0, 0.1, False, prompt_tokens=100, cache_read_tokens=25)
+    last_two = engine.window(2, now=T0 + 1.9)
+    assert (last_two.count, last_two.errors) == (2, 1)
+    assert last_two.avg_latency_ms == 20.0 and last_two.error_rate == 0.5
+    # The bucket containing the window start counts only if it starts inside the window
+    assert engine.window(1, now=T0 + 1.9).count == 1
+    # Beyond the 1s retention the 1m ring answers
+    assert engine.window(300, now=T0 + 1.9).count == 2
+
+
+def test_retention_ages_out_old_buckets():
+    engine = RollupEngine(SMALL)
+    engine.add(T0, 10.0, 0.1, True)
+    engine.add(T0 + 10, 10.0, 0.1, True)  # the 1s ring has 10 slots: this bucket replaces T0's
+    assert engine.window(20, now=T0 + 10, resolution="1s").count == 1
+    assert engine.window(60, now=T0 + 10, resolution="1m").count == 2
+    # A late write older than the ring's retention is dropped instead of clobbering a newer bucket
+    engine.add(T0 + 0.5, 10.0, 0.1, True)
+    assert engine.window(20, now=T0 + 10, resolution="1s").count == 1
+    # A late write still inside the retention lands in its own bucket
+    engine.add(T0 + 2, 10.0, 0.1, True)
+    assert engine.window(20, now=T0 + 10, resolution="1s").count == 2
+
+
+def test_ingest_columns_matches_single_adds():
+    rng = np.random.default_rng(0)
+    timestamps = np.sort(T0 + rng.uniform(0, 1200, 500))
+    columns = _columns(timestamps, success=True)
+    columns["success"] = rng.random(500) > 0.1
+    columns["latency_ms"] = rng.uniform(1, 100, 500)
+
+    bulk = RollupEngine(SMALL)
+    bulk.ingest_columns(columns)
+    single = RollupEngine(SMALL)
+    for i in range(500):
+        single.add(timestamps[i], columns["latency_ms"][i], 0.5, bool(columns["success"][i]), 100, 20, 40)
+
+    now = T0 + 1200
+    for resolution, seconds in (("1s", 10), ("1m", 600)):
+        a = bulk.window(seconds, now=now, resolution=resolution)
+        b = single.window(seconds, now=now, resolution=resolution)
+        assert (a.count, a.errors, a.total_tokens) == (b.count, b.errors, b.total_tokens)
+        assert a.latency_sum_ms == pytest.approx(b.latency_sum_ms)
+
+
+def test_series_fills_empty_buckets():
+    engine = RollupEngine(SMALL)
+    engine.ingest_columns(_columns([T0, T0 + 1, T0 + 121]))
+    series = engine.series("1m", 180, now=T0 + 180)
+    assert [start for start, _ in series] == [T0, T0 + 60, T0 + 120]
+    counts = {start: totals.count for start, totals in series}
+    assert counts == {T0: 2, T0 + 60: 0, T0 + 120: 1}
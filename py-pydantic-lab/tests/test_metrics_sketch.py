@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from common.metrics_sketch import LatencySketch, SketchRegistry
+
+
+def _lognormal(n, seed=0):
+    return np.random.default_rng(seed).lognormal(mean=6, sigma=1.2, size=n)
+
+
+def test_quantiles_within_relative_accuracy():
+    values = _lognormal(20_000)
+    sketch = LatencySketch(relative_accuracy=0.01)
+    sketch.add_many(values)
+    ordered = np.sort(values)
+    for q in (0.5, 0.95, 0.99):
+        exact = ordered[int(q * (len(values) - 1))]
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.0101)
+    assert sketch.quantile(0) == values.min()
+    assert sketch.quantile(1) == sketch.percentiles().max == values.max()
+
+
+def test_add_many_matches_add():
+    values = _lognormal(500, seed=1)
+    one_by_one = LatencySketch()
+    for v in values:
+        one_by_one.add(float(v))
+    bulk = LatencySketch()
+    bulk.add_many(values)
+    assert np.array_equal(one_by_one.counts, bulk.counts)
+    assert one_by_one.percentiles() == bulk.percentiles()
+
+
+def test_out_of_range_values_are_clamped_to_observed_extremes():
+    sketch = LatencySketch(min_ms=1.0, max_ms=1000.0)
+    sketch.add_many([0.001, 5.0, 10_000.0])
+    assert sketch.counts[0] == 1 and sketch.counts[-1] == 1
+    assert sketch.quantile(0.99) <= 10_000.0
+    assert sketch.percentiles().max == 10_000.0
+
+
+def test_merge_equals_single_sketch():
+    values = _lognormal(3000, seed=2)
+    whole = LatencySketch()
+    whole.add_many(values)
+    left, right = LatencySketch(), LatencySketch()
+    left.add_many(values[:1000])
+    right.add_many(values[1000:])
+    merged = left.merge(right)
+    assert np.array_equal(merged.counts, whole.counts)
+    assert merged.percentiles() == whole.percentiles()
+    with pytest.raises(ValueError):
+        merged.merge(LatencySketch(relative_accuracy=0.02))
+
+
+def test_bytes_round_trip_including_empty():
+    sketch = LatencySketch()
+    sketch.add_many(_lognormal(1000, seed=3))
+    restored = LatencySketch.from_bytes(sketch.to_bytes())
+    assert np.array_equal(restored.counts, sketch.counts)
+    assert (restored.count, restored.min, restored.max) == (sketch.count, sketch.min, sketch.max)
+    empty = LatencySketch.from_bytes(LatencySketch().to_bytes())
+    assert empty.count == 0 and empty.quantile(0.5) == 0.0
+    # An empty sketch merges as a no-op, keeping min/max
+    assert restored.merge(empty).min == sketch.min
+
+
+def test_registry_filters_merges_and_serializes():
+    worker_a, worker_b = SketchRegistry(), SketchRegistry()
+    worker_a.record("m1", "chat", 100.0)
+    worker_a.record("m2", "chat", 300.0)
+    worker_b.record("m1", "chat", 200.0)
+    worker_b.record("m1", "embed", 5.0)
+    fleet = SketchRegistry.from_dict(worker_a.to_dict()).merge(SketchRegistry.from_dict(worker_b.to_dict()))
+    assert fleet.combined().count == 4
+    assert fleet.combined(model="m1").count == 3
+    assert fleet.combined(operation="chat").max == 300.0
+    assert fleet.combined(model="m1", operation="embed").percentiles().p50 == pytest.approx(5.0, rel=0.01)
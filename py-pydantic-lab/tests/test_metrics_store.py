@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from common.metrics_store import Aggregates, APICallMetrics, MetricsRingBuffer, prompt_fingerprint
+
+START = datetime(2026, 3, 1, 23, 59, 50)
+
+
+def _call(i, model="m-a", success=True, when=None):
+    return APICallMetrics(
+        timestamp=when or START + timedelta(seconds=i), model=model, operation="chat",
+        prompt_tokens=10 * i, completion_tokens=i, total_tokens=11 * i, latency_ms=float(i),
+        success=success, cost_usd=0.001 * i, cache_read_tokens=i, template=f"t{i % 2}",
+        provider="p" if i % 3 else "",
+    )
+
+
+def _expected(calls):
+    aggregates = Aggregates()
+    for c in calls:
+        aggregates.add(c.latency_ms, c.cost_usd, c.total_tokens, c.success, 0, c.prompt_tokens, c.cache_read_tokens)
+    return aggregates
+
+
+def test_eviction_keeps_window_aggregates_exact():
+    buffer = MetricsRingBuffer(capacity=4)
+    calls = [_call(i, success=i % 5 != 0) for i in range(1, 11)]
+    for c in calls:
+        buffer.append(c)
+    kept = calls[-4:]
+    expected = _expected(kept)
+    assert buffer.size == 4 and buffer.total_count == 10
+    assert buffer.window.count == 4
+    assert buffer.window.errors == expected.errors == 1
+    assert buffer.window.latency_sum_ms == pytest.approx(expected.latency_sum_ms)
+    assert buffer.window.cost_usd == pytest.approx(expected.cost_usd)
+    assert buffer.window.prompt_tokens == expected.prompt_tokens
+    assert buffer.token_usage(buffer.window) == {"m-a": sum(c.total_tokens for c in kept)}
+
+
+def test_columns_and_recent_are_chronological_after_wraparound():
+    buffer = MetricsRingBuffer(capacity=3)
+    calls = [_call(i) for i in range(1, 8)]
+    for c in calls:
+        buffer.append(c)
+    assert buffer.columns()["latency_ms"].tolist() == [5.0, 6.0, 7.0]
+    assert list(buffer.recent()) == calls[-3:]
+    assert list(buffer.recent(1)) == calls[-1:]
+
+
+def test_today_totals_include_evicted_rows_and_roll_over():
+    buffer = MetricsRingBuffer(capacity=2)
+    for i in range(1, 6):  # 23:59:51 .. 23:59:55
+        buffer.append(_call(i))
+    today = buffer.today_totals(now=START)
+    assert today.count == 5
+    assert buffer.window.count == 2
+    buffer.append(_call(20))  # 00:00:10 the next day
+    assert buffer.today_totals(now=START + timedelta(seconds=20)).count == 1
+
+
+def test_load_columns_matches_appends():
+    source = MetricsRingBuffer(capacity=16)
+    for i in range(1, 11):
+        source.append(_call(i, model="m-b" if i % 2 else "m-a"))
+    replayed = MetricsRingBuffer(capacity=4)
+    replayed.model_index("unrelated")  # ids differ from the source and must be remapped
+    replayed.load_columns(source.columns(), source.models, source.operations, source.templates, source.providers,
+                          now=START)
+
+    direct = MetricsRingBuffer(capacity=4)
+    for c in source.recent():
+        direct.append(c)
+    assert list(replayed.recent()) == list(direct.recent())
+    assert replayed.total_count == 10
+    assert replayed.window.cost_usd == pytest.approx(direct.window.cost_usd)
+    assert replayed.token_usage(replayed.window) == direct.token_usage(direct.window)
+    assert replayed.today_totals(now=START).count == 10
+
+
+def test_prompt_fingerprint_ignores_whitespace():
+    assert prompt_fingerprint("hello   world\n") == prompt_fingerprint("hello world")
+    assert prompt_fingerprint("hello") != prompt_fingerprint("world")
+    assert prompt_fingerprint("") != 0
@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+import pytest
+
+from common.pricing import DEFAULT_PRICE_FILE, PriceEntry, PricingTable
+
+M = 1e-6
+
+
+def _table():
+    return PricingTable([
+        PriceEntry("*", "gpt-4o*", 2.5 * M, 10 * M),
+        PriceEntry("openai", "gpt-4o*", 2.0 * M, 8 * M, cached_input=1.0 * M),
+        PriceEntry("openai", "gpt-4o-mini*", 0.15 * M, 0.6 * M),
+        PriceEntry("openai", "gpt-4o-mini-2024", 0.1 * M, 0.5 * M),
+        PriceEntry("openai", "o1*", 15 * M, 60 * M, reasoning=40 * M),
+        PriceEntry("ollama", "*", 0.0, 0.0),
+    ], version="test")
+
+
+def test_most_specific_entry_wins():
+    table = _table()
+    assert table.lookup("gpt-4o-mini-2024", "openai").input == 0.1 * M    # exact model
+    assert table.lookup("gpt-4o-mini-2025", "openai").input == 0.15 * M   # longest pattern
+    assert table.lookup("gpt-4o", "openai").input == 2.0 * M              # provider over "*"
+    assert table.lookup("gpt-4o", "azure_ad").input == 2.5 * M            # falls back to "*"
+    assert table.lookup("gpt-4o").input == 2.5 * M
+    assert table.lookup("llama3", "ollama").output == 0.0
+    assert table.lookup("llama3", "openai") is None
+    assert table.unpriced(["gpt-4o", "mystery"], "openai") == ["mystery"]
+
+
+def test_cost_uses_cached_and_reasoning_rates_with_fallbacks():
+    table = _table()
+    # 1000 prompt tokens of which 400 cached, 500 completion of which 200 reasoning
+    assert table.cost("gpt-4o", 1000, 500, 400, 200, provider="openai") == pytest.approx(
+        600 * 2.0 * M + 400 * 1.0 * M + 300 * 8 * M + 200 * 8 * M)
+    assert table.cost("o1-preview", 1000, 500, 400, 200, provider="openai") == pytest.approx(
+        1000 * 15 * M + 300 * 60 * M + 200 * 40 * M)
+    assert table.cost("mystery", 1000, 500) == 0.0
+
+
+def test_reprice_per_provider_matches_cost():
+    table = _table()
+    models = ["gpt-4o", "o1"]
+    providers = ["", "openai", "azure_ad"]
+    rng = np.random.default_rng(0)
+    n = 200
+    columns = {
+        "model_id": rng.integers(0, 2, n),
+        "provider_id": rng.integers(0, 3, n),
+        "prompt_tokens": rng.integers(100, 1000, n),
+        "completion_tokens": rng.integers(100, 500, n),
+    }
+    columns["cache_read_tokens"] = columns["prompt_tokens"] // 3
+    columns["reasoning_tokens"] = columns["completion_tokens"] // 4
+    costs = table.reprice(columns, models, provider="openai", providers=providers)
+    expected = [
+        table.cost(models[m], p, c, cr, r, provider=providers[pid] or "openai")
+        for m, pid, p, c, cr, r in zip(columns["model_id"], columns["provider_id"], columns["prompt_tokens"],
+                                       columns["completion_tokens"], columns["cache_read_tokens"],
+                                       columns["reasoning_tokens"])
+    ]
+    assert costs == pytest.approx(expected)
+    # Without providers every call is priced at the single given provider
+    single = table.reprice(columns, models, provider="azure_ad")
+    assert single[columns["model_id"] == 0] == pytest.approx(
+        table.reprice(columns, models, "azure_ad", ["azure_ad"] * 3)[columns["model_id"] == 0])
+
+
+def test_load_scales_units(tmp_path):
+    path = tmp_path / "prices.json"
+    path.write_text(json.dumps({
+        "version": "v9", "unit": "per_1k_tokens",
+        "prices": [{"provider": "OpenAI", "model": "gpt-4o*", "input": 1.0, "output": 2.0}],
+    }))
+    table = PricingTable.load(path)
+    assert table.version == "v9"
+    assert table.lookup("gpt-4o", "openai").output == pytest.approx(2e-3)
+
+
+def test_shipped_price_file_loads():
+    table = PricingTable.load(DEFAULT_PRICE_FILE)
+    assert table.lookup("deepseek-chat", "deepseek") is not None
+    assert table.lookup("gpt-4o-mini", "openai").input < table.lookup("gpt-4o", "openai").input
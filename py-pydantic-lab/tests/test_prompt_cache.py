@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, SystemPromptPart, TextPart
+from pydantic_ai.models.function import FunctionModel
+from pydantic_ai.usage import RequestUsage
+
+from common.prompt_cache import PromptAssembler, PromptCacheTracker
+
+
+@dataclass
+class Deps:
+    role: str
+    user: str
+
+
+def _assembler():
+    prompts = PromptAssembler(separator="\n")
+
+    @prompts.volatile
+    def user(deps):
+        return f"用户: {deps.user}"
+
+    @prompts.semi_static
+    def role(deps):
+        return f"角色: {deps.role}"
+
+    prompts.static("规则一")
+    prompts.static("规则二")
+    return prompts
+
+
+def test_static_sections_form_a_shared_prefix():
+    prompts = _assembler()
+    admin = prompts.system_prompt(Deps("admin", "张三"))
+    guest = prompts.system_prompt(Deps("guest", "张三"))
+    assert admin == "规则一\n规则二\n角色: admin"
+    assert admin.split("角色")[0] == guest.split("角色")[0]
+    # Volatile sections never enter the system prompt: two users with the same role share it byte for byte
+    assert prompts.system_prompt(Deps("admin", "李四")) == admin
+
+
+def test_volatile_sections_follow_the_user_prompt():
+    prompts = _assembler()
+    assert prompts.user_prompt("你好", Deps("admin", "张三")) == "你好\n[本次请求上下文]\n用户: 张三"
+    assert PromptAssembler().user_prompt("你好", None) == "你好"
+
+
+def test_install_registers_the_assembled_system_prompt():
+    seen = []
+
+    def model(messages, info):
+        seen.extend(p.content for p in messages[0].parts if isinstance(p, SystemPromptPart))
+        return ModelResponse(parts=[TextPart("ok")])
+
+    prompts = _assembler()
+    agent = prompts.install(Agent(FunctionModel(model), deps_type=Deps))
+    agent.run_sync("hi", deps=Deps("admin", "张三"))
+    assert seen == ["规则一\n规则二\n角色: admin"]
+
+
+def test_tracker_reports_cache_hits_and_prefix_fragmentation():
+    def model(messages, info):
+        return ModelResponse(parts=[TextPart("ok")], usage=RequestUsage(input_tokens=100, output_tokens=5,
+                                                                        cache_read_tokens=80))
+
+    prompts = _assembler()
+    agent = prompts.install(Agent(FunctionModel(model), deps_type=Deps))
+    tracker = PromptCacheTracker()
+    for role in ("admin", "admin", "guest"):
+        tracker.record("triage", agent.run_sync("hi", deps=Deps(role, "张三")))
+    report = tracker.report()["triage"]
+    assert report["runs"] == 3 and report["prompt_tokens"] == 300
+    assert report["cached_tokens"] == 240 and report["uncached_tokens"] == 60
+    assert report["cache_hit_ratio"] == 0.8
+    assert report["distinct_prefixes"] == 2 and report["estimated_runs"] == 0
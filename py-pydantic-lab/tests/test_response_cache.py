@@ -0,0 +1,112 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, ToolCallPart, UserPromptPart
+from pydantic_ai.models import ModelRequestParameters
+from pydantic_ai.models.function import FunctionModel
+from pydantic_ai.usage import RequestUsage
+
+from common.response_cache import CachingModel, ResponseCache, is_cache_hit, request_key
+from common.token_usage import token_counts_from_result
+
+
+def _counting_model(calls, delay=0.0):
+    async def respond(messages, info):
+        calls.append(messages[-1].parts[-1].content)
+        if delay:
+            await asyncio.sleep(delay)
+        return ModelResponse(parts=[TextPart("答案")], usage=RequestUsage(input_tokens=10, output_tokens=3))
+
+    return FunctionModel(respond)
+
+
+def test_request_key_ignores_volatile_fields_only():
+    model = FunctionModel(lambda messages, info: None)
+    params = ModelRequestParameters()
+
+    def key(timestamp, args):
+        messages = [
+            ModelRequest(parts=[UserPromptPart("你好", timestamp=timestamp)], run_id=str(timestamp)),
+            ModelResponse(parts=[ToolCallPart("search", args, tool_call_id=str(timestamp))], timestamp=timestamp),
+        ]
+        return request_key(model, messages, None, params)
+
+    a = datetime.now(timezone.utc)
+    b = a + timedelta(minutes=1)
+    assert key(a, {"q": "x"}) == key(b, {"q": "x"})
+    # A tool argument that happens to be called "timestamp" is user data and stays in the key
+    assert key(a, {"timestamp": 1}) != key(a, {"timestamp": 2})
+    assert request_key(model, [], {"temperature": 0}, params) != request_key(model, [], {"temperature": 1}, params)
+
+
+def test_memory_tier_is_an_lru_with_ttl():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.set("c", b"3")  # evicts "b", the least recently used
+    assert cache.get("b") is None and cache.get("a") == b"1"
+    cache.set("d", b"4", ttl_seconds=-1)
+    assert cache.get("d") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 2 and stats["expired"] == 1 and stats["memory_hits"] == 2
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(sqlite_path=path)
+    cache.set("k", b"payload")
+    cache.set("old", b"x", ttl_seconds=-1)
+    cache.close()
+
+    reopened = ResponseCache(sqlite_path=path)
+    assert reopened.get("k") == b"payload" and reopened.get("old") is None
+    assert reopened.purge_expired() == 1
+    assert reopened.get("k") == b"payload"  # promoted into memory
+    assert reopened.counters["disk_hits"] == 1 and reopened.counters["memory_hits"] == 1
+    reopened.close()
+
+
+def test_repeated_requests_are_served_without_billing():
+    calls = []
+    cache = ResponseCache()
+    agent = Agent(CachingModel(_counting_model(calls), cache))
+    first = agent.run_sync("你好")
+    second = agent.run_sync("你好")
+    assert calls == ["你好"] and second.output == first.output
+    response = second.all_messages()[-1]
+    assert is_cache_hit(response) and not is_cache_hit(first.all_messages()[-1])
+    assert token_counts_from_result(second).total_tokens == 0
+    assert token_counts_from_result(first).total_tokens == 13
+    assert cache.counters["tokens_saved"] == 13
+
+
+def test_concurrent_identical_requests_share_one_call():
+    calls = []
+    cache = ResponseCache()
+    agent = Agent(CachingModel(_counting_model(calls, delay=0.05), cache))
+
+    async def run():
+        return await asyncio.gather(*(agent.run("你好") for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert calls == ["你好"]
+    assert [r.output for r in results] == ["答案"] * 3
+    assert cache.counters["coalesced"] == 2 and cache.counters["misses"] == 1
+
+
+def test_followers_retry_when_the_leader_is_cancelled():
+    calls = []
+    agent = Agent(CachingModel(_counting_model(calls, delay=0.05), ResponseCache()))
+
+    async def run():
+        leader = asyncio.create_task(agent.run("你好"))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(agent.run("你好"))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()).output == "答案"
+    assert calls == ["你好", "你好"]
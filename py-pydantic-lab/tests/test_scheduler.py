@@ -0,0 +1,57 @@
+import asyncio
+
+from common.scheduler import ProviderLimits, ScheduledJob, TaskScheduler, TokenBucket
+
+
+def _tracking_job(key, state, delay=0.02, provider="default"):
+    async def run():
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(delay)
+        state["active"] -= 1
+        return key
+
+    return ScheduledJob(key=key, run=run, provider=provider)
+
+
+def test_global_concurrency_cap():
+    state = {"active": 0, "peak": 0}
+    scheduler = TaskScheduler(max_concurrency=3)
+    outcomes = asyncio.run(scheduler.run_all(_tracking_job(i, state) for i in range(10)))
+    assert sorted(outcomes) == list(range(10))
+    assert all(o.ok and o.result == o.key for o in outcomes.values())
+    assert state["peak"] == 3
+
+
+def test_provider_cap_is_tighter_than_global():
+    state = {"active": 0, "peak": 0}
+    scheduler = TaskScheduler(max_concurrency=8, provider_limits={"slow": ProviderLimits(max_concurrency=2)})
+    asyncio.run(scheduler.run_all(_tracking_job(i, state, provider="slow") for i in range(6)))
+    assert state["peak"] == 2
+
+
+def test_single_job_without_as_completed():
+    scheduler = TaskScheduler(max_concurrency=1)
+    state = {"active": 0, "peak": 0}
+    outcome = asyncio.run(scheduler._execute(_tracking_job("only", state)))
+    assert outcome.ok and outcome.result == "only"
+
+
+def test_deadline_covers_queueing():
+    state = {"active": 0, "peak": 0}
+    scheduler = TaskScheduler(max_concurrency=1, default_deadline=0.05)
+    outcomes = asyncio.run(scheduler.run_all(_tracking_job(i, state, delay=0.04) for i in range(3)))
+    assert outcomes[0].ok
+    assert isinstance(outcomes[2].error, asyncio.TimeoutError)
+
+
+def test_token_bucket_waits_for_refill():
+    async def run():
+        bucket = TokenBucket(per_minute=600, burst=1)  # 10 tokens per second
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await bucket.acquire()
+        await bucket.acquire()
+        return loop.time() - start
+
+    assert 0.08 <= asyncio.run(run()) < 0.5
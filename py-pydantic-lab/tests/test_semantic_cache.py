@@ -0,0 +1,69 @@
+import asyncio
+
+import numpy as np
+from pydantic import BaseModel, TypeAdapter
+from pydantic_ai import Agent
+from pydantic_ai.models.test import TestModel
+
+from common.semantic_cache import SemanticCache, SemanticCachedAgent, normalize_query
+from common.vector_store import HashingEmbedder
+
+
+def _unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_normalize_query_folds_width_case_punctuation_and_cjk_spaces():
+    assert normalize_query("怎么开发票？") == normalize_query("怎么 开 发票")
+    assert normalize_query("ＨＥＬＬＯ,  World!") == "hello world"
+
+
+def test_lookup_threshold_ttl_and_lru():
+    cache = SemanticCache(HashingEmbedder(), threshold=0.9, max_entries=2)
+    cache.store("faq", "a", _unit(1, 0, 0), b"A", latency_s=1.0)
+    cache.store("faq", "b", _unit(0, 1, 0), b"B", latency_s=1.0)
+    hit = cache.lookup("faq", _unit(1, 0.1, 0))
+    assert hit.output == b"A" and hit.matched_query == "a" and hit.score >= 0.9
+    assert cache.lookup("faq", _unit(1, 1, 0)) is None  # cosine 0.71: below the threshold
+    cache.store("faq", "c", _unit(0, 0, 1), b"C", latency_s=1.0)  # evicts "b", the least recently used
+    assert cache.lookup("faq", _unit(0, 1, 0)) is None
+    cache.store("faq", "d", _unit(0, 1, 0), b"D", latency_s=1.0, ttl_seconds=-1)
+    assert cache.lookup("faq", _unit(0, 1, 0)) is None
+    stats = cache.stats()["namespaces"]["faq"]
+    assert stats["hits"] == 1 and stats["evictions"] >= 1 and stats["expired"] == 1
+    assert cache.lookup("other", _unit(1, 0, 0)) is None  # namespaces are isolated
+
+
+def test_lookup_falls_back_to_the_next_valid_candidate():
+    class Answer(BaseModel):
+        text: str
+
+    cache = SemanticCache(HashingEmbedder(), threshold=0.9)
+    cache.store("faq", "stale", _unit(1, 0, 0), b'{"old": 1}', latency_s=1.0)
+    cache.store("faq", "good", _unit(1, 0.2, 0), b'{"text": "ok"}', latency_s=1.0)
+    hit = cache.lookup("faq", _unit(1, 0, 0), TypeAdapter(Answer).validate_json)
+    assert hit.output == Answer(text="ok") and hit.matched_query == "good"
+    counters = cache.stats()["namespaces"]["faq"]
+    assert counters["invalidated"] == 1 and counters["entries"] == 1
+
+
+def test_cached_agent_serves_paraphrases_and_bypasses_per_run_overrides():
+    model = TestModel(custom_output_text="请在账户页开具发票")
+    agent = SemanticCachedAgent(Agent(model, name="faq"), SemanticCache(HashingEmbedder(), threshold=0.9))
+
+    async def run():
+        first = await agent.run("怎么开发票？")
+        second = await agent.run("怎么 开发票")
+        with_deps = await agent.run("怎么开发票？", deps={"user": "u1"})
+        other_model = await agent.run("怎么开发票？", model=TestModel(custom_output_text="x"))
+        empty_history = await agent.run("怎么开发票？", message_history=[])
+        return first, second, with_deps, other_model, empty_history
+
+    first, second, with_deps, other_model, empty_history = asyncio.run(run())
+    assert not first.cache_hit and second.cache_hit and second.output == first.output
+    assert not with_deps.cache_hit and with_deps.run_result is not None
+    assert other_model.output == "x" and not other_model.cache_hit
+    assert empty_history.cache_hit
+    stats = agent.cache.stats()["namespaces"]["faq"]
+    assert stats["bypassed"] == 2 and stats["hits"] == 2 and stats["stores"] == 1
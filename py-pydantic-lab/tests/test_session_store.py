@@ -0,0 +1,76 @@
+import pytest
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, UserPromptPart
+
+from common.session_store import SessionStore, SQLiteSessionStore
+
+
+def _turn(i):
+    return [ModelRequest(parts=[UserPromptPart(f"q{i}")]), ModelResponse(parts=[TextPart(f"a{i}")])]
+
+
+def _texts(messages):
+    return [part.content for message in messages for part in message.parts]
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "sessions.db")
+
+
+def test_session_store_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_appended_turns_survive_a_restart(db_path):
+    store = SQLiteSessionStore(db_path)
+    for i in range(3):
+        store.append("s1", _turn(i))
+    store.append("s2", _turn(9))
+    assert _texts(store.load("s1")) == ["q0", "a0", "q1", "a1", "q2", "a2"]
+    store.close()
+
+    reopened = SQLiteSessionStore(db_path)
+    assert _texts(reopened.load("s1")) == ["q0", "a0", "q1", "a1", "q2", "a2"]
+    assert sorted(reopened.session_ids()) == ["s1", "s2"]
+    reopened.delete("s1")
+    assert reopened.load("s1") == [] and reopened.session_ids() == ["s2"]
+    reopened.close()
+
+
+def test_append_on_a_cache_miss_does_not_decode_the_history(db_path, monkeypatch):
+    store = SQLiteSessionStore(db_path)
+    store.append("s1", _turn(0))
+    store.close()
+
+    store = SQLiteSessionStore(db_path)
+    monkeypatch.setattr(store, "_read_deltas", lambda session_id: pytest.fail("history was read"))
+    store.append("s1", _turn(1))
+    assert store.stats()["cached_sessions"] == 0
+    monkeypatch.undo()
+    assert _texts(store.load("s1")) == ["q0", "a0", "q1", "a1"]
+    store.close()
+
+
+def test_concurrent_writers_do_not_lose_turns(db_path):
+    a, b = SQLiteSessionStore(db_path), SQLiteSessionStore(db_path)
+    a.append("s1", _turn(0))
+    assert _texts(b.load("s1")) == ["q0", "a0"]  # b caches the session at seq 1
+    a.append("s1", _turn(1))
+    b.append("s1", _turn(2))  # seq conflict: b drops its stale copy and retries at the next free seq
+    assert _texts(b.load("s1")) == ["q0", "a0", "q1", "a1", "q2", "a2"]
+    a.close()
+    b.close()
+
+
+def test_hot_sessions_are_served_from_the_cache(db_path):
+    store = SQLiteSessionStore(db_path, cache_sessions=1)
+    store.append("s1", _turn(0))
+    store.load("s1")
+    store.load("s1")
+    store.append("s1", _turn(1))
+    assert _texts(store.load("s1")) == ["q0", "a0", "q1", "a1"]
+    store.load("s2")  # evicts s1
+    stats = store.stats()
+    assert stats["cached_sessions"] == 1 and stats["misses"] == 2 and stats["hits"] == 3
+    store.close()
@@ -0,0 +1,52 @@
+from dataclasses import dataclass, field
+from typing import List
+
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelRequest, ModelResponse, TextPart, ToolCallPart, UserPromptPart
+from pydantic_ai.models.test import TestModel
+from pydantic_ai.usage import RunUsage
+
+from common.token_usage import TokenEstimator, estimate_token_counts, run_usage, token_counts_from_result
+
+
+@dataclass
+class _Result:
+    """Minimal stand-in for a run result whose provider reported no usage."""
+    messages: List = field(default_factory=list)
+    usage: RunUsage = field(default_factory=RunUsage)
+
+    def new_messages(self):
+        return self.messages
+
+
+def test_heuristic_counts_cjk_per_character():
+    estimator = TokenEstimator()
+    estimator._encoding = None  # force the heuristic regardless of tiktoken
+    assert estimator.count("") == 0
+    assert estimator.count("你好世界") == 4
+    assert estimator.count("abcdefgh") == 2
+    assert estimator.count("你好 abcd") == 2 + 2
+
+
+def test_provider_usage_wins():
+    result = Agent(TestModel(custom_output_text="ok")).run_sync("hello")
+    counts = token_counts_from_result(result)
+    usage = run_usage(result)
+    assert not counts.estimated
+    assert (counts.prompt_tokens, counts.completion_tokens) == (usage.input_tokens, usage.output_tokens)
+    assert counts.total_tokens == usage.input_tokens + usage.output_tokens
+
+
+def test_estimates_from_message_parts_when_usage_is_missing():
+    estimator = TokenEstimator()
+    estimator._encoding = None
+    result = _Result([
+        ModelRequest(parts=[UserPromptPart("你好你好")], instructions="abcd"),
+        ModelResponse(parts=[ToolCallPart("lookup", {"q": "x"})]),
+        ModelResponse(parts=[TextPart("回答")]),
+    ])
+    counts = token_counts_from_result(result, estimator)
+    assert counts.estimated and counts.requests == 2
+    assert counts.prompt_tokens == 4 + 1
+    assert counts.completion_tokens == estimator.count('{"q":"x"}') + 2
+    assert estimate_token_counts(result, estimator) == counts
@@ -0,0 +1,105 @@
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from common.vector_store import FlatIndex, HashingEmbedder, IVFIndex, VectorStore, _normalize, chunk_text
+
+DOCUMENTS = {
+    "diabetes": "2型糖尿病是一种慢性代谢疾病。常用一线药物是二甲双胍。患者需要控制饮食并规律运动。",
+    "hypertension": "高血压患者应限制钠盐摄入。常用药物包括ACE抑制剂和钙通道阻滞剂。",
+    "english": "Metformin lowers blood glucose. It is the first-line therapy for type 2 diabetes.",
+}
+
+
+async def _new_store(documents):
+    store = VectorStore(HashingEmbedder())
+    await store.add_documents(documents)
+    return store
+
+
+def test_chunk_text_packs_sentences_and_splits_long_ones():
+    chunks = chunk_text("第一句。第二句。第三句。", chunk_size=8, overlap=2)
+    assert chunks == ["第一句。第二句。", "第三句。"]
+    long = chunk_text("x" * 25, chunk_size=10, overlap=4)
+    assert all(len(c) <= 10 for c in long)
+    assert "".join(c[:6] for c in long[:-1]) + long[-1] == "x" * 25
+
+
+def test_search_ranks_relevant_chunk_first():
+    async def run():
+        store = VectorStore(HashingEmbedder(), chunk_size=40, chunk_overlap=8)
+        await store.add_documents(DOCUMENTS)
+        return await store.search("二甲双胍", k=2)
+
+    hits = asyncio.run(run())
+    assert hits[0].doc_id == "diabetes" and "二甲双胍" in hits[0].text
+    assert hits[0].score >= hits[1].score
+
+
+def test_ivf_recall_against_flat_index():
+    rng = np.random.default_rng(1)
+    centers = _normalize(rng.normal(size=(20, 32)).astype(np.float32))
+    vectors = _normalize((centers[rng.integers(0, 20, 4000)] + 0.3 * rng.normal(size=(4000, 32))).astype(np.float32))
+    queries = _normalize((centers[rng.integers(0, 20, 50)] + 0.3 * rng.normal(size=(50, 32))).astype(np.float32))
+    flat = FlatIndex(vectors)
+    ivf = IVFIndex.build(vectors, nlist=32, nprobe=8)
+    recall = np.mean([
+        len(set(flat.search(q, 10)[0].tolist()) & set(ivf.search(q, 10)[0].tolist())) / 10 for q in queries
+    ])
+    assert recall >= 0.9
+    # Probing every bucket is exact
+    ivf.nprobe = 32
+    for q in queries[:5]:
+        assert ivf.search(q, 10)[0].tolist() == flat.search(q, 10)[0].tolist()
+
+
+def test_save_and_load_round_trip(tmp_path):
+    async def run():
+        store = VectorStore(HashingEmbedder(), chunk_size=40, chunk_overlap=8)
+        await store.add_documents(DOCUMENTS)
+        store.build_index("ivf")
+        store.save(tmp_path / "index")
+        loaded = VectorStore.load(tmp_path / "index", HashingEmbedder())
+        return await store.search("高血压", k=3), await loaded.search("高血压", k=3), loaded
+
+    original, reloaded, loaded = asyncio.run(run())
+    assert original == reloaded
+    assert isinstance(loaded.vectors, np.memmap)
+    assert [p.name for p in tmp_path.iterdir()] == ["index"]
+
+
+def test_open_or_build_reuses_and_rebuilds(tmp_path):
+    directory = tmp_path / "index"
+
+    async def run(documents):
+        return await VectorStore.open_or_build(directory, documents, HashingEmbedder(), chunk_size=40)
+
+    first = asyncio.run(run(DOCUMENTS))
+    assert not isinstance(first.vectors, np.memmap)
+    reused = asyncio.run(run(DOCUMENTS))
+    assert isinstance(reused.vectors, np.memmap)
+    changed = asyncio.run(run({**DOCUMENTS, "new": "新增文档。"}))
+    assert not isinstance(changed.vectors, np.memmap)
+    assert len(changed) == len(first) + 1
+    # The store that mmaps the replaced files keeps working
+    assert asyncio.run(reused.search("高血压", k=1))[0].doc_id == "hypertension"
+
+
+def test_crash_during_save_keeps_previous_index(tmp_path, monkeypatch):
+    directory = tmp_path / "index"
+    asyncio.run(VectorStore.open_or_build(directory, DOCUMENTS, HashingEmbedder()))
+    manifest = (directory / "manifest.json").read_text()
+
+    def crash(self, staging):
+        np.save(staging / "vectors.npy", np.zeros((1, 1), dtype=np.float32))
+        raise OSError("disk full")
+
+    monkeypatch.setattr(VectorStore, "_write", crash)
+    store = asyncio.run(_new_store({"other": "完全不同的文档。"}))
+    with pytest.raises(OSError):
+        store.save(directory)
+    assert (directory / "manifest.json").read_text() == manifest
+    assert np.load(directory / "vectors.npy").shape[0] == json.loads(manifest)["count"]
+    assert [p.name for p in tmp_path.iterdir()] == ["index"]